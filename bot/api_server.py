@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -5,16 +6,29 @@ import time
 import hmac
 import hashlib
 import base64
-import ssl
-import aiohttp
 from aiohttp import web
 import aiohttp_cors
-from collections import defaultdict
 from datetime import datetime
+from typing import Optional
 
 from bot.config import config
 from bot.security_manager import security_manager
-from bot.security_headers import security_headers_middleware, create_content_hash
+from bot.security_headers import security_headers_middleware
+from bot.catalog_cache import (
+    CatalogCache, RESPONSE_ALL, RESPONSE_PRODUCTS, RESPONSE_CATEGORIES, RESPONSE_VERSION,
+    category_response_key, product_response_key
+)
+from bot.catalog_index import CatalogIndex
+from bot.catalog_binary import binary_catalog_path
+from bot.catalog_delta import CatalogHistory
+from bot.catalog_events import CatalogEventHub, version_event
+from bot.http_cache import prepared_response, catalog_cache_headers
+from bot.modx_client import ModxClient, ModxApiError
+from bot.circuit_breaker import CircuitOpenError
+from bot.single_flight import SingleFlight
+from bot.static_assets import StaticAssetCache
+from bot.prefork import CATALOG_RELOAD_SIGNAL
+from bot.rate_limiter import GCRARateLimiter
 
 # Настраиваем логирование для API сервера
 logger = logging.getLogger(__name__)
@@ -25,22 +39,56 @@ if not logger.handlers:
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PRODUCTS_DATA_FILE = os.path.join(BASE_DIR, 'data', 'products_scraped.json')  # Старый парсер (сохранен)
 MODX_CACHE_FILE = os.path.join(BASE_DIR, 'data', 'modx_cache.json')  # Новый MODX кэш
+MODX_HISTORY_FILE = os.path.join(BASE_DIR, 'data', 'modx_cache_history.json')  # Diffs for /api/changes
+MODX_BINARY_FILE = binary_catalog_path(MODX_CACHE_FILE)  # mmap'ed responses, preferred when present
 
 # MODX API Configuration
 MODX_API_BASE_URL = os.environ.get('MODX_API_BASE_URL', 'https://drazhin.by')
 MODX_API_TIMEOUT = int(os.environ.get('MODX_API_TIMEOUT', '10'))
 
+# Shared, pooled session for all MODX API calls (opened/closed with the app)
+modx_client = ModxClient(MODX_API_BASE_URL, MODX_API_TIMEOUT)
+
+# Fallback MODX API fetches are coalesced and their results kept briefly, so a
+# burst of requests against an empty cache turns into one upstream call
+MODX_FALLBACK_TTL = float(os.environ.get('MODX_FALLBACK_TTL', '10'))
+MODX_FALLBACK_NEGATIVE_TTL = float(os.environ.get('MODX_FALLBACK_NEGATIVE_TTL', '3'))
+modx_fallback = SingleFlight(MODX_FALLBACK_TTL, MODX_FALLBACK_NEGATIVE_TTL)
+# Last successful fallback result per call, served while MODX is failing
+modx_last_good = {}
+
+# Memoized MODX categories used only while the catalog cache is empty
+MODX_CATEGORIES_TTL = int(os.environ.get('MODX_CATEGORIES_TTL', '300'))
+categories_table = {}
+categories_table_expires = 0.0
+
 # ===== SECURITY CONFIGURATION =====
 # HMAC secret key for request signing (should be in environment variables)
 HMAC_SECRET = os.environ.get('HMAC_SECRET', 'default-secret-key-change-in-production')
 HMAC_ALGORITHM = 'sha256'
 
+# Headers for API responses that must not be cached by clients or proxies
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+
+# Headers for ETag-tagged catalog responses (max-age/stale-while-revalidate are opt-in)
+CATALOG_CACHE_HEADERS = catalog_cache_headers(
+    config.CATALOG_CACHE_MAX_AGE, config.CATALOG_CACHE_STALE_WHILE_REVALIDATE
+)
+
 # Rate limiting configuration
 RATE_LIMIT_REQUESTS_PER_HOUR = 100  # Max requests per hour per IP
 RATE_LIMIT_BLOCK_DURATION = 3600    # Block duration in seconds (1 hour)
 
-# In-memory storage for rate limiting (in production, use Redis)
-rate_limit_storage = defaultdict(list)
+# Per-IP limiter for the signed product endpoints; state is shared between workers
+# through the rate limit backend (SQLite when RATE_LIMIT_BACKEND=sqlite)
+ip_rate_limiter = GCRARateLimiter(
+    RATE_LIMIT_REQUESTS_PER_HOUR, RATE_LIMIT_BLOCK_DURATION, config.RATE_LIMIT_MAX_KEYS, name='api_ip'
+)
+security_manager.rate_limit_backend.attach(ip_rate_limiter)
 
 # ===== HMAC SIGNATURE FUNCTIONS =====
 def generate_hmac_signature(data: str, secret: str) -> str:
@@ -59,82 +107,155 @@ def verify_hmac_signature(data: str, signature: str, secret: str) -> bool:
 
 # ===== MODX API FUNCTIONS =====
 async def load_products_from_modx_api(category_id: str = None) -> list:
-    """Загружает товары через MODX API"""
+    """Загружает товары через MODX API (одновременные одинаковые запросы объединяются)"""
+    return await modx_fallback.do(('products', category_id), lambda: _fetch_products_from_modx_api(category_id))
+
+async def load_categories_from_modx_api() -> list:
+    """Загружает категории через MODX API (одновременные запросы объединяются)"""
+    return await modx_fallback.do(('categories',), _fetch_categories_from_modx_api)
+
+async def _fetch_products_from_modx_api(category_id: str = None) -> list:
+    key = ('products', category_id)
     try:
-        url = f"{MODX_API_BASE_URL}/api-products.json"
         params = {'category': category_id} if category_id else {}
-        
-        # Настройка SSL для Heroku
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        
-        async with aiohttp.ClientSession(
-            connector=connector,
-            timeout=aiohttp.ClientTimeout(total=MODX_API_TIMEOUT)
-        ) as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get('products', [])
-                else:
-                    text = await response.text()
-                    logger.error(f"API: Ошибка MODX API: {response.status} - {text}")
-                    return []
+        data = await modx_client.get_json('api-products.json', params=params)
+        return remember_modx_result(key, data.get('products', []))
+    except CircuitOpenError as e:
+        logger.warning(f"API: MODX API недоступен ({e})")
+    except ModxApiError as e:
+        logger.error(f"API: Ошибка MODX API: {e}")
     except Exception as e:
         logger.error(f"API: Ошибка загрузки из MODX API: {e}")
-        return []
+    return last_good_modx_result(key)
 
-async def load_categories_from_modx_api() -> list:
-    """Загружает категории через MODX API"""
+async def _fetch_categories_from_modx_api() -> list:
+    key = ('categories',)
     try:
-        url = f"{MODX_API_BASE_URL}/api-categories.json"
-        
-        # Настройка SSL для Heroku
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        
-        async with aiohttp.ClientSession(
-            connector=connector,
-            timeout=aiohttp.ClientTimeout(total=MODX_API_TIMEOUT)
-        ) as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get('categories', [])
-                else:
-                    text = await response.text()
-                    logger.error(f"API: Ошибка MODX API: {response.status} - {text}")
-                    return []
+        data = await modx_client.get_json('api-categories.json')
+        return remember_modx_result(key, data.get('categories', []))
+    except CircuitOpenError as e:
+        logger.warning(f"API: MODX API недоступен ({e})")
+    except ModxApiError as e:
+        logger.error(f"API: Ошибка MODX API: {e}")
     except Exception as e:
         logger.error(f"API: Ошибка загрузки из MODX API: {e}")
         import traceback
         logger.error(f"API: Traceback: {traceback.format_exc()}")
-        return []
+    return last_good_modx_result(key)
+
+def remember_modx_result(key, items: list) -> list:
+    """Keeps the last non-empty MODX API result as last-known-good."""
+    if items:
+        modx_last_good[key] = items
+    return items
+
+def last_good_modx_result(key) -> list:
+    """Stale-but-fast answer while MODX is failing (empty if nothing was ever fetched)."""
+    items = modx_last_good.get(key, [])
+    if items:
+        logger.warning(f"API: Serving last known good MODX API result for {key}")
+    return items
+
+async def get_categories_table() -> dict:
+    """Категории MODX API по id, мемоизированные на MODX_CATEGORIES_TTL секунд."""
+    global categories_table, categories_table_expires
+    now = time.monotonic()
+    if now >= categories_table_expires:
+        categories = await load_categories_from_modx_api()
+        if categories:
+            categories_table = {str(category.get('id')): category for category in categories}
+            categories_table_expires = now + MODX_CATEGORIES_TTL
+        else:
+            # Keep serving the previous table, but do not retry on every request
+            categories_table_expires = now + min(MODX_CATEGORIES_TTL, 30)
+    return categories_table
+
+async def resolve_category_info(category_key: str):
+    """Возвращает {id, name, key} категории без обращения к MODX API, если кэш не пуст."""
+    snapshot = catalog_cache.get_snapshot()
+    if snapshot.categories_count:
+        return snapshot.index.category_info(category_key)
+
+    # Кэш пуст - используем мемоизированную таблицу категорий MODX API
+    category_id = category_key.replace('category_', '', 1)
+    category = (await get_categories_table()).get(category_id)
+    if category is None:
+        return None
+    return {"id": category['id'], "name": category['name'], "key": category_key}
+
+async def start_modx_client(app):
+    """Открывает пул соединений к MODX API при старте приложения."""
+    await modx_client.start()
+
+async def close_modx_client(app):
+    """Закрывает пул соединений к MODX API при остановке приложения."""
+    await modx_client.close()
+
+async def preload_static_assets(app):
+    """Loads and compresses the Web App assets before the first request."""
+    static_assets.preload()
+
+def current_catalog_event():
+    """SSE message for the current catalog version (None while the cache is empty)."""
+    snapshot = catalog_cache.get_snapshot()
+    body = snapshot.responses.get(RESPONSE_VERSION)
+    return version_event(snapshot.version, body.identity) if body is not None else None
+
+async def start_catalog_events(app):
+    """Запускает рассылку изменений версии каталога."""
+    catalog_events.start(current_catalog_event)
+
+async def close_catalog_events(app):
+    """Закрывает открытые потоки событий при остановке приложения."""
+    await catalog_events.close()
+
+async def start_catalog_refresher(app):
+    """Запускает обновление MODX кэша внутри процесса (MODX_INPROCESS_REFRESH)."""
+    # Imported lazily: the refresher pulls in scheduler_modx, which is only needed in this mode
+    from bot.catalog_refresher import CatalogRefresher
+    global catalog_refresher
+    catalog_refresher = CatalogRefresher(catalog_cache, config.MODX_REFRESH_INTERVAL)
+    catalog_refresher.start()
+
+async def start_catalog_cache(app):
+    """Запускает фоновую проверку файла MODX кэша (перезагрузка идет в отдельном потоке)."""
+    catalog_cache.start()
+
+async def close_catalog_cache(app):
+    """Останавливает фоновую проверку файла MODX кэша."""
+    await catalog_cache.close()
+
+def reload_catalog_now():
+    """Switches to the catalog version on disk right away (prefork supervisor signal)."""
+    catalog_cache.invalidate()
+
+async def start_coordinated_catalog_reloads(app):
+    """Reloads the catalog only when the supervisor says so, in step with the other workers."""
+    catalog_cache.check_interval = float('inf')
+    asyncio.get_running_loop().add_signal_handler(CATALOG_RELOAD_SIGNAL, reload_catalog_now)
+
+async def close_coordinated_catalog_reloads(app):
+    asyncio.get_running_loop().remove_signal_handler(CATALOG_RELOAD_SIGNAL)
+
+async def close_catalog_refresher(app):
+    """Останавливает обновление MODX кэша внутри процесса."""
+    global catalog_refresher
+    if catalog_refresher is not None:
+        await catalog_refresher.close()
+        catalog_refresher = None
+
+async def start_rate_limit_backend(app):
+    """Подключает общее хранилище лимитов запросов и событий безопасности."""
+    await security_manager.rate_limit_backend.start()
+
+async def close_rate_limit_backend(app):
+    """Сбрасывает буферы и закрывает хранилище лимитов запросов."""
+    await security_manager.rate_limit_backend.close()
 
 # ===== RATE LIMITING FUNCTIONS =====
 def check_rate_limit(ip_address: str) -> bool:
     """Check if IP address is within rate limits"""
-    current_time = time.time()
-    
-    # Clean old entries
-    rate_limit_storage[ip_address] = [
-        timestamp for timestamp in rate_limit_storage[ip_address]
-        if current_time - timestamp < 3600  # Keep only last hour
-    ]
-    
-    # Check if limit exceeded
-    if len(rate_limit_storage[ip_address]) >= RATE_LIMIT_REQUESTS_PER_HOUR:
-        return False
-    
-    # Add current request
-    rate_limit_storage[ip_address].append(current_time)
-    return True
+    return ip_rate_limiter.allow(ip_address)
 
 # ===== TOKEN GENERATION =====
 def generate_auth_token() -> dict:
@@ -172,14 +293,24 @@ async def get_auth_token(request):
 # Путь к директории с файлами Web App
 WEB_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_app')
 
+# Web App assets with precomputed ETags and compressed bodies
+static_assets = StaticAssetCache(WEB_APP_DIR)
+
 # Глобальная переменная для хранения данных о продуктах
 products_data = {}
 
-# Глобальная переменная для хранения MODX кэша
-modx_cache_data = {}
+# In-memory MODX cache snapshot, rebuilt in a thread only when the file changes on disk
+catalog_cache = CatalogCache(MODX_CACHE_FILE, binary_path=MODX_BINARY_FILE)
+
+# Open Mini App sessions notified about catalog version changes (SSE)
+catalog_events = CatalogEventHub()
 
-# API rate limiting store
-api_rate_limit_store = defaultdict(list)
+# In-process MODX refresher (only with MODX_INPROCESS_REFRESH, see start_catalog_refresher)
+catalog_refresher = None
+
+# Catalog version history written by scheduler_modx (delta feed)
+catalog_history = CatalogHistory(MODX_HISTORY_FILE)
+MAX_CATALOG_VERSION_LENGTH = 64
 
 async def load_products_data_for_api():
     """Загружает данные о продуктах из JSON-файла для API (старый парсер)."""
@@ -201,70 +332,29 @@ async def load_products_data_for_api():
 
 async def load_modx_cache_data():
     """Загружает данные из MODX кэша."""
-    global modx_cache_data
-    if os.path.exists(MODX_CACHE_FILE):
-        try:
-            with open(MODX_CACHE_FILE, 'r', encoding='utf-8') as f:
-                modx_cache_data = json.load(f)
-            logger.info(f"API: MODX cache loaded successfully - version {modx_cache_data.get('metadata', {}).get('version', 'unknown')}")
-        except json.JSONDecodeError as e:
-            logger.error(f"API: Ошибка при чтении MODX кэша '{MODX_CACHE_FILE}': {e}")
-            modx_cache_data = {}
-        except Exception as e:
-            logger.error(f"API: Неизвестная ошибка при загрузке MODX кэша: {e}")
-            modx_cache_data = {}
+    await catalog_cache.check()
+    snapshot = catalog_cache.get_snapshot()
+    if snapshot.is_empty:
+        logger.warning(f"API: MODX кэш '{MODX_CACHE_FILE}' пуст или не найден. Используем fallback на MODX API.")
     else:
-        logger.warning(f"API: MODX кэш '{MODX_CACHE_FILE}' не найден. Используем fallback на MODX API.")
-        modx_cache_data = {}
+        # Only the header: a mapped snapshot parses products/categories lazily
+        logger.info(f"API: MODX кэш загружен - версия {snapshot.version}, "
+                    f"товары: {'есть' if snapshot.has_products else 'нет'}, категорий: {snapshot.categories_count}")
 
 
 def get_modx_cache_products():
     """Возвращает продукты из MODX кэша."""
-    # Перезагружаем кэш при каждом запросе
-    if os.path.exists(MODX_CACHE_FILE):
-        try:
-            with open(MODX_CACHE_FILE, 'r', encoding='utf-8') as f:
-                current_cache = json.load(f)
-                return current_cache.get('products', {})
-        except json.JSONDecodeError:
-            return {}
-    return {}
+    return catalog_cache.get_snapshot().products
 
 
 def get_modx_cache_categories():
     """Возвращает категории из MODX кэша."""
-    # Перезагружаем кэш при каждом запросе
-    if os.path.exists(MODX_CACHE_FILE):
-        try:
-            with open(MODX_CACHE_FILE, 'r', encoding='utf-8') as f:
-                current_cache = json.load(f)
-                return current_cache.get('categories', [])
-        except json.JSONDecodeError:
-            return []
-    return []
+    return catalog_cache.get_snapshot().categories
 
 
 def get_modx_cache_metadata():
     """Возвращает метаданные MODX кэша."""
-    # Перезагружаем кэш при каждом запросе
-    logger.info(f"API: Checking MODX cache file: {MODX_CACHE_FILE}")
-    if os.path.exists(MODX_CACHE_FILE):
-        try:
-            # Проверяем размер файла
-            file_size = os.path.getsize(MODX_CACHE_FILE)
-            logger.info(f"API: MODX cache file size: {file_size} bytes")
-            
-            with open(MODX_CACHE_FILE, 'r', encoding='utf-8') as f:
-                current_cache = json.load(f)
-                metadata = current_cache.get('metadata', {})
-                logger.info(f"API: MODX cache metadata loaded - version {metadata.get('version', 'unknown')}")
-                return metadata
-        except json.JSONDecodeError as e:
-            logger.error(f"API: JSON decode error in MODX cache: {e}")
-            return {}
-    else:
-        logger.warning(f"API: MODX cache file not found: {MODX_CACHE_FILE}")
-    return {}
+    return catalog_cache.get_snapshot().metadata
 
 async def check_api_rate_limit(request, action: str = "api_request") -> bool:
     """Check API rate limiting."""
@@ -277,46 +367,23 @@ async def check_api_rate_limit(request, action: str = "api_request") -> bool:
     except Exception:
         client_ip = "unknown"
     
-    current_time = time.time()
     key = f"api_{client_ip}_{action}"
     
-    # Clean old entries
-    api_rate_limit_store[key] = [
-        timestamp for timestamp in api_rate_limit_store[key]
-        if current_time - timestamp < config.RATE_LIMIT_WINDOW
-    ]
-    
-    # Check if limit exceeded
-    if len(api_rate_limit_store[key]) >= config.RATE_LIMIT_MAX_REQUESTS:
+    # Same limiter engine (and limits) as the bot's SecurityMiddleware
+    limiter = security_manager.rate_limiter
+    if not limiter.allow(key):
         logger.warning(f"🚫 API rate limit exceeded for IP {client_ip}, action: {action}")
         security_manager._log_security_event("api_rate_limit_exceeded", {
             "client_ip": client_ip,
             "action": action,
-            "current_count": len(api_rate_limit_store[key])
+            "current_count": limiter.used(key)
         })
         return False
     
-    # Add current request
-    api_rate_limit_store[key].append(current_time)
     return True
 
-async def get_products_for_webapp(request):
-    """Отдает данные о продуктах для Web App, с возможностью фильтрации по категории."""
-    
-    # ===== RATE LIMITING =====
-    try:
-        client_ip = getattr(request, 'remote', None) or "unknown"
-    except Exception:
-        client_ip = "unknown"
-    if not check_rate_limit(client_ip):
-        logger.warning(f"API: Rate limit exceeded for IP {client_ip}")
-        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
-    
-    # ===== HMAC SIGNATURE VERIFICATION =====
+def verify_signed_request(request, client_ip: str):
+    """Проверяет HMAC подпись запроса. Возвращает ответ с ошибкой или None."""
     signature = request.headers.get('X-Signature')
     timestamp = request.headers.get('X-Timestamp')
     init_data = request.headers.get('X-Telegram-Init-Data', '')
@@ -353,98 +420,75 @@ async def get_products_for_webapp(request):
             'Expires': '0'
         })
     
+    return None
+
+async def get_products_for_webapp(request):
+    """Отдает данные о продуктах для Web App, с возможностью фильтрации по категории."""
+
+    # ===== RATE LIMITING =====
+    try:
+        client_ip = getattr(request, 'remote', None) or "unknown"
+    except Exception:
+        client_ip = "unknown"
+    if not check_rate_limit(client_ip):
+        logger.warning(f"API: Rate limit exceeded for IP {client_ip}")
+        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'Pragma': 'no-cache',
+            'Expires': '0'
+        })
+
+    # ===== HMAC SIGNATURE VERIFICATION =====
+    error_response = verify_signed_request(request, client_ip)
+    if error_response is not None:
+        return error_response
+
     requested_category = request.query.get('category')
 
     # Пытаемся загрузить из MODX кэша
     try:
-        products = get_modx_cache_products()
-        
-        if not products:
-            # Fallback на MODX API если кэш пустой
-            logger.warning("API: MODX cache products empty, falling back to MODX API")
-            # Преобразуем requested_category в category_id для MODX API
-            category_id = None
-            if requested_category and requested_category.startswith('category_'):
-                category_id = requested_category.replace('category_', '')
-            
-            products = await load_products_from_modx_api(category_id)
-        
+        snapshot = catalog_cache.get_snapshot()
+
+        if snapshot.has_products:
+            # Response bytes are prepared once per cache version
+            if requested_category:
+                prepared = snapshot.responses.get(category_response_key(requested_category))
+                if prepared is None:
+                    logger.warning(f"API: Категория {requested_category} не найдена в MODX кэше")
+                    return web.json_response({"error": "Category not found"}, status=404, headers=NO_CACHE_HEADERS)
+            else:
+                prepared = snapshot.responses[RESPONSE_PRODUCTS]
+            return prepared_response(request, prepared, headers=CATALOG_CACHE_HEADERS)
+
+        # Fallback на MODX API если кэш пустой
+        logger.warning("API: MODX cache products empty, falling back to MODX API")
+        # Преобразуем requested_category в category_id для MODX API
+        category_id = None
+        if requested_category and requested_category.startswith('category_'):
+            category_id = requested_category.replace('category_', '')
+
+        products = await load_products_from_modx_api(category_id)
+
         if products:
             
             # Если запрашивается конкретная категория, фильтруем продукты по parent_id
             if requested_category and category_id:
-                filtered_products = [p for p in products if p.get('parent_id') == category_id]
-                products = filtered_products
-            
-            # Преобразуем MODX API данные в формат парсера (по категориям)
-            products_by_category = {}
-            
-            for product in products:
-                try:
-                    product_category_id = product['parent_id']
-                except KeyError as e:
-                    logger.error(f"API: Ошибка в структуре продукта: {e}, продукт: {product}")
-                    continue
-                
-                # Создаем ключ категории в формате парсера
-                category_key = f"category_{product_category_id}"
-                
-                if category_key not in products_by_category:
-                    products_by_category[category_key] = []
-                
-                # Преобразуем продукт в формат парсера
-                try:
-                    # Очищаем цену и вес от пробелов и запятых
-                    clean_price = str(product['price']).replace(' ', '').replace(',', '.')
-                    clean_weight = str(product['weight']).replace(' ', '').replace(',', '.')
-                    
-                    formatted_product = {
-                        "id": product['id'],
-                        "name": product['pagetitle'],
-                        "url": f"https://drazhin.by/{product.get('alias', '')}",
-                        "image": product.get('image', ''),
-                        "price": str(float(clean_price)),
-                        "short_description": product.get('product_description', 'N/A'),
-                        "weight": str(int(float(clean_weight))),
-                        "for_vegans": product.get('product_vegan', 'N/A'),
-                        "availability_days": product.get('product_days_order', 'N/A'),
-                        "ingredients": product.get('product_structure', 'N/A'),
-                        "calories": product.get('product_calories', 'N/A'),
-                        "energy_value": product.get('product_bgu', 'N/A'),
-                        "images": product.get('images', []),
-                        "menuindex": product.get('menuindex', 0)
-                    }
-                    
-                    products_by_category[category_key].append(formatted_product)
-                except (ValueError, KeyError) as e:
-                    logger.error(f"API: Ошибка форматирования продукта {product.get('id', 'unknown')}: {e}")
-                    continue
+                products = [p for p in products if p.get('parent_id') == category_id]
             
-            # Сортируем продукты по menuindex
-            for category_key in products_by_category:
-                products_by_category[category_key].sort(key=lambda x: int(x.get('menuindex', 0)))
+            # Преобразуем MODX API данные в формат парсера (по категориям, отсортировано по menuindex)
+            index = CatalogIndex.from_modx_products(products)
             
             # Если запрашивается конкретная категория, возвращаем только её
             if requested_category:
-                if requested_category in products_by_category:
-                    # Получаем информацию о категории
-                    categories = await load_categories_from_modx_api()
-                    category_info = None
-                    if categories:
-                        for cat in categories:
-                            if cat['id'] == category_id:
-                                category_info = {
-                                    "id": cat['id'],
-                                    "name": cat['name'],
-                                    "key": requested_category
-                                }
-                                break
-                    
+                category_record = index.category(requested_category)
+                if category_record is not None:
+                    # Получаем информацию о категории (из кэша или мемоизированной таблицы)
+                    category_info = await resolve_category_info(requested_category)
                     
                     # Возвращаем объект с информацией о категории и продуктами
                     response_data = {
                         "category": category_info,
-                        "products": products_by_category[requested_category]
+                        "products": category_record.product_list()
                     }
                     
                     return web.json_response(response_data, headers={
@@ -453,7 +497,7 @@ async def get_products_for_webapp(request):
                         'Expires': '0'
                     })
                 else:
-                    logger.warning(f"API: Категория {requested_category} не найдена в products_by_category")
+                    logger.warning(f"API: Категория {requested_category} не найдена в ответе MODX API")
                     return web.json_response({"error": "Category not found"}, status=404, headers={
                         'Cache-Control': 'no-cache, no-store, must-revalidate',
                         'Pragma': 'no-cache',
@@ -461,7 +505,7 @@ async def get_products_for_webapp(request):
                     })
             else:
                 # Возвращаем все категории
-                return web.json_response(products_by_category, headers={
+                return web.json_response(index.products_by_category(), headers={
                     'Cache-Control': 'no-cache, no-store, must-revalidate',
                     'Pragma': 'no-cache',
                     'Expires': '0'
@@ -508,6 +552,25 @@ async def get_products_for_webapp(request):
             'Expires': '0'
         })
 
+async def get_product_for_webapp(request):
+    """Отдает один продукт по id из MODX кэша."""
+    try:
+        client_ip = getattr(request, 'remote', None) or "unknown"
+    except Exception:
+        client_ip = "unknown"
+    if not check_rate_limit(client_ip):
+        logger.warning(f"API: Rate limit exceeded for IP {client_ip}")
+        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers=NO_CACHE_HEADERS)
+
+    error_response = verify_signed_request(request, client_ip)
+    if error_response is not None:
+        return error_response
+
+    prepared = catalog_cache.get_snapshot().responses.get(product_response_key(request.match_info['product_id']))
+    if prepared is None:
+        return web.json_response({"error": "Product not found"}, status=404, headers=NO_CACHE_HEADERS)
+    return prepared_response(request, prepared, headers=CATALOG_CACHE_HEADERS)
+
 async def get_all_data_for_webapp(request):
     """Отдает ВСЕ данные (продукты + категории) из MODX кэша."""
     # Check rate limiting
@@ -520,24 +583,12 @@ async def get_all_data_for_webapp(request):
     
     # Пытаемся загрузить из MODX кэша
     try:
-        products = get_modx_cache_products()
-        categories = get_modx_cache_categories()
-        metadata = get_modx_cache_metadata()
+        snapshot = catalog_cache.get_snapshot()
         
-        if products or categories:
-            # Возвращаем данные из кэша
-            response_data = {
-                "products": products,
-                "categories": categories,
-                "metadata": metadata
-            }
-            
-            logger.info(f"API: All data served from MODX cache - version {metadata.get('version', 'unknown')}")
-            return web.json_response(response_data, headers={
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            })
+        if not snapshot.is_empty:
+            # Возвращаем данные из кэша (ready bytes prepared once per cache version)
+            logger.info(f"API: All data served from MODX cache - version {snapshot.version}")
+            return prepared_response(request, snapshot.responses[RESPONSE_ALL], headers=CATALOG_CACHE_HEADERS)
         else:
             # Fallback на MODX API если кэш пустой
             logger.warning("API: MODX cache is empty, falling back to MODX API")
@@ -564,6 +615,49 @@ async def get_all_data_for_webapp(request):
         return web.json_response({"error": "Internal server error"}, status=500)
 
 
+async def get_catalog_version_for_webapp(request):
+    """Отдает только версию каталога, чтобы клиент мог не загружать его повторно.
+
+    Served from bytes prepared with the snapshot: no file access and no logging.
+    """
+    if not await check_api_rate_limit(request, "get_version"):
+        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers=NO_CACHE_HEADERS)
+
+    prepared = catalog_cache.get_snapshot().responses.get(RESPONSE_VERSION)
+    if prepared is None:
+        return web.json_response({"error": "Catalog is not available"}, status=503, headers=NO_CACHE_HEADERS)
+    return prepared_response(request, prepared, headers=CATALOG_CACHE_HEADERS)
+
+
+async def stream_catalog_events(request):
+    """Поток Server-Sent Events: текущая версия каталога и все ее изменения."""
+    if not await check_api_rate_limit(request, "catalog_events"):
+        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers=NO_CACHE_HEADERS)
+
+    client_ip = request.headers.get('X-Forwarded-For') or getattr(request, 'remote', None) or "unknown"
+    return await catalog_events.stream(request, client_ip)
+
+
+async def get_catalog_changes_for_webapp(request):
+    """Отдает изменения каталога начиная с версии ?since=<version>.
+
+    Falls back to the full catalog ("full": true) when the version is no longer
+    in the history window.
+    """
+    if not await check_api_rate_limit(request, "get_changes"):
+        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers=NO_CACHE_HEADERS)
+
+    since = request.query.get('since', '')
+    if not since or len(since) > MAX_CATALOG_VERSION_LENGTH:
+        return web.json_response({"error": "Missing or invalid 'since' version"}, status=400,
+                                 headers=NO_CACHE_HEADERS)
+
+    snapshot = catalog_cache.get_snapshot()
+    if snapshot.is_empty:
+        return web.json_response({"error": "Catalog is not available"}, status=503, headers=NO_CACHE_HEADERS)
+    return prepared_response(request, catalog_history.delta_response(since, snapshot), headers=CATALOG_CACHE_HEADERS)
+
+
 async def get_categories_for_webapp(request):
     """Отдает список категорий для Web App."""
     # Check rate limiting
@@ -576,16 +670,12 @@ async def get_categories_for_webapp(request):
     
     # Пытаемся загрузить из MODX кэша
     try:
-        categories = get_modx_cache_categories()
+        snapshot = catalog_cache.get_snapshot()
         
-        if categories:
+        if snapshot.categories_count:
             # Возвращаем категории из кэша
-            logger.info(f"API: Categories served from MODX cache - {len(categories)} categories")
-            return web.json_response(categories, headers={
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            })
+            logger.info(f"API: Categories served from MODX cache - {snapshot.categories_count} categories")
+            return prepared_response(request, snapshot.responses[RESPONSE_CATEGORIES], headers=CATALOG_CACHE_HEADERS)
         else:
             # Fallback на MODX API
             logger.warning("API: MODX cache categories empty, falling back to MODX API")
@@ -658,28 +748,54 @@ async def serve_main_app_page(request):
     """Отдает главный HTML файл Web App."""
     return web.FileResponse(os.path.join(WEB_APP_DIR, 'index.html'))
 
-async def setup_api_server():
-    """Настраивает и возвращает AioHTTP Web Application Runner."""
+async def setup_api_server(refresh_catalog: Optional[bool] = None, coordinated_reloads: bool = False):
+    """Настраивает и возвращает AioHTTP Web Application Runner.
+
+    refresh_catalog overrides MODX_INPROCESS_REFRESH (prefork runs it in one
+    worker only); with coordinated_reloads the catalog is reloaded on the
+    supervisor's CATALOG_RELOAD_SIGNAL instead of on its own file checks.
+    """
     app = web.Application()
 
     # Add security headers middleware
     app.middlewares.append(security_headers_middleware)
 
+    # Pooled MODX API session lives as long as the app
+    app.on_startup.append(start_modx_client)
+    app.on_cleanup.append(close_modx_client)
+    app.on_startup.append(start_rate_limit_backend)
+    app.on_cleanup.append(close_rate_limit_backend)
+    app.on_startup.append(preload_static_assets)
+    app.on_startup.append(start_catalog_events)
+    app.on_shutdown.append(close_catalog_events)
+    if config.MODX_INPROCESS_REFRESH if refresh_catalog is None else refresh_catalog:
+        app.on_startup.append(start_catalog_refresher)
+        app.on_cleanup.append(close_catalog_refresher)
+    if coordinated_reloads:
+        app.on_startup.append(start_coordinated_catalog_reloads)
+        app.on_shutdown.append(close_coordinated_catalog_reloads)
+    app.on_startup.append(start_catalog_cache)
+    app.on_cleanup.append(close_catalog_cache)
+
     # Загружаем данные о продуктах при настройке сервера (ПАРСЕР - ЗАКОММЕНТИРОВАН)
     # await load_products_data_for_api()
     
     # Загружаем MODX кэш при настройке сервера
-    # MODX кэш будет загружаться при каждом запросе
-    # await load_modx_cache_data()  # Убрано - загружаем при каждом запросе
+    # The snapshot is then swapped automatically whenever the file changes
+    await load_modx_cache_data()
 
     # ДОБАВЛЕНО: Перенаправление с корневого пути на '/bot-app/'
     app.router.add_get('/', lambda r: web.HTTPFound('/bot-app/'))
 
     # 1. Маршрут для получения ВСЕХ данных (продукты + категории)
     app.router.add_get('/bot-app/api/all', get_all_data_for_webapp)
+    app.router.add_get('/bot-app/api/version', get_catalog_version_for_webapp)
+    app.router.add_get('/bot-app/api/changes', get_catalog_changes_for_webapp)
+    app.router.add_get('/bot-app/api/events', stream_catalog_events)
 
     # 2. Маршрут для получения всех продуктов (или по категории) - СОХРАНЕН для совместимости
     app.router.add_get('/bot-app/api/products', get_products_for_webapp)
+    app.router.add_get('/bot-app/api/products/{product_id}', get_product_for_webapp)
 
     # 3. Маршрут для получения категорий - СОХРАНЕН для совместимости
     app.router.add_get('/bot-app/api/categories', get_categories_for_webapp)
@@ -693,60 +809,15 @@ async def setup_api_server():
     # 4. Маршрут для статических файлов Web App (CSS, JS, images) внутри /bot-app/
     # Добавляем обработчик для статических файлов с контролем кеширования
     async def serve_static_with_cache_control(request):
-        """Serves static files with proper cache control headers."""
-        file_path = request.match_info.get('filename', '')
-        full_path = os.path.join(WEB_APP_DIR, file_path)
-        
-        if os.path.exists(full_path) and os.path.isfile(full_path):
-            # Read file content first
-            try:
-                with open(full_path, 'rb') as f:
-                    content = f.read()
-            except Exception as e:
-                logger.error(f"Error reading file {full_path}: {e}")
-                return web.Response(status=500, text="Error reading file")
-            
-            # Определяем тип содержимого на основе расширения файла
-            content_type = 'text/html'
-            if file_path.endswith('.css'):
-                content_type = 'text/css'
-            elif file_path.endswith('.js'):
-                content_type = 'application/javascript'
-            elif file_path.endswith('.png'):
-                content_type = 'image/png'
-            elif file_path.endswith('.jpg') or file_path.endswith('.jpeg'):
-                content_type = 'image/jpeg'
-            elif file_path.endswith('.svg'):
-                content_type = 'image/svg+xml'
-            
-
-            
-            # Check if file has version query parameter (e.g., ?v=1.2.0)
-            query_string = request.query_string
-            has_version = 'v=' in query_string
-            
-            # Create stable content hash for ETag
-            content_hash = create_content_hash(content)
-            
-            if has_version:
-                # Versioned files should be cached for a long time
-                headers = {
-                    'Content-Type': content_type,
-                    'Cache-Control': 'public, max-age=31536000',  # 1 year
-                    'ETag': f'"{content_hash}"'
-                }
-            else:
-                # Non-versioned files should not be cached
-                headers = {
-                    'Content-Type': content_type,
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            
-            return web.Response(body=content, headers=headers)
-        else:
+        """Serves static files with ETags; Cache-Control comes from the route class
+        (versioned ?v= URLs are immutable, see security_headers_middleware)."""
+        asset = static_assets.get(request.match_info.get('filename', ''))
+        if asset is None:
             return web.Response(status=404, text="File not found")
+        if asset.body is None:
+            # Large images are streamed from disk (FileResponse handles ETag/304 itself)
+            return web.FileResponse(asset.path)
+        return prepared_response(request, asset.body)
     
     # Маршрут для статических файлов с умным контролем кеширования
     app.router.add_get(r'/bot-app/{filename:.+\.(css|js|png|jpg|jpeg|svg|ico)}', serve_static_with_cache_control)
@@ -0,0 +1,266 @@
+"""
+Cart Store
+Shopping carts of the bot users: user_id -> {product_id: quantity}.
+
+Carts are read and changed in memory in O(1) (an LRU bounded to `max_entries`
+users), so the cart helpers in bot.main stay synchronous. Durability is
+write-behind: every cart touched since the last flush is written to a WAL-mode
+SQLite table in one batch every `flush_interval` seconds, off the request path.
+Carts survive restarts and deploys; carts untouched for `ttl` seconds are
+abandoned and expire both in memory and on disk.
+
+A cart that was evicted from memory (or belongs to a user not seen since the
+restart) is loaded back by CartMiddleware before the handler runs.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+import aiosqlite
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+CART_STORE_MAX_ENTRIES = int(os.environ.get('CART_STORE_MAX_ENTRIES', '10000'))
+CART_TTL = float(os.environ.get('CART_TTL', str(7 * 24 * 3600)))
+CART_FLUSH_INTERVAL = float(os.environ.get('CART_FLUSH_INTERVAL', '2.0'))
+
+# How often (seconds) expired carts are purged from the database
+_PURGE_INTERVAL = 3600
+
+
+class _Entry:
+    __slots__ = ('cart', 'touched')
+
+    def __init__(self, cart: Dict[str, Any], touched: float):
+        self.cart = cart
+        self.touched = touched
+
+
+class CartStore(MutableMapping):
+    """LRU of carts in memory with write-behind persistence to SQLite.
+
+    Without start() (e.g. in tests) it is a plain bounded in-memory mapping.
+    Reading a cart counts as activity: the cart is written back with a fresh
+    timestamp, which also persists changes made through the returned dict.
+    `in` and get() only peek and change nothing.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = CART_STORE_MAX_ENTRIES,
+                 ttl: float = CART_TTL, flush_interval: float = CART_FLUSH_INTERVAL,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._entries: 'OrderedDict[Any, _Entry]' = OrderedDict()
+        # Carts to write on the next flush: in memory (dirty) or already evicted
+        self._dirty = set()
+        self._evicted: Dict[Any, Optional[str]] = {}
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    # ----- MutableMapping (memory only, O(1)) -----
+
+    def __getitem__(self, user_id) -> Dict[str, Any]:
+        entry = self._entries[user_id]
+        now = self.clock()
+        if now - entry.touched > self.ttl:
+            # Abandoned cart
+            del self[user_id]
+            raise KeyError(user_id)
+        entry.touched = now
+        self._entries.move_to_end(user_id)
+        self._dirty.add(user_id)
+        return entry.cart
+
+    def __contains__(self, user_id) -> bool:
+        # A membership check is not activity: no refresh, no LRU move, no write
+        return self._live_entry(user_id) is not None
+
+    def get(self, user_id, default=None):
+        """Peek at a cart without counting it as activity (unlike cart_store[user_id])."""
+        entry = self._live_entry(user_id)
+        return default if entry is None else entry.cart
+
+    def _live_entry(self, user_id) -> Optional[_Entry]:
+        entry = self._entries.get(user_id)
+        if entry is None or self.clock() - entry.touched > self.ttl:
+            return None
+        return entry
+
+    def __setitem__(self, user_id, cart: Dict[str, Any]):
+        self._entries[user_id] = _Entry(cart, self.clock())
+        self._entries.move_to_end(user_id)
+        self._dirty.add(user_id)
+        self._evicted.pop(user_id, None)
+        while len(self._entries) > self.max_entries:
+            self._evict()
+
+    def __delitem__(self, user_id):
+        del self._entries[user_id]
+        self._dirty.discard(user_id)
+        if self.db_path is not None:
+            # Deleted on disk with the next flush
+            self._evicted[user_id] = None
+
+    def __iter__(self) -> Iterator:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        user_id, entry = self._entries.popitem(last=False)
+        if user_id in self._dirty:
+            self._dirty.discard(user_id)
+            if self.db_path is not None:
+                self._evicted[user_id] = _serialize(entry.cart)
+
+    # ----- persistence -----
+
+    async def start(self):
+        """Open the database, load recent carts and start the flush loop (idempotent)."""
+        if self._db is not None or self.db_path is None:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = await aiosqlite.connect(self.db_path, timeout=5)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS carts ("
+            "user_id INTEGER PRIMARY KEY, items TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        await self._db.commit()
+
+        loaded = 0
+        async with self._db.execute(
+            "SELECT user_id, items, updated_at FROM carts WHERE updated_at >= ? ORDER BY updated_at DESC LIMIT ?",
+            (self.clock() - self.ttl, self.max_entries)
+        ) as cursor:
+            async for user_id, items, updated_at in cursor:
+                if user_id not in self._entries:
+                    self._entries[user_id] = _Entry(json.loads(items), updated_at)
+                    self._entries.move_to_end(user_id, last=False)
+                    loaded += 1
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Cart store: Started - {self.db_path} ({loaded} carts restored)")
+
+    async def close(self):
+        """Stop the flush loop, write what is pending and close the database."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.flush()
+            await self._db.close()
+            self._db = None
+
+    async def load(self, user_id):
+        """Bring the cart of user_id into memory if it is only on disk."""
+        if user_id in self._entries:
+            return
+        if user_id in self._evicted:
+            items = self._evicted[user_id]
+            if items is not None:
+                self[user_id] = json.loads(items)
+            return
+        if self._db is None:
+            return
+        async with self._db.execute(
+            "SELECT items FROM carts WHERE user_id = ? AND updated_at >= ?", (user_id, self.clock() - self.ttl)
+        ) as cursor:
+            row = await cursor.fetchone()
+        # The user may have started a new cart while the query ran
+        if row is not None and user_id not in self._entries and user_id not in self._evicted:
+            self._entries[user_id] = _Entry(json.loads(row[0]), self.clock())
+            while len(self._entries) > self.max_entries:
+                self._evict()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Cart store: Flush failed: {e}")
+
+    async def flush(self):
+        """Write all carts touched since the last flush in one transaction."""
+        if self._db is None:
+            return
+        async with self._flush_lock:
+            now = self.clock()
+            pending = dict(self._evicted)
+            for user_id in self._dirty:
+                entry = self._entries.get(user_id)
+                pending[user_id] = _serialize(entry.cart) if entry is not None else None
+            self._dirty.clear()
+            self._evicted.clear()
+            upserts = [(user_id, items, now) for user_id, items in pending.items() if items is not None]
+            deletes = [(user_id,) for user_id, items in pending.items() if items is None]
+            try:
+                if upserts:
+                    await self._db.executemany(
+                        "INSERT INTO carts (user_id, items, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (user_id) DO UPDATE SET items = excluded.items, updated_at = excluded.updated_at",
+                        upserts
+                    )
+                if deletes:
+                    await self._db.executemany("DELETE FROM carts WHERE user_id = ?", deletes)
+                if now - self._last_purge >= _PURGE_INTERVAL:
+                    self._last_purge = now
+                    await self._db.execute("DELETE FROM carts WHERE updated_at < ?", (now - self.ttl,))
+                await self._db.commit()
+            except Exception:
+                # Retried with the next flush unless the cart has changed since
+                for user_id, items in pending.items():
+                    if user_id in self._entries:
+                        self._dirty.add(user_id)
+                    else:
+                        self._evicted.setdefault(user_id, items)
+                raise
+
+
+def _serialize(cart: Dict[str, Any]) -> Optional[str]:
+    """JSON of a cart; None for an empty cart (the row is deleted)."""
+    if not cart:
+        return None
+    return json.dumps(cart, ensure_ascii=False, separators=(',', ':'))
+
+
+class CartMiddleware(BaseMiddleware):
+    """Loads the user's cart into the store's memory before the handler runs."""
+
+    def __init__(self, store: CartStore):
+        self.store = store
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is not None:
+            try:
+                await self.store.load(user.id)
+            except Exception as e:
+                logger.error(f"Cart store: Failed to load cart of user {user.id}: {e}")
+        return await handler(event, data)
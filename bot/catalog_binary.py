@@ -0,0 +1,179 @@
+"""
+Binary MODX Catalog
+Compact on-disk form of the prepared catalog responses (data/modx_cache.bin),
+written by scheduler_modx next to modx_cache.json.
+
+API processes mmap the file and serve per-product and per-category bodies as
+slices of the mapping: nothing is parsed or compressed at startup, and the
+pages are shared between workers through the OS page cache, so the memory of a
+worker does not grow with the catalog.
+
+Layout (little-endian, offsets are absolute):
+
+    header   magic, entry count, meta length, total file length
+    meta     JSON {"metadata", "products_count", "categories_count"}
+    index    one fixed-size entry per response key, sorted by the UTF-8 key:
+             key/tag location and (offset, length) of the identity, gzip
+             and br bodies (length 0 = variant absent)
+    strings  keys, each followed by its ETag tag
+    blobs    response bodies
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator
+
+from bot.http_cache import PreparedBody
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'BKCAT\x00\x00\x01'
+HEADER = struct.Struct('<8sIIQ')
+# key offset, key length, tag length, then (offset, length) of identity/gzip/br
+ENTRY = struct.Struct('<QHH' + 'QI' * 3)
+
+
+def binary_catalog_path(json_path: str) -> str:
+    """data/modx_cache.json -> data/modx_cache.bin"""
+    return os.path.splitext(json_path)[0] + '.bin'
+
+
+def write_binary_catalog(path: str, responses: Mapping, metadata: Dict[str, Any],
+                         products_count: int = 0, categories_count: int = 0):
+    """Write prepared responses (key -> PreparedBody) atomically to path."""
+    meta = json.dumps({
+        "metadata": metadata,
+        "products_count": products_count,
+        "categories_count": categories_count
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    keys = sorted(key.encode('utf-8') for key in responses)
+
+    index_offset = HEADER.size + len(meta)
+    strings_offset = index_offset + ENTRY.size * len(keys)
+    strings = bytearray()
+    locations = []
+    for key in keys:
+        tag = responses[key.decode('utf-8')].etags[None].strip('"').encode('utf-8')
+        locations.append((strings_offset + len(strings), len(key), len(tag)))
+        strings += key + tag
+
+    blobs_offset = strings_offset + len(strings)
+    blobs = bytearray()
+    index = bytearray()
+    for key, (key_offset, key_length, tag_length) in zip(keys, locations):
+        body = responses[key.decode('utf-8')]
+        fields = [key_offset, key_length, tag_length]
+        for variant in (body.identity, body.gzip, body.br):
+            if variant:
+                fields += [blobs_offset + len(blobs), len(variant)]
+                blobs += variant
+            else:
+                fields += [0, 0]
+        index += ENTRY.pack(*fields)
+
+    length = blobs_offset + len(blobs)
+    temp_file = f"{path}.tmp"
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(keys), len(meta), length))
+            f.write(meta)
+            f.write(index)
+            f.write(strings)
+            f.write(blobs)
+        os.replace(temp_file, path)
+    except OSError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+class MappedBody(PreparedBody):
+    """PreparedBody whose variants are memoryview slices of a MappedCatalog."""
+
+    __slots__ = ()
+
+    def __init__(self, identity, gzip, br, tag: str):
+        self.content_type = 'application/json'
+        self.charset = 'utf-8'
+        self.identity = identity
+        self.gzip = gzip
+        self.br = br
+        self.etags = {None: f'"{tag}"'}
+        if gzip is not None:
+            self.etags['gzip'] = f'"{tag}-gzip"'
+        if br is not None:
+            self.etags['br'] = f'"{tag}-br"'
+
+
+class _SortedKeys:
+    """Sequence view of the index keys, for bisect without materializing them."""
+
+    def __init__(self, catalog: 'MappedCatalog'):
+        self._catalog = catalog
+
+    def __len__(self) -> int:
+        return len(self._catalog)
+
+    def __getitem__(self, position: int) -> bytes:
+        return self._catalog._key(position)
+
+
+class MappedCatalog(Mapping):
+    """Read-only mapping response key -> MappedBody over an mmap'ed catalog file.
+
+    The mapping is never closed explicitly: bodies of in-flight responses may
+    still reference it, and a replaced file stays readable until the last
+    reference is gone.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError("file too short")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, meta_length, length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"unknown format {magic!r}")
+        if length != len(self._map):
+            raise ValueError(f"truncated file ({len(self._map)} of {length} bytes)")
+        meta = json.loads(self._map[HEADER.size:HEADER.size + meta_length])
+        self.metadata: Dict[str, Any] = meta.get('metadata') or {}
+        self.products_count: int = meta.get('products_count', 0)
+        self.categories_count: int = meta.get('categories_count', 0)
+        self._view = memoryview(self._map)
+        self._index_offset = HEADER.size + meta_length
+        self._count = count
+        self._keys = _SortedKeys(self)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self._count):
+            yield self._key(position).decode('utf-8')
+
+    def __getitem__(self, key: str) -> MappedBody:
+        encoded = key.encode('utf-8')
+        position = bisect.bisect_left(self._keys, encoded)
+        if position == self._count or self._key(position) != encoded:
+            raise KeyError(key)
+
+        fields = ENTRY.unpack_from(self._map, self._index_offset + position * ENTRY.size)
+        key_offset, key_length, tag_length = fields[:3]
+        tag_offset = key_offset + key_length
+        variants = []
+        for offset, length in zip(fields[3::2], fields[4::2]):
+            variants.append(self._view[offset:offset + length] if length else None)
+        tag = self._map[tag_offset:tag_offset + tag_length].decode('utf-8')
+        return MappedBody(*variants, tag)
+
+    def _key(self, position: int) -> bytes:
+        key_offset, key_length = struct.unpack_from(
+            '<QH', self._map, self._index_offset + position * ENTRY.size
+        )
+        return self._map[key_offset:key_offset + key_length]
@@ -0,0 +1,370 @@
+"""
+MODX Catalog Cache
+Keeps a single immutable in-memory snapshot of data/modx_cache.json and swaps it
+atomically when the file changes on disk. A background task stats the file every
+`check_interval` seconds; a changed file is parsed, indexed and compressed in a
+worker thread and only the finished snapshot is swapped in on the event loop, so
+get_snapshot() is a plain attribute read and never touches the disk.
+Every snapshot carries its API response bodies already serialized and compressed.
+A snapshot is only ever replaced by a newer valid one: if the file disappears or
+becomes unparsable, the last known good snapshot keeps being served.
+When the binary catalog (data/modx_cache.bin) is available, it is preferred: its
+bodies are served straight from an mmap and nothing is parsed on load.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import struct
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Tuple
+
+from bot.catalog_binary import MappedCatalog
+from bot.catalog_index import CatalogIndex
+from bot.http_cache import PreparedBody
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) the background task stats the cache file for changes
+CATALOG_RELOAD_CHECK_INTERVAL = float(os.environ.get('CATALOG_RELOAD_CHECK_INTERVAL', '1.0'))
+
+# (inode, mtime_ns, size) of the file the snapshot was parsed from
+FileSignature = Tuple[int, int, int]
+
+# Keys of the prepared response bodies kept on every snapshot
+RESPONSE_ALL = 'all'
+RESPONSE_PRODUCTS = 'products'
+RESPONSE_CATEGORIES = 'categories'
+RESPONSE_VERSION = 'version'
+
+
+def category_response_key(category_key: str) -> str:
+    """Key of the prepared body for /api/products?category=<category_key>."""
+    return f"products:{category_key}"
+
+
+def product_response_key(product_id: Any) -> str:
+    """Key of the prepared body for /api/products/<product_id>."""
+    return f"product:{product_id}"
+
+
+def build_catalog_responses(index: CatalogIndex, categories: List[Dict[str, Any]],
+                            metadata: Dict[str, Any]) -> Dict[str, PreparedBody]:
+    """Serialize and compress every catalog API response for one snapshot.
+
+    ETags are derived from metadata.version (an ETag only has to be unique per
+    URL); bodies of a cache without a version fall back to content hashes.
+    """
+    tag = metadata.get('version') or None
+    products = index.products_by_category()
+    responses = {
+        RESPONSE_ALL: PreparedBody.from_json({
+            "products": products,
+            "categories": categories,
+            "metadata": metadata
+        }, tag),
+        RESPONSE_PRODUCTS: PreparedBody.from_json(products, tag),
+        RESPONSE_CATEGORIES: PreparedBody.from_json(categories, tag),
+        RESPONSE_VERSION: PreparedBody.from_json({
+            "version": metadata.get('version'),
+            "last_updated": metadata.get('last_updated'),
+            "products_count": metadata.get('products_count', len(index.products)),
+            "categories_count": metadata.get('categories_count', len(categories))
+        }, tag),
+    }
+
+    for category_key, category in index.categories.items():
+        responses[category_response_key(category_key)] = PreparedBody.from_json({
+            "category": category.info,
+            "products": products[category_key]
+        }, tag)
+    for product_id, product in index.products.items():
+        responses[product_response_key(product_id)] = PreparedBody.from_json(product.data, tag)
+    return responses
+
+
+class CatalogSnapshot:
+    """Immutable view of one version of the MODX catalog.
+
+    Consumers must treat the containers as read-only: the same objects are
+    shared by every request served from this snapshot.
+    """
+
+    __slots__ = ('products', 'categories', 'metadata', 'version', 'signature', 'index', 'responses')
+
+    def __init__(self, products: Dict[str, List[Dict[str, Any]]], categories: List[Dict[str, Any]],
+                 metadata: Dict[str, Any], signature: Optional[FileSignature] = None):
+        object.__setattr__(self, 'products', products)
+        object.__setattr__(self, 'categories', categories)
+        object.__setattr__(self, 'metadata', metadata)
+        object.__setattr__(self, 'version', metadata.get('version', 'unknown'))
+        object.__setattr__(self, 'signature', signature)
+        index = CatalogIndex(products, categories)
+        object.__setattr__(self, 'index', index)
+        responses = build_catalog_responses(index, categories, metadata) if (products or categories) else {}
+        object.__setattr__(self, 'responses', responses)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogSnapshot is immutable")
+
+    @classmethod
+    def from_cache_data(cls, cache_data: Dict[str, Any], signature: Optional[FileSignature] = None) -> 'CatalogSnapshot':
+        """Build a snapshot from the parsed modx_cache.json structure."""
+        products = cache_data.get('products') or {}
+        categories = cache_data.get('categories') or []
+        metadata = cache_data.get('metadata') or {}
+        return cls(
+            products if isinstance(products, dict) else {},
+            categories if isinstance(categories, list) else [],
+            metadata if isinstance(metadata, dict) else {},
+            signature
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.products and not self.categories
+
+    @property
+    def has_products(self) -> bool:
+        return bool(self.products)
+
+    @property
+    def categories_count(self) -> int:
+        return len(self.categories)
+
+
+class MappedCatalogSnapshot:
+    """Catalog snapshot backed by the binary catalog (same interface as CatalogSnapshot).
+
+    Responses are slices of the mapping. products, categories and index are
+    only deserialized on first access, which the hot API paths never need.
+    """
+
+    def __init__(self, catalog: MappedCatalog, signature: Optional[FileSignature] = None):
+        object.__setattr__(self, 'responses', catalog)
+        object.__setattr__(self, 'metadata', catalog.metadata)
+        object.__setattr__(self, 'version', catalog.metadata.get('version', 'unknown'))
+        object.__setattr__(self, 'signature', signature)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MappedCatalogSnapshot is immutable")
+
+    @cached_property
+    def products(self) -> Dict[str, List[Dict[str, Any]]]:
+        return json.loads(bytes(self.responses[RESPONSE_PRODUCTS].identity)) if not self.is_empty else {}
+
+    @cached_property
+    def categories(self) -> List[Dict[str, Any]]:
+        return json.loads(bytes(self.responses[RESPONSE_CATEGORIES].identity)) if not self.is_empty else []
+
+    @cached_property
+    def index(self) -> CatalogIndex:
+        return CatalogIndex(self.products, self.categories)
+
+    @property
+    def is_empty(self) -> bool:
+        return RESPONSE_ALL not in self.responses
+
+    @property
+    def has_products(self) -> bool:
+        return self.responses.products_count > 0
+
+    @property
+    def categories_count(self) -> int:
+        return self.responses.categories_count
+
+
+EMPTY_SNAPSHOT = CatalogSnapshot({}, [], {})
+
+
+class CatalogCache:
+    """Process-wide holder of the current catalog snapshot."""
+
+    def __init__(self, file_path: str, check_interval: float = CATALOG_RELOAD_CHECK_INTERVAL,
+                 binary_path: Optional[str] = None):
+        self.file_path = file_path
+        self.binary_path = binary_path
+        self.check_interval = check_interval
+        self._snapshot = EMPTY_SNAPSHOT
+        self._signature: Optional[FileSignature] = None
+        # True while the snapshot came from publish() rather than from the file
+        self._published = False
+        # Bumped on every swap; a reload finishing after a newer publish() is dropped
+        self._generation = 0
+        # Signature of a binary catalog that failed to map (not retried until replaced)
+        self._broken_binary: Optional[FileSignature] = None
+        # True while a last-known-good snapshot is served because the file is gone or broken
+        self._stale = False
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def get_snapshot(self) -> CatalogSnapshot:
+        """Return the current snapshot (no I/O: reloads happen in the background task)."""
+        return self._snapshot
+
+    @property
+    def stale(self) -> bool:
+        """The snapshot outlived its file (missing or unparsable); it is still served."""
+        return self._stale
+
+    def start(self):
+        """Start the background task that picks up changes of the file."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def invalidate(self):
+        """Check the file now instead of after the check interval (needs start())."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _watch(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Catalog: Reload check failed: {e}")
+            timeout = None if math.isinf(self.check_interval) else self.check_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def publish(self, cache_data: Dict[str, Any]):
+        """Swap in a snapshot built from already parsed cache data (in-process refresh)."""
+        self.publish_snapshot(CatalogSnapshot.from_cache_data(cache_data))
+
+    def publish_snapshot(self, snapshot: CatalogSnapshot):
+        """Swap in an already built snapshot.
+
+        Must be called on the event loop thread: the snapshot can be built in a
+        worker thread, but the cache state is only changed here. The current file
+        signature is remembered, so the file the refresher has just written is not
+        parsed again; only a later change on disk (e.g. by an external
+        scheduler_modx) replaces the published snapshot.
+        """
+        signature: Optional[FileSignature] = None
+        for path in (self.binary_path, self.file_path):
+            if path is None:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            break
+        self._signature = signature
+        self._snapshot = snapshot
+        self._generation += 1
+        self._published = True
+        self._stale = False
+        logger.info(f"Catalog: Snapshot published - version {snapshot.version}")
+
+    async def check(self):
+        """Reload the snapshot if the file has changed since the last check.
+
+        Parsing, indexing and compressing run in a worker thread; the cache state
+        is only changed on the event loop. Called by the background task (and
+        once at startup, before start()), never concurrently with itself.
+        """
+        if self.binary_path is not None and await self._check_binary():
+            return
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            if self._published:
+                # The warm-start file is optional for published snapshots
+                return
+            if self._signature is not None:
+                logger.warning(f"Catalog: MODX cache '{self.file_path}' disappeared"
+                               f"{self._keeping_last_good()}")
+            self._signature = None
+            self._stale = not self._snapshot.is_empty
+            return
+        except OSError as e:
+            logger.error(f"Catalog: Cannot stat MODX cache '{self.file_path}': {e}")
+            return
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        # Remember the signature even if parsing fails so a broken file is not
+        # re-parsed on every check until it is replaced.
+        self._signature = signature
+        generation = self._generation
+        try:
+            snapshot = await asyncio.to_thread(_load_snapshot, self.file_path, signature)
+        except (OSError, ValueError) as e:
+            logger.error(f"Catalog: Failed to load MODX cache '{self.file_path}': {e}{self._keeping_last_good()}")
+            self._stale = not self._snapshot.is_empty
+            return
+
+        if self._swap(snapshot, signature, generation):
+            logger.info(f"Catalog: Snapshot loaded - version {snapshot.version}")
+
+    def _swap(self, snapshot: CatalogSnapshot, signature: FileSignature, generation: int) -> bool:
+        if generation != self._generation:
+            # publish_snapshot() swapped in a newer version while this one was loading
+            return False
+        self._signature = signature
+        self._snapshot = snapshot
+        self._generation += 1
+        self._published = False
+        self._stale = False
+        return True
+
+    def _keeping_last_good(self) -> str:
+        if self._snapshot.is_empty:
+            return ""
+        return f", keeping last known good version {self._snapshot.version}"
+
+    async def _check_binary(self) -> bool:
+        """Map a new binary catalog; False if there is none (use the JSON file)."""
+        try:
+            stat = os.stat(self.binary_path)
+        except OSError:
+            return False
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return True
+        if signature == self._broken_binary:
+            return False
+
+        generation = self._generation
+        try:
+            snapshot = await asyncio.to_thread(_map_snapshot, self.binary_path, signature)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error(f"Catalog: Failed to map binary catalog '{self.binary_path}': {e}")
+            self._broken_binary = signature
+            return False
+
+        if self._swap(snapshot, signature, generation):
+            logger.info(f"Catalog: Binary snapshot mapped - version {snapshot.version}")
+        return True
+
+
+def _load_snapshot(file_path: str, signature: FileSignature) -> CatalogSnapshot:
+    """Parse the JSON cache file and build its snapshot (runs in a worker thread)."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        cache_data = json.load(f)
+    if not isinstance(cache_data, dict):
+        raise ValueError(f"unexpected top-level type {type(cache_data).__name__}")
+    return CatalogSnapshot.from_cache_data(cache_data, signature)
+
+
+def _map_snapshot(binary_path: str, signature: FileSignature) -> MappedCatalogSnapshot:
+    """Map the binary catalog (runs in a worker thread)."""
+    return MappedCatalogSnapshot(MappedCatalog(binary_path), signature)
@@ -0,0 +1,229 @@
+"""
+MODX Catalog Delta Feed
+scheduler_modx records, for every published catalog version, what changed since
+the previous one (added, changed and removed products and categories) in a bounded
+history file next to the cache. The API composes consecutive diffs into a single
+delta since any version still in the history window, so a client that is a few
+versions behind downloads only the edits instead of the whole catalog.
+
+Diff format (per version and composed):
+    {"products":   {"added": [{"category": key, "product": {...}}], "changed": [...], "removed": [id, ...]},
+     "categories": {"added": [{...category...}], "changed": [...], "removed": [id, ...]}}
+A changed product may have moved to another category: clients should drop the
+product by id everywhere before inserting it under "category".
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bot.http_cache import PreparedBody
+
+logger = logging.getLogger(__name__)
+
+# Number of versions kept in the history file
+CATALOG_HISTORY_SIZE = int(os.environ.get('CATALOG_HISTORY_SIZE', '50'))
+CATALOG_HISTORY_CHECK_INTERVAL = float(os.environ.get('CATALOG_HISTORY_CHECK_INTERVAL', '1.0'))
+# Prepared delta bodies kept per process, keyed by (since, current version)
+CATALOG_DELTA_CACHE_SIZE = 64
+
+SECTIONS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    'products': lambda item: str(item['product'].get('id')),
+    'categories': lambda item: str(item.get('id')),
+}
+
+
+def _products_by_id(products_by_category: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        str(product.get('id')): {"category": category_key, "product": product}
+        for category_key, products in products_by_category.items() if isinstance(products, list)
+        for product in products if isinstance(product, dict)
+    }
+
+
+def _categories_by_id(categories: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {str(category.get('id')): category for category in categories if isinstance(category, dict)}
+
+
+def _diff_items(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, list]:
+    return {
+        "added": [item for key, item in new.items() if key not in old],
+        "changed": [item for key, item in new.items() if key in old and old[key] != item],
+        "removed": [key for key in old if key not in new],
+    }
+
+
+def empty_diff() -> Dict[str, Dict[str, list]]:
+    return {section: {"added": [], "changed": [], "removed": []} for section in SECTIONS}
+
+
+def is_empty_diff(diff: Dict[str, Dict[str, list]]) -> bool:
+    return not any(items for section in diff.values() for items in section.values())
+
+
+def diff_catalogs(old_products: Dict[str, List[Dict[str, Any]]], old_categories: List[Dict[str, Any]],
+                  new_products: Dict[str, List[Dict[str, Any]]],
+                  new_categories: List[Dict[str, Any]]) -> Dict[str, Dict[str, list]]:
+    """What changed between two catalogs in the modx_cache.json format."""
+    return {
+        "products": _diff_items(_products_by_id(old_products), _products_by_id(new_products)),
+        "categories": _diff_items(_categories_by_id(old_categories), _categories_by_id(new_categories)),
+    }
+
+
+def compose_diffs(diffs: Iterable[Dict[str, Dict[str, list]]]) -> Dict[str, Dict[str, list]]:
+    """Fold consecutive diffs (oldest first) into one net diff.
+
+    An item added and later removed disappears; an item removed and later
+    re-added becomes a change.
+    """
+    diffs = list(diffs)
+    result = empty_diff()
+    for section, item_id in SECTIONS.items():
+        # id -> latest item (None if removed) and whether it existed before the first diff
+        state: Dict[str, Optional[Dict[str, Any]]] = {}
+        existed: Dict[str, bool] = {}
+        for diff in diffs:
+            part = diff.get(section, {})
+            for item in part.get('added', []):
+                key = item_id(item)
+                existed.setdefault(key, False)
+                state[key] = item
+            for item in part.get('changed', []):
+                key = item_id(item)
+                existed.setdefault(key, True)
+                state[key] = item
+            for key in part.get('removed', []):
+                existed.setdefault(key, True)
+                state[key] = None
+
+        for key, item in state.items():
+            if item is None:
+                if existed[key]:
+                    result[section]["removed"].append(key)
+            elif existed[key]:
+                result[section]["changed"].append(item)
+            else:
+                result[section]["added"].append(item)
+    return result
+
+
+def load_history(file_path: str) -> List[Dict[str, Any]]:
+    """History entries, oldest first ([] if the file is missing or broken)."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            versions = json.load(f).get('versions', [])
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f"Catalog: Cannot read catalog history '{file_path}': {e}")
+        return []
+    return [entry for entry in versions if isinstance(entry, dict)] if isinstance(versions, list) else []
+
+
+def record_catalog_change(file_path: str, previous_version: str, version: str,
+                          changes: Dict[str, Dict[str, list]], max_entries: int = CATALOG_HISTORY_SIZE):
+    """Append a version to the history file, keeping the newest max_entries (atomic write)."""
+    versions = load_history(file_path)
+    versions.append({
+        "version": version,
+        "previous": previous_version,
+        "created": datetime.now().isoformat(),
+        "changes": changes
+    })
+    versions = versions[-max_entries:]
+
+    temp_file = f"{file_path}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({"versions": versions}, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_file, file_path)
+
+
+def diff_chain(versions: List[Dict[str, Any]], since: str, current: str) -> Optional[List[Dict[str, Dict[str, list]]]]:
+    """Per-version diffs leading from `since` to `current` (not composed), or None
+    if the history cannot bridge them."""
+    if since == current:
+        return []
+    for start, entry in enumerate(versions):
+        if entry.get('previous') != since:
+            continue
+        chain = []
+        expected = since
+        for step in versions[start:]:
+            if step.get('previous') != expected:
+                return None
+            chain.append(step.get('changes', {}))
+            expected = step.get('version')
+            if expected == current:
+                return chain
+        return None
+    return None
+
+
+def changes_since(versions: List[Dict[str, Any]], since: str, current: str) -> Optional[Dict[str, Dict[str, list]]]:
+    """Net diff from `since` to `current`, or None if the history cannot bridge them."""
+    chain = diff_chain(versions, since, current)
+    return compose_diffs(chain) if chain is not None else None
+
+
+class CatalogHistory:
+    """Process-wide view of the history file with prepared delta responses."""
+
+    def __init__(self, file_path: str, check_interval: float = CATALOG_HISTORY_CHECK_INTERVAL,
+                 cache_size: int = CATALOG_DELTA_CACHE_SIZE):
+        self.file_path = file_path
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self._versions: List[Dict[str, Any]] = []
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self._bodies: 'OrderedDict[Tuple[Optional[str], str], PreparedBody]' = OrderedDict()
+
+    def get_versions(self) -> List[Dict[str, Any]]:
+        """History entries, reloaded if the file changed (stat at most once per interval)."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            try:
+                stat = os.stat(self.file_path)
+                signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signature = None
+            if signature != self._signature:
+                self._signature = signature
+                self._versions = load_history(self.file_path) if signature is not None else []
+                self._bodies.clear()
+        return self._versions
+
+    def delta_response(self, since: str, snapshot) -> PreparedBody:
+        """Prepared body with the changes since `since`, or the full catalog
+        ("full": true) when `since` is outside the history window.
+
+        The full body is shared by every unknown `since`, so arbitrary values
+        cannot make the process serialize the catalog more than once per version.
+        """
+        versions = self.get_versions()
+        # Only locate the chain here; composing it is left for a cache miss
+        chain = diff_chain(versions, since, snapshot.version)
+        key = (since if chain is not None else None, snapshot.version)
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+            return body
+
+        if chain is not None:
+            data = {"since": since, "version": snapshot.version, "full": False, "changes": compose_diffs(chain)}
+        else:
+            data = {
+                "version": snapshot.version, "full": True,
+                "products": snapshot.products, "categories": snapshot.categories, "metadata": snapshot.metadata
+            }
+        body = PreparedBody.from_json(data)
+        self._bodies[key] = body
+        while len(self._bodies) > self.cache_size:
+            self._bodies.popitem(last=False)
+        return body
@@ -0,0 +1,164 @@
+"""
+Catalog Events (Server-Sent Events)
+Pushes catalog version changes to open Mini App sessions.
+
+A single watcher task polls the in-memory catalog snapshot and fans every new
+version (and a periodic heartbeat) out to the subscribers. Each connection only
+owns a small bounded queue and waits on it, so idle sessions cost no timers and
+no polling. A slow client never blocks the others: when its queue is full, a
+heartbeat is not queued at all and a version event replaces the oldest pending
+message, so the newest version always reaches the client.
+"""
+
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Callable, Optional, Set
+
+from aiohttp import web
+
+from bot.security_headers import SECURITY_HEADERS
+
+logger = logging.getLogger(__name__)
+
+CATALOG_EVENTS_MAX_CLIENTS = int(os.environ.get('CATALOG_EVENTS_MAX_CLIENTS', '2000'))
+CATALOG_EVENTS_MAX_CLIENTS_PER_IP = int(os.environ.get('CATALOG_EVENTS_MAX_CLIENTS_PER_IP', '10'))
+CATALOG_EVENTS_HEARTBEAT = float(os.environ.get('CATALOG_EVENTS_HEARTBEAT', '25'))
+CATALOG_EVENTS_POLL_INTERVAL = float(os.environ.get('CATALOG_EVENTS_POLL_INTERVAL', '1.0'))
+CATALOG_EVENTS_QUEUE_SIZE = 4
+
+# Client reconnect delay (ms) sent with the first message
+RETRY_MS = 10000
+
+HEARTBEAT = b': ping\n\n'
+# Tells subscribers to close the stream (server shutdown)
+CLOSE = b''
+
+# Headers are sent before the security middleware runs, so they are included here
+SSE_HEADERS = {
+    **SECURITY_HEADERS,
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    # Disable proxy buffering (nginx) so events are delivered immediately
+    'X-Accel-Buffering': 'no',
+}
+
+
+def version_event(version: str, payload: bytes) -> bytes:
+    """SSE message announcing a catalog version; payload is a single-line JSON body."""
+    return b'id: ' + version.encode('utf-8') + b'\nevent: version\ndata: ' + payload + b'\n\n'
+
+
+class CatalogEventHub:
+    """Subscriber registry and fan-out of catalog version events."""
+
+    def __init__(self, max_clients: int = CATALOG_EVENTS_MAX_CLIENTS,
+                 max_clients_per_ip: int = CATALOG_EVENTS_MAX_CLIENTS_PER_IP,
+                 queue_size: int = CATALOG_EVENTS_QUEUE_SIZE):
+        self.max_clients = max_clients
+        self.max_clients_per_ip = max_clients_per_ip
+        self.queue_size = queue_size
+        self.current: Optional[bytes] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._clients_per_ip: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, client_ip: str) -> Optional[asyncio.Queue]:
+        """Register a client; None if a connection cap is reached."""
+        if self._closed or len(self._subscribers) >= self.max_clients:
+            return None
+        if self._clients_per_ip[client_ip] >= self.max_clients_per_ip:
+            return None
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        self._clients_per_ip[client_ip] += 1
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, client_ip: str):
+        if queue in self._subscribers:
+            self._subscribers.discard(queue)
+            self._clients_per_ip[client_ip] -= 1
+            if self._clients_per_ip[client_ip] <= 0:
+                del self._clients_per_ip[client_ip]
+
+    def publish(self, message: bytes):
+        """Queue a message for every subscriber, dropping their oldest if full.
+
+        A heartbeat is skipped for a full queue instead: it must never push out
+        a version event.
+        """
+        for queue in self._subscribers:
+            if queue.full():
+                if message == HEARTBEAT:
+                    continue
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def announce(self, message: bytes):
+        """Publish a new version event (and remember it for new subscribers)."""
+        self.current = message
+        self.publish(message)
+
+    async def watch(self, get_event: Callable[[], Optional[bytes]],
+                    poll_interval: float = CATALOG_EVENTS_POLL_INTERVAL,
+                    heartbeat: float = CATALOG_EVENTS_HEARTBEAT):
+        """Announce whenever get_event() returns a different message; send heartbeats."""
+        loop = asyncio.get_running_loop()
+        next_heartbeat = loop.time() + heartbeat
+        self.current = get_event()
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                event = get_event()
+            except Exception as e:
+                logger.error(f"Catalog events: Error reading catalog version: {e}")
+                event = None
+            if event is not None and event != self.current:
+                self.announce(event)
+            if loop.time() >= next_heartbeat:
+                next_heartbeat = loop.time() + heartbeat
+                self.publish(HEARTBEAT)
+
+    def start(self, get_event: Callable[[], Optional[bytes]]):
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self.watch(get_event))
+
+    async def close(self):
+        """Stop the watcher and end every open stream."""
+        self._closed = True
+        self.publish(CLOSE)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stream(self, request: web.Request, client_ip: str) -> web.StreamResponse:
+        """Serve one SSE connection until the client goes away or the hub closes."""
+        queue = self.subscribe(client_ip)
+        if queue is None:
+            return web.json_response({"error": "Too many event stream connections"}, status=503,
+                                     headers={'Retry-After': str(RETRY_MS // 1000)})
+        try:
+            response = web.StreamResponse(headers=SSE_HEADERS)
+            await response.prepare(request)
+            await response.write(b'retry: %d\n' % RETRY_MS + (self.current or HEARTBEAT))
+            while True:
+                message = await queue.get()
+                if message == CLOSE:
+                    break
+                await response.write(message)
+        except ConnectionResetError:
+            # Client went away (detected at the latest on the next heartbeat)
+            pass
+        finally:
+            self.unsubscribe(queue, client_ip)
+        return response
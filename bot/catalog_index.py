@@ -0,0 +1,149 @@
+"""
+MODX Catalog Index
+Normalized, category-keyed view of the catalog with products sorted by menuindex.
+Built once per catalog version; lookups by category key and by product id are O(1).
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_KEY_PREFIX = 'category_'
+
+
+def category_key_for(category_id: Any) -> str:
+    """Key of a category in the parser format (category_<id>)."""
+    return f"{CATEGORY_KEY_PREFIX}{category_id}"
+
+
+def _menuindex(item: Dict[str, Any]) -> int:
+    try:
+        return int(item.get('menuindex', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def format_modx_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a raw MODX API product into the frontend format.
+
+    Raises KeyError/ValueError for products with missing fields or bad price/weight.
+    """
+    # Очищаем цену и вес от пробелов и запятых
+    clean_price = str(product['price']).replace(' ', '').replace(',', '.')
+    clean_weight = str(product['weight']).replace(' ', '').replace(',', '.')
+
+    return {
+        "id": product['id'],
+        "name": product['pagetitle'],
+        "url": f"https://drazhin.by/{product.get('alias', '')}",
+        "image": product.get('image', ''),
+        "price": str(float(clean_price)),
+        "short_description": product.get('product_description', 'N/A'),
+        "weight": str(int(float(clean_weight))),
+        "for_vegans": product.get('product_vegan', 'N/A'),
+        "availability_days": product.get('product_days_order', 'N/A'),
+        "ingredients": product.get('product_structure', 'N/A'),
+        "calories": product.get('product_calories', 'N/A'),
+        "energy_value": product.get('product_bgu', 'N/A'),
+        "images": product.get('images', []),
+        "menuindex": product.get('menuindex', 0)
+    }
+
+
+class ProductRecord:
+    """A product in frontend format plus the fields used for indexing."""
+
+    __slots__ = ('id', 'category_key', 'menuindex', 'data')
+
+    def __init__(self, data: Dict[str, Any], category_key: str):
+        self.id = str(data.get('id'))
+        self.category_key = category_key
+        self.menuindex = _menuindex(data)
+        self.data = data
+
+
+class CategoryRecord:
+    """A category with its products, sorted by menuindex."""
+
+    __slots__ = ('key', 'id', 'name', 'menuindex', 'products')
+
+    def __init__(self, key: str, category: Optional[Dict[str, Any]], products: List[ProductRecord]):
+        self.key = key
+        self.id = category['id'] if category is not None else None
+        self.name = category.get('name', '') if category is not None else None
+        self.menuindex = _menuindex(category) if category is not None else 0
+        self.products = tuple(sorted(products, key=lambda record: record.menuindex))
+
+    @property
+    def info(self) -> Optional[Dict[str, Any]]:
+        """Category block of the /api/products?category=... response."""
+        if self.id is None:
+            return None
+        return {"id": self.id, "name": self.name, "key": self.key}
+
+    def product_list(self) -> List[Dict[str, Any]]:
+        return [record.data for record in self.products]
+
+
+class CatalogIndex:
+    """Category and product lookup tables for one catalog version.
+
+    Only categories that have products are indexed, matching the keys of the
+    products section of modx_cache.json.
+    """
+
+    __slots__ = ('categories', 'products', 'categories_by_id')
+
+    def __init__(self, products_by_category: Dict[str, Iterable[Dict[str, Any]]],
+                 categories: Iterable[Dict[str, Any]] = ()):
+        self.categories_by_id: Dict[str, Dict[str, Any]] = {
+            str(category.get('id')): category for category in categories if isinstance(category, dict)
+        }
+        self.categories: Dict[str, CategoryRecord] = {}
+        self.products: Dict[str, ProductRecord] = {}
+        for category_key, category_products in products_by_category.items():
+            if not isinstance(category_products, list):
+                continue
+            records = [
+                ProductRecord(product, category_key) for product in category_products if isinstance(product, dict)
+            ]
+            category = self.categories_by_id.get(category_key[len(CATEGORY_KEY_PREFIX):]) \
+                if category_key.startswith(CATEGORY_KEY_PREFIX) else None
+            self.categories[category_key] = CategoryRecord(category_key, category, records)
+            for record in records:
+                self.products[record.id] = record
+
+    @classmethod
+    def from_modx_products(cls, products: Iterable[Dict[str, Any]],
+                           categories: Iterable[Dict[str, Any]] = ()) -> 'CatalogIndex':
+        """Build an index from raw MODX API products, skipping malformed ones."""
+        products_by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for product in products:
+            try:
+                category_key = category_key_for(product['parent_id'])
+                formatted_product = format_modx_product(product)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Catalog: Ошибка форматирования продукта {product.get('id', 'unknown')}: {e}")
+                continue
+            products_by_category.setdefault(category_key, []).append(formatted_product)
+        return cls(products_by_category, categories)
+
+    def category(self, category_key: str) -> Optional[CategoryRecord]:
+        return self.categories.get(category_key)
+
+    def category_info(self, category_key: str) -> Optional[Dict[str, Any]]:
+        """{id, name, key} of any known category, with or without products."""
+        if not category_key.startswith(CATEGORY_KEY_PREFIX):
+            return None
+        category = self.categories_by_id.get(category_key[len(CATEGORY_KEY_PREFIX):])
+        if category is None:
+            return None
+        return {"id": category['id'], "name": category.get('name', ''), "key": category_key}
+
+    def product(self, product_id: Any) -> Optional[ProductRecord]:
+        return self.products.get(str(product_id))
+
+    def products_by_category(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The products section in frontend format, each category sorted by menuindex."""
+        return {key: record.product_list() for key, record in self.categories.items()}
@@ -0,0 +1,86 @@
+"""
+In-Process MODX Catalog Refresher
+Optional replacement for the separate scheduler_modx worker (MODX_INPROCESS_REFRESH).
+Runs scheduler_modx.update_cache as a supervised background task of the API
+process and hands every new catalog version straight to the CatalogCache, so
+requests see it without a file round-trip. modx_cache.json is still written and
+serves as warm-start persistence.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import scheduler_modx
+from bot.catalog_cache import CatalogCache, CatalogSnapshot
+
+logger = logging.getLogger(__name__)
+
+# First retry delay after a failed refresh; doubled per failure up to the interval
+RETRY_DELAY = 10
+
+
+class CatalogRefresher:
+    """Periodically refreshes the catalog; failures are retried with backoff."""
+
+    def __init__(self, catalog_cache: CatalogCache, interval: float = scheduler_modx.CACHE_UPDATE_INTERVAL):
+        self.catalog_cache = catalog_cache
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """One update cycle; returns False if MODX or the update failed."""
+        snapshot = self.catalog_cache.get_snapshot()
+        published = None if snapshot.is_empty else {
+            "products": snapshot.products,
+            "categories": snapshot.categories,
+            "metadata": snapshot.metadata
+        }
+        new_versions: List[Dict[str, Any]] = []
+        success = await scheduler_modx.update_cache(published, new_versions.append)
+        if new_versions:
+            # Serializing and compressing the response bodies is CPU work; keep it off the
+            # loop, but swap the snapshot in on the loop so readers never see it half done
+            snapshot = await asyncio.to_thread(CatalogSnapshot.from_cache_data, new_versions[-1])
+            self.catalog_cache.publish_snapshot(snapshot)
+        return success
+
+    def next_delay(self, failures: int) -> float:
+        if not failures:
+            return self.interval
+        return min(RETRY_DELAY * 2 ** (failures - 1), self.interval)
+
+    async def run(self):
+        failures = 0
+        while True:
+            try:
+                failures = 0 if await self.refresh() else failures + 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.error(f"Catalog: In-process refresh failed: {e}")
+            await asyncio.sleep(self.next_delay(failures))
+
+    def start(self):
+        if self._task is None:
+            logger.info(f"Catalog: Starting in-process MODX refresher (interval: {self.interval}s)")
+            self._task = asyncio.create_task(self.run())
+            self._task.add_done_callback(self._restart_if_crashed)
+
+    def _restart_if_crashed(self, task: asyncio.Task):
+        if self._task is not task or task.cancelled():
+            return
+        logger.error(f"Catalog: In-process refresher stopped unexpectedly: {task.exception()!r}, restarting")
+        self._task = None
+        self.start()
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await scheduler_modx.modx_client.close()
@@ -0,0 +1,110 @@
+"""
+Circuit Breaker
+Stops calling a failing upstream for a cooldown period, so requests fail fast
+instead of each one waiting for the full upstream timeout.
+
+closed     calls pass; failure_threshold consecutive failures open the circuit
+open       calls fail at once with CircuitOpenError until reset_timeout has passed
+half-open  up to half_open_max_calls trial calls pass; a success closes the
+           circuit, a failure opens it again for another reset_timeout
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """The call was rejected without reaching the upstream."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _always_failure(error: Exception) -> bool:
+    return True
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one upstream (single event loop)."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, is_failure: Callable[[Exception], bool] = _always_failure,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+        self.clock = clock
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == STATE_OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = STATE_HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs) through the breaker.
+
+        Exceptions for which is_failure() is False (e.g. a 404) count as a
+        healthy upstream. A cancelled call counts as neither.
+        """
+        self._acquire()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._on_failure(e)
+            else:
+                self._on_success()
+            raise
+        self._on_success()
+        return result
+
+    def _acquire(self):
+        state = self.state
+        if state == STATE_OPEN:
+            raise CircuitOpenError(self.name, self.reset_timeout - (self.clock() - self._opened_at))
+        if state == STATE_HALF_OPEN:
+            if self._trials >= self.half_open_max_calls:
+                raise CircuitOpenError(self.name, 0.0)
+            self._trials += 1
+
+    def _release(self):
+        if self._state == STATE_HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def _on_success(self):
+        if self._state != STATE_CLOSED:
+            logger.info(f"Circuit '{self.name}': Upstream recovered, closing circuit")
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._trials = 0
+
+    def _on_failure(self, error: Exception):
+        self._failures += 1
+        if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != STATE_OPEN:
+                logger.warning(f"Circuit '{self.name}': Opened after {self._failures} failures "
+                               f"({error!r}), failing fast for {self.reset_timeout}s")
+            self._state = STATE_OPEN
+            self._opened_at = self.clock()
+            self._trials = 0
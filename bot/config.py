@@ -60,6 +60,13 @@ class SecureConfig:
             'https://bakery-miniapp-f23f8ce37e50.herokuapp.com/bot-app/'
         )
         
+        # Client-side caching of catalog API responses (0 = always revalidate via ETag)
+        self.CATALOG_CACHE_MAX_AGE = int(os.environ.get('CATALOG_CACHE_MAX_AGE', '0'))
+        self.CATALOG_CACHE_STALE_WHILE_REVALIDATE = int(os.environ.get('CATALOG_CACHE_STALE_WHILE_REVALIDATE', '0'))
+        # Refresh the MODX catalog inside the API process instead of a separate scheduler_modx worker
+        self.MODX_INPROCESS_REFRESH = os.environ.get('MODX_INPROCESS_REFRESH', 'false').lower() == 'true'
+        self.MODX_REFRESH_INTERVAL = int(os.environ.get('MODX_REFRESH_INTERVAL', '60'))
+
         # Admin configuration
         self.ADMIN_CHAT_ID = int(os.environ['ADMIN_CHAT_ID'])
         self.ADMIN_EMAIL = os.environ['ADMIN_EMAIL']
@@ -74,6 +81,20 @@ class SecureConfig:
         self.ENABLE_RATE_LIMITING = os.environ.get('ENABLE_RATE_LIMITING', 'true').lower() == 'true'
         self.RATE_LIMIT_MAX_REQUESTS = int(os.environ.get('RATE_LIMIT_MAX_REQUESTS', '100'))
         self.RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', '3600'))  # 1 hour
+        self.RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '50000'))  # LRU bound per limiter
+        # 'memory' (per process) or 'sqlite' (shared by all workers on the host)
+        self.RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+        self.RATE_LIMIT_DB_PATH = os.environ.get(
+            'RATE_LIMIT_DB_PATH',
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'security_state.db')
+        )
+        self.RATE_LIMIT_SYNC_INTERVAL = float(os.environ.get('RATE_LIMIT_SYNC_INTERVAL', '1.0'))
+
+        # Persistent bot state (carts, order sequence) in a local SQLite file
+        self.BOT_STATE_DB_PATH = os.environ.get(
+            'BOT_STATE_DB_PATH',
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'bot_state.db')
+        )
         
         # Webhook security
         self.ALLOW_WEBHOOKS = os.environ.get('ALLOW_WEBHOOKS', 'false').lower() == 'true'
@@ -0,0 +1,292 @@
+"""
+Mail Worker
+Sends email through a small pool of persistent, authenticated SMTP connections.
+
+Opening a connection costs a TCP and TLS handshake, STARTTLS and AUTH, so
+instead of doing all of that per email the worker keeps `pool_size`
+connections open and feeds them from one bounded queue:
+
+- every connection is owned by one worker task and connects lazily,
+- a task takes up to `batch_size` queued messages at once and sends them on
+  its connection in one go,
+- a connection idle for `idle_timeout` seconds is closed with QUIT before the
+  server drops it; one found dropped anyway is reopened and the message resent,
+- a full queue makes send() wait (backpressure) instead of growing without bound.
+
+smtplib is blocking, so each batch runs in a thread (asyncio.to_thread). Queue
+depth, counters and send latency (enqueue to accepted by the server) are
+available through stats().
+"""
+
+import asyncio
+import logging
+import os
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '2'))
+SMTP_QUEUE_SIZE = int(os.environ.get('SMTP_QUEUE_SIZE', '100'))
+SMTP_IDLE_TIMEOUT = float(os.environ.get('SMTP_IDLE_TIMEOUT', '60'))
+SMTP_BATCH_SIZE = int(os.environ.get('SMTP_BATCH_SIZE', '10'))
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', '30'))
+
+# Queued messages still being sent at close() get this long
+_CLOSE_TIMEOUT = 10.0
+
+# The connection is gone: reconnect and send the message again
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class _Connection:
+    """One SMTP connection; only ever used from one worker task (in its thread).
+
+    `lock` is held while a batch is sent, so close() never sends QUIT on the
+    socket of a batch that is still running in its thread after the task was
+    cancelled.
+    """
+
+    def __init__(self, worker: 'MailWorker'):
+        self.worker = worker
+        self.server: Optional[smtplib.SMTP] = None
+        self.lock = threading.Lock()
+
+    def send(self, message: Message):
+        """Send on the open connection, reconnecting once if it was dropped."""
+        if self.server is None:
+            self.server = self.worker._connect()
+            self.send_direct(message)
+            return
+        try:
+            self.send_direct(message)
+        except _CONNECTION_ERRORS:
+            self.reset()
+            self.server = self.worker._connect()
+            self.send_direct(message)
+
+    def send_direct(self, message: Message):
+        try:
+            self.server.send_message(message)
+        except _CONNECTION_ERRORS:
+            raise
+        except smtplib.SMTPException:
+            # Refused by the server; the session itself is still usable
+            self._rset()
+            raise
+
+    def _rset(self):
+        try:
+            self.server.rset()
+        except _CONNECTION_ERRORS:
+            self.reset()
+        except smtplib.SMTPException:
+            pass
+
+    def quit(self, timeout: float = -1) -> bool:
+        """QUIT and close; False if a running batch kept the lock for `timeout` seconds."""
+        if not self.lock.acquire(timeout=timeout):
+            return False
+        try:
+            if self.server is None:
+                return True
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.reset()
+            return True
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        if self.server is not None:
+            try:
+                self.server.close()
+            except OSError:
+                pass
+            self.server = None
+
+
+class MailWorker:
+    """Bounded queue of outgoing email served by a pool of SMTP connections."""
+
+    def __init__(self, host: str, port: int, username: str, password: str, use_tls: bool = True,
+                 pool_size: int = SMTP_POOL_SIZE, queue_size: int = SMTP_QUEUE_SIZE,
+                 idle_timeout: float = SMTP_IDLE_TIMEOUT, batch_size: int = SMTP_BATCH_SIZE,
+                 timeout: float = SMTP_TIMEOUT, smtp_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.pool_size = max(1, pool_size)
+        self.idle_timeout = idle_timeout
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory
+        self._queue: 'asyncio.Queue[Tuple[Message, asyncio.Future, float]]' = asyncio.Queue(queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._connections: List[_Connection] = []
+        self.sent = 0
+        self.failed = 0
+        self.last_latency: Optional[float] = None
+        self.max_latency = 0.0
+        self._latency_total = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queue_depth': self.queue_depth,
+            'open_connections': sum(connection.server is not None for connection in self._connections),
+            'sent': self.sent,
+            'failed': self.failed,
+            'avg_latency': self._latency_total / self.sent if self.sent else None,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+        }
+
+    async def start(self):
+        """Start the connection tasks; connections are opened on the first message."""
+        if self._tasks:
+            return
+        for _ in range(self.pool_size):
+            connection = _Connection(self)
+            self._connections.append(connection)
+            self._tasks.append(asyncio.create_task(self._run(connection)))
+        logger.info(f"Mail worker: Started - {self.host}:{self.port} ({self.pool_size} connections)")
+
+    async def close(self):
+        """Send what is queued (within a timeout), then QUIT all connections."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Mail worker: {self.queue_depth} emails still queued at shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            self._queue.task_done()
+            if not future.done():
+                future.set_exception(ConnectionError("mail worker stopped"))
+        for connection in self._connections:
+            # A cancelled task's batch may still be sending in its thread
+            if not await asyncio.to_thread(connection.quit, _CLOSE_TIMEOUT):
+                logger.warning("Mail worker: A batch was still sending at shutdown, connection left open")
+        self._connections = []
+        logger.info(f"Mail worker: Stopped - {self.stats()}")
+
+    async def send(self, message: Message):
+        """Queue the message and wait until the server accepted it (or raise its error)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((message, future, loop.time()))
+        await future
+
+    def _connect(self) -> smtplib.SMTP:
+        """Open and authenticate a connection (blocking, called in the worker thread)."""
+        server = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        logger.info(f"Mail worker: Connected to {self.host}:{self.port}")
+        return server
+
+    async def _run(self, connection: _Connection):
+        while True:
+            if connection.server is not None:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # Idle: hang up before the server drops the connection
+                    await asyncio.to_thread(connection.quit)
+                    continue
+            else:
+                item = await self._queue.get()
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._send_batch(connection, batch)
+            finally:
+                for _, future, _ in batch:
+                    # Only left unresolved when stopped in the middle of the batch
+                    if not future.done():
+                        future.set_exception(ConnectionError("mail worker stopped"))
+                    self._queue.task_done()
+
+    async def _send_batch(self, connection: _Connection, batch: List[Tuple[Message, asyncio.Future, float]]):
+        # A caller that gave up (cancelled) will retry on its own; don't send twice
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+        try:
+            errors = await asyncio.to_thread(self._send_sync, connection, [message for message, _, _ in batch])
+        except Exception as e:
+            errors = [e] * len(batch)
+        now = asyncio.get_running_loop().time()
+        for (message, future, queued_at), error in zip(batch, errors):
+            if error is None:
+                latency = now - queued_at
+                self.sent += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+                self._latency_total += latency
+                if not future.done():
+                    future.set_result(None)
+            else:
+                self.failed += 1
+                logger.error(f"Mail worker: Failed to send email to {message['To']}: {error}")
+                if not future.done():
+                    future.set_exception(error)
+
+    def _send_sync(self, connection: _Connection, messages: List[Message]) -> List[Optional[Exception]]:
+        """Send a batch on one connection; returns the error (or None) per message."""
+        with connection.lock:
+            return self._send_locked(connection, messages)
+
+    def _send_locked(self, connection: _Connection, messages: List[Message]) -> List[Optional[Exception]]:
+        started = time.monotonic()
+        errors: List[Optional[Exception]] = []
+        for message in messages:
+            try:
+                connection.send(message)
+                errors.append(None)
+            except (smtplib.SMTPConnectError, smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError,
+                    *_CONNECTION_ERRORS) as e:
+                # Cannot connect: the rest of the batch would fail the same way
+                connection.reset()
+                errors.extend([e] * (len(messages) - len(errors)))
+                break
+            except smtplib.SMTPException as e:
+                # Refused message (SMTPException is an OSError too)
+                errors.append(e)
+            except OSError as e:
+                connection.reset()
+                errors.extend([e] * (len(messages) - len(errors)))
+                break
+            except Exception as e:
+                errors.append(e)
+        logger.debug(f"Mail worker: Sent batch of {len(messages)} in {time.monotonic() - started:.3f}s")
+        return errors
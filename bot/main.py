@@ -11,6 +11,7 @@ from email.mime.multipart import MIMEMultipart
 
 from aiogram import Bot, Dispatcher, F, types
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from aiogram.types import (
     Message, CallbackQuery, ReplyKeyboardRemove, ReplyKeyboardMarkup, 
     KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
@@ -24,6 +25,12 @@ from bot.config import (
 from bot.keyboards import generate_main_menu  # ИЗМЕНЕНО: Абсолютный импорт
 from bot.security_manager import security_manager  # ИЗМЕНЕНО: Добавлен импорт security manager
 from bot.security_middleware import security_middleware, fsm_context_middleware  # ИЗМЕНЕНО: Добавлен импорт security middleware
+from bot.cart_store import CartStore, CartMiddleware
+from bot.order_sequence import OrderSequence, sequence_period
+from bot.mail_worker import MailWorker
+from bot.order_outbox import (
+    DeliveryError, OrderOutbox, OUTBOX_EMAIL_CONCURRENCY, OUTBOX_TELEGRAM_CONCURRENCY
+)
 
 
 # Настраиваем логирование
@@ -59,6 +66,14 @@ order_counter = 0
 last_reset_month = 0
 # ИЗМЕНЕНИЕ: Создаем Lock для безопасной работы с файлом счетчика
 order_counter_lock = asyncio.Lock()
+# Счетчик номеров заказов в SQLite; пока он не запущен, используется файл счетчика
+order_sequence = OrderSequence(config.BOT_STATE_DB_PATH)
+# Журнал заказов и outbox уведомлений; пока он не запущен, уведомления отправляются напрямую
+order_outbox = OrderOutbox(config.BOT_STATE_DB_PATH)
+# Пул постоянных SMTP соединений; пока он не запущен, каждое письмо открывает свое соединение
+mail_worker = MailWorker(
+    config.SMTP_SERVER, config.SMTP_PORT, ADMIN_EMAIL, config.ADMIN_EMAIL_PASSWORD, config.SMTP_USE_TLS
+)
 
 
 # Словари для маппинга
@@ -75,8 +90,12 @@ DELIVERY_MAP = {
 }
 
 
-# Словарь для хранения корзин пользователей
-user_carts = {}  # user_id: {product_id: quantity, ...}
+# Корзины пользователей: user_id: {product_id: quantity, ...}
+# In-memory LRU with write-behind to SQLite (survives restarts, abandoned carts expire)
+user_carts = CartStore(config.BOT_STATE_DB_PATH)
+# Корзина, вытесненная из памяти (или не загруженная после рестарта), подгружается до хендлера
+dp.message.middleware(CartMiddleware(user_carts))
+dp.callback_query.middleware(CartMiddleware(user_carts))
 
 
 # Функции для загрузки данных
@@ -166,40 +185,52 @@ async def save_order_counter(counter_data):
         raise  # Перебрасываем ошибку, чтобы вызывающий код мог ее обработать
 
 
+async def _next_file_order_counter(now):
+    """Следующий номер по файловому счетчику (без SQLite)."""
+    global order_counter, last_reset_month
+
+    current_month = now.month
+
+    # Защита от одновременной записи
+    async with order_counter_lock:
+        # Проверяем, если месяц сменился
+        if current_month != last_reset_month:
+            order_counter = 0
+            last_reset_month = current_month
+            # Сохраняем обновленный счетчик с новым месяцем
+            try:
+                await save_order_counter({'counter': order_counter, 'month': last_reset_month})
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении сброшенного счетчика: {e}")
+
+        # Увеличиваем счетчик для нового заказа
+        order_counter += 1
+
+        # Сохраняем обновленный счетчик в файл
+        try:
+            # Убираем таймаут - на Heroku операции могут быть медленными
+            await save_order_counter({'counter': order_counter, 'month': last_reset_month})
+        except Exception as save_error:
+            logger.error(f"Ошибка при сохранении счетчика: {save_error}")
+            logger.error(f"Тип ошибки: {type(save_error).__name__}")
+            # Продолжаем выполнение даже при ошибке сохранения
+
+    return order_counter
+
+
 # ИЗМЕНЕНИЕ: Функция generate_order_number теперь асинхронная и работает с файлом
 async def generate_order_number():
     """
-    Генерирует уникальный номер заказа, сохраняя счетчик в файле.
+    Генерирует уникальный номер заказа.
+    Номер берется из счетчика в SQLite (order_sequence); файл счетчика используется,
+    только если счетчик в SQLite не запускался (например, в тестах).
     """
-    global order_counter, last_reset_month
-
     try:
         now = datetime.datetime.now()
-        current_month = now.month
-
-        # Защита от одновременной записи
-        async with order_counter_lock:
-            # Проверяем, если месяц сменился
-            if current_month != last_reset_month:
-                order_counter = 0
-                last_reset_month = current_month
-                # Сохраняем обновленный счетчик с новым месяцем
-                try:
-                    await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-                except Exception as e:
-                    logger.error(f"Ошибка при сохранении сброшенного счетчика: {e}")
-
-            # Увеличиваем счетчик для нового заказа
-            order_counter += 1
-
-            # Сохраняем обновленный счетчик в файл
-            try:
-                # Убираем таймаут - на Heroku операции могут быть медленными
-                await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-            except Exception as save_error:
-                logger.error(f"Ошибка при сохранении счетчика: {save_error}")
-                logger.error(f"Тип ошибки: {type(save_error).__name__}")
-                # Продолжаем выполнение даже при ошибке сохранения
+        if order_sequence.started:
+            sequence = await order_sequence.next(sequence_period(now))
+        else:
+            sequence = await _next_file_order_counter(now)
 
         # Форматируем дату и счетчик
         day = now.strftime("%d")
@@ -207,8 +238,8 @@ async def generate_order_number():
         year = now.strftime("%y")
 
         # Форматируем счетчик до трех знаков
-        order_sequence = str(order_counter).zfill(3)
-        order_number = f"#{day}{month}{year}/{order_sequence}"
+        sequence_number = str(sequence).zfill(3)
+        order_number = f"#{day}{month}{year}/{sequence_number}"
 
         return order_number
 
@@ -263,16 +294,22 @@ async def clear_user_cart_messages(chat_id: int):
     pass
 
 
+def _build_email_message(recipient_email: str, subject: str, body: str, sender_name: str = "Пекарня Дражина"):
+    """Формирует HTML письмо."""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"{sender_name} <{ADMIN_EMAIL}>"
+    msg['To'] = recipient_email
+
+    msg.attach(MIMEText(body, 'html', 'utf-8'))
+    return msg
+
+
 # ИЗМЕНЕНИЕ: Синхронная функция для отправки email (будет вызвана в отдельном потоке)
 def _send_email_sync(recipient_email: str, subject: str, body: str, sender_name: str = "Пекарня Дражина"):
     """Отправляет email уведомление (синхронная версия для запуска в отдельном потоке)."""
     try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = f"{sender_name} <{ADMIN_EMAIL}>"
-        msg['To'] = recipient_email
-
-        msg.attach(MIMEText(body, 'html', 'utf-8'))
+        msg = _build_email_message(recipient_email, subject, body, sender_name)
 
         with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as server:
             if config.SMTP_USE_TLS:
@@ -287,15 +324,23 @@ def _send_email_sync(recipient_email: str, subject: str, body: str, sender_name:
 
 
 async def send_email_notification(recipient_email: str, subject: str, body: str, sender_name: str = "Пекарня Дражина"):
-    """Отправляет email уведомление в отдельном потоке (не блокирует event loop)."""
+    """Отправляет email уведомление в отдельном потоке (не блокирует event loop).
+
+    Возвращает True, если письмо отправлено, False при ошибке и None, если email уведомления выключены.
+    """
     if not config.ENABLE_EMAIL_NOTIFICATIONS:
         return
     
     try:
-        # Запускаем отправку email в отдельном потоке, чтобы не блокировать event loop
-        success = await asyncio.to_thread(
-            _send_email_sync, recipient_email, subject, body, sender_name
-        )
+        if mail_worker.started:
+            # Через пул постоянных SMTP соединений; ошибки SMTP пробрасываются сюда
+            await mail_worker.send(_build_email_message(recipient_email, subject, body, sender_name))
+            success = True
+        else:
+            # Запускаем отправку email в отдельном потоке, чтобы не блокировать event loop
+            success = await asyncio.to_thread(
+                _send_email_sync, recipient_email, subject, body, sender_name
+            )
         
         if success:
             # Log security event
@@ -305,6 +350,7 @@ async def send_email_notification(recipient_email: str, subject: str, body: str,
             })
         else:
             logger.warning(f"Failed to send email to {recipient_email}")
+        return success
 
     except smtplib.SMTPAuthenticationError as e:
         logger.error(f"Ошибка аутентификации SMTP: {e}")
@@ -316,6 +362,7 @@ async def send_email_notification(recipient_email: str, subject: str, body: str,
             "recipient": recipient_email,
             "error": str(e)
         })
+        return False
         
     except smtplib.SMTPException as e:
         logger.error(f"Ошибка SMTP при отправке email: {e}")
@@ -325,6 +372,7 @@ async def send_email_notification(recipient_email: str, subject: str, body: str,
             "recipient": recipient_email,
             "error": str(e)
         })
+        return False
         
     except Exception as e:
         logger.error(f"Неизвестная ошибка при отправке email на {recipient_email}: {e}")
@@ -335,6 +383,7 @@ async def send_email_notification(recipient_email: str, subject: str, body: str,
             "error": str(e),
             "error_type": type(e).__name__
         })
+        return False
 
 
 # ===============================
@@ -661,15 +710,16 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
 
         order_number = await generate_order_number()
 
-        # Отправляем уведомления
-        try:
-            await _send_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
-        except Exception as notification_error:
-            logger.error(f"Ошибка при отправке уведомлений: {notification_error}")
-            logger.error(f"Тип ошибки: {type(notification_error).__name__}")
-            # Продолжаем выполнение даже если уведомления не отправились
+        # Записываем заказ в журнал: уведомления отправит фоновый диспетчер outbox
+        queued = False
+        if order_outbox.started:
+            try:
+                await _enqueue_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
+                queued = True
+            except Exception as e:
+                logger.error(f"Ошибка записи заказа {order_number} в журнал, отправляем уведомления напрямую: {e}")
 
-        # Отправляем краткое подтверждение пользователю с timeout
+        # Отправляем краткое подтверждение пользователю с timeout (до уведомлений)
         try:
             await asyncio.wait_for(
                 message.answer(
@@ -693,6 +743,15 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
             except Exception as e2:
                 logger.error(f"Критическая ошибка при отправке ответа: {e2}")
 
+        # Без журнала отправляем уведомления напрямую, уже после ответа пользователю
+        if not queued:
+            try:
+                await _send_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
+            except Exception as notification_error:
+                logger.error(f"Ошибка при отправке уведомлений: {notification_error}")
+                logger.error(f"Тип ошибки: {type(notification_error).__name__}")
+                # Продолжаем выполнение даже если уведомления не отправились
+
     except Exception as e:
         logger.error(f"Критическая ошибка при обработке заказа для пользователя {user_id}: {e}")
         await message.answer(
@@ -701,123 +760,193 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
         )
 
 
-async def _send_order_notifications(order_details: dict, cart_items: list, 
-                                  total_amount: float, order_number: str, user_id: int):
-    """Отправляет уведомления о новом заказе."""
+# Каналы уведомлений о заказе (строки outbox)
+CHANNEL_ADMIN_TELEGRAM = 'admin_telegram'
+CHANNEL_ADMIN_EMAIL = 'admin_email'
+CHANNEL_CUSTOMER_TELEGRAM = 'customer_telegram'
+CHANNEL_CUSTOMER_EMAIL = 'customer_email'
+
+CHANNEL_LABELS = {
+    CHANNEL_ADMIN_TELEGRAM: 'администратору в Telegram',
+    CHANNEL_ADMIN_EMAIL: 'администратору на email',
+    CHANNEL_CUSTOMER_TELEGRAM: 'клиенту в Telegram',
+    CHANNEL_CUSTOMER_EMAIL: 'клиенту на email',
+}
+TELEGRAM_CHANNELS = (CHANNEL_ADMIN_TELEGRAM, CHANNEL_CUSTOMER_TELEGRAM)
+
+# Срок отправки уведомлений заказа: общий для всех каналов при отправке напрямую,
+# для каждой доставки - при отправке через outbox
+NOTIFICATION_DEADLINE = 10.0
+NOTIFICATION_OK = 'ok'
+NOTIFICATION_TIMEOUT = 'timeout'
+NOTIFICATION_ERROR = 'error'
+NOTIFICATION_SKIPPED = 'skipped'
+
+# Письма, досылаемые в фоне после срока
+_background_tasks = set()
+
+
+def _build_order_notifications(order_details: dict, cart_items: list,
+                               total_amount: float, order_number: str, user_id: int) -> list:
+    """Формирует уведомления о заказе: список (канал, данные для отправки)."""
+    delivery_text = DELIVERY_MAP.get(order_details.get('deliveryMethod'), 'N/A')
+    phone_number = order_details.get('phone', 'N/A')
+    formatted_phone = format_phone_telegram(phone_number)
+    notifications = []
+
+    # Формируем сообщение для Telegram
     try:
+        telegram_order_summary = _format_telegram_order_summary(
+            order_number, order_details, cart_items, total_amount,
+            formatted_phone, delivery_text, user_id
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при формировании сообщения для Telegram: {e}")
+        # Создаем простое сообщение как fallback
+        user_link_fallback = f"\n[💬 Написать клиенту](tg://user?id={user_id})" if user_id else ""
+        telegram_order_summary = f"*НОВЫЙ ЗАКАЗ {order_number}*\n\nОшибка при формировании детального сообщения. Проверьте логи.{user_link_fallback}"
 
+    if ADMIN_CHAT_ID:
+        notifications.append((CHANNEL_ADMIN_TELEGRAM, {'chat_id': int(ADMIN_CHAT_ID), 'text': telegram_order_summary}))
+    else:
+        logger.warning("ADMIN_CHAT_ID не установлен. "
+                      "Заказ не будет отправлен администратору в Telegram.")
 
-        # Валидация входных данных
-        if not order_details or not cart_items or total_amount is None:
-            logger.error(f"Неверные данные для уведомлений: order_details={order_details}, cart_items={cart_items}, total_amount={total_amount}")
-            return
+    # ИЗМЕНЕНИЕ: Формируем тело email
+    try:
+        email_subject = (f"Новый заказ {order_number} от "
+                        f"{order_details.get('firstName', '')} {order_details.get('lastName', '')} - "
+                        f"{total_amount:.2f} р.")
+        email_body = _format_email_body(order_number, order_details, cart_items,
+                                       total_amount, delivery_text)
+    except Exception as e:
+        logger.error(f"Ошибка при формировании email уведомления: {e}")
+        # Создаем простое email как fallback
+        email_subject = f"Новый заказ {order_number}"
+        email_body = f"""
+        <html>
+        <body>
+            <h2>Новый заказ {order_number}</h2>
+            <p>Ошибка при формировании детального email. Проверьте логи.</p>
+            <p>Покупатель: {order_details.get('firstName', 'N/A')} {order_details.get('lastName', 'N/A')}</p>
+            <p>Сумма: {total_amount:.2f} р.</p>
+        </body>
+        </html>
+        """
 
-        delivery_method = order_details.get('deliveryMethod', 'N/A')
-        delivery_text = DELIVERY_MAP.get(order_details.get('deliveryMethod'), 'N/A')
-        phone_number = order_details.get('phone', 'N/A')
-        formatted_phone = format_phone_telegram(phone_number)
+    if ADMIN_EMAIL:
+        admin_email_password = os.environ.get("ADMIN_EMAIL_PASSWORD")
+        if admin_email_password:
+            notifications.append((CHANNEL_ADMIN_EMAIL, {
+                'recipient': ADMIN_EMAIL, 'subject': email_subject, 'body': email_body,
+                'sender_name': "Пекарня Дражина"
+            }))
+        else:
+            logger.error("Переменная окружения ADMIN_EMAIL_PASSWORD не установлена. "
+                        "Email уведомление не будет отправлено.")
+    else:
+        logger.warning("ADMIN_EMAIL не установлен. Email уведомление не будет отправлено.")
 
-        # Формируем сообщение для Telegram
+    # Подтверждение заказа клиенту в Telegram
+    if user_id:
         try:
-            telegram_order_summary = _format_telegram_order_summary(
-                order_number, order_details, cart_items, total_amount, 
-                formatted_phone, delivery_text, user_id
+            customer_message = _format_customer_telegram_message(
+                order_number, order_details, cart_items, total_amount, delivery_text
             )
+            notifications.append((CHANNEL_CUSTOMER_TELEGRAM, {'chat_id': user_id, 'text': customer_message}))
         except Exception as e:
-            logger.error(f"Ошибка при формировании сообщения для Telegram: {e}")
-            # Создаем простое сообщение как fallback
-            user_link_fallback = f"\n[💬 Написать клиенту](tg://user?id={user_id})" if user_id else ""
-            telegram_order_summary = f"*НОВЫЙ ЗАКАЗ {order_number}*\n\nОшибка при формировании детального сообщения. Проверьте логи.{user_link_fallback}"
-
-        # ИЗМЕНЕНИЕ: Отправка сообщения администратору в Telegram с timeout
-        if ADMIN_CHAT_ID:
-            try:
-                logger.info(f"Отправка заказа {order_number} администратору в Telegram...")
-                await asyncio.wait_for(
-                    bot.send_message(
-                        chat_id=int(ADMIN_CHAT_ID),
-                        text=telegram_order_summary,
-                        parse_mode=ParseMode.MARKDOWN
-                    ),
-                    timeout=10.0  # 10 секунд timeout
-                )
-                logger.info(f"✅ Заказ {order_number} успешно отправлен администратору в Telegram")
-            except asyncio.TimeoutError:
-                logger.error(f"⏱️ Timeout при отправке заказа {order_number} администратору в Telegram. ID чата: {ADMIN_CHAT_ID}.")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при отправке заказа {order_number} "
-                            f"администратору в Telegram. ID чата: {ADMIN_CHAT_ID}. Ошибка: {e}")
-        else:
-            logger.warning("ADMIN_CHAT_ID не установлен. "
-                          "Заказ не будет отправлен администратору в Telegram.")
+            logger.error(f"❌ Ошибка при формировании подтверждения заказа клиенту {user_id} в Telegram: {e}")
+    else:
+        logger.warning("User ID не доступен. Подтверждение заказа в Telegram клиенту не будет отправлено.")
 
-        # ИЗМЕНЕНИЕ: Формируем тело email и отправляем его
+    # Письмо пользователю
+    user_email = order_details.get('email')
+    if user_email:
         try:
-            email_subject = (f"Новый заказ {order_number} от "
-                            f"{order_details.get('firstName', '')} {order_details.get('lastName', '')} - "
-                            f"{total_amount:.2f} р.")
-            email_body = _format_email_body(order_number, order_details, cart_items, 
-                                           total_amount, delivery_text)
+            user_email_subject = f"Вы сделали заказ {order_number} в Telegram боте Пекарни Дражина"
+            user_email_body = _format_user_email_body(order_number, order_details, cart_items, total_amount)
+            notifications.append((CHANNEL_CUSTOMER_EMAIL, {
+                'recipient': user_email, 'subject': user_email_subject, 'body': user_email_body,
+                'sender_name': "Пекарня Дражина"
+            }))
         except Exception as e:
-            logger.error(f"Ошибка при формировании email уведомления: {e}")
-            # Создаем простое email как fallback
-            email_subject = f"Новый заказ {order_number}"
-            email_body = f"""
-            <html>
-            <body>
-                <h2>Новый заказ {order_number}</h2>
-                <p>Ошибка при формировании детального email. Проверьте логи.</p>
-                <p>Покупатель: {order_details.get('firstName', 'N/A')} {order_details.get('lastName', 'N/A')}</p>
-                <p>Сумма: {total_amount:.2f} р.</p>
-            </body>
-            </html>
-            """
+            logger.error(f"Ошибка при формировании письма пользователю: {e}")
+    else:
+        logger.warning("Email пользователя не указан. Письмо пользователю не будет отправлено.")
 
-        if ADMIN_EMAIL:
-            admin_email_password = os.environ.get("ADMIN_EMAIL_PASSWORD")
-            if admin_email_password:
-                # ИСПРАВЛЕНО: Отправляем email в фоне, чтобы не блокировать обработку заказа
-                asyncio.create_task(send_email_notification(ADMIN_EMAIL, email_subject, email_body, "Пекарня Дражина"))
-            else:
-                logger.error("Переменная окружения ADMIN_EMAIL_PASSWORD не установлена. "
-                            "Email уведомление не будет отправлено.")
-        else:
-            logger.warning("ADMIN_EMAIL не установлен. Email уведомление не будет отправлено.")
+    return notifications
 
-        # Отправляем подтверждение заказа клиенту в Telegram с timeout
-        if user_id:
-            try:
-                logger.info(f"Отправка подтверждения заказа {order_number} клиенту {user_id} в Telegram...")
-                customer_message = _format_customer_telegram_message(
-                    order_number, order_details, cart_items, total_amount, delivery_text
-                )
-                await asyncio.wait_for(
-                    bot.send_message(
-                        chat_id=user_id,
-                        text=customer_message,
-                        parse_mode=ParseMode.MARKDOWN
-                    ),
-                    timeout=10.0  # 10 секунд timeout
-                )
-                logger.info(f"✅ Подтверждение заказа {order_number} успешно отправлено клиенту {user_id}")
-            except asyncio.TimeoutError:
-                logger.error(f"⏱️ Timeout при отправке подтверждения заказа клиенту {user_id} в Telegram.")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при отправке подтверждения заказа клиенту {user_id} в Telegram: {e}")
-        else:
-            logger.warning("User ID не доступен. Подтверждение заказа в Telegram клиенту не будет отправлено.")
 
-        # Отправляем письмо пользователю
-        user_email = order_details.get('email')
-        if user_email:
+async def _send_order_notification(channel: str, payload: dict):
+    """Отправляет одно уведомление; исключение - если не отправлено."""
+    if channel in TELEGRAM_CHANNELS:
+        await bot.send_message(
+            chat_id=payload['chat_id'],
+            text=payload['text'],
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return NOTIFICATION_OK
+    sent = await send_email_notification(
+        payload['recipient'], payload['subject'], payload['body'], payload['sender_name']
+    )
+    if sent is None:
+        return NOTIFICATION_SKIPPED
+    if not sent:
+        raise RuntimeError(f"email to {payload['recipient']} was not sent")
+    return NOTIFICATION_OK
+
+
+async def _send_order_notifications(order_details: dict, cart_items: list,
+                                  total_amount: float, order_number: str, user_id: int):
+    """Отправляет уведомления о новом заказе напрямую (без outbox).
+
+    Все каналы отправляются одновременно в пределах одного общего срока
+    NOTIFICATION_DEADLINE; результат каждого канала (ok / timeout / error / skipped)
+    записывается в лог одной структурированной записью на заказ.
+    """
+    try:
+
+
+        # Валидация входных данных
+        if not order_details or not cart_items or total_amount is None:
+            logger.error(f"Неверные данные для уведомлений: order_details={order_details}, cart_items={cart_items}, total_amount={total_amount}")
+            return
+
+        notifications = _build_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        channels = {}
+
+        async def send(channel, payload):
             try:
-                user_email_subject = f"Вы сделали заказ {order_number} в Telegram боте Пекарни Дражина"
-                user_email_body = _format_user_email_body(order_number, order_details, cart_items, total_amount)
-                asyncio.create_task(send_email_notification(user_email, user_email_subject, user_email_body, "Пекарня Дражина"))
+                status = await _send_order_notification(channel, payload)
+                channels[channel] = {'status': status}
             except Exception as e:
-                logger.error(f"Ошибка при отправке письма пользователю: {e}")
-        else:
-            logger.warning("Email пользователя не указан. Письмо пользователю не будет отправлено.")
+                channels[channel] = {'status': NOTIFICATION_ERROR, 'error': f"{type(e).__name__}: {e}"}
+                logger.error(f"❌ Ошибка при отправке заказа {order_number} {CHANNEL_LABELS[channel]}: {e}")
+            channels[channel]['elapsed'] = round(loop.time() - started, 3)
+
+        tasks = {asyncio.create_task(send(channel, payload)): channel for channel, payload in notifications}
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=NOTIFICATION_DEADLINE)
+            for task in pending:
+                channel = tasks[task]
+                channels[channel] = {'status': NOTIFICATION_TIMEOUT, 'elapsed': round(loop.time() - started, 3)}
+                logger.error(f"⏱️ Timeout при отправке заказа {order_number} {CHANNEL_LABELS[channel]}.")
+                if channel in TELEGRAM_CHANNELS:
+                    task.cancel()
+                else:
+                    # Письмо не прерываем: отправка продолжается в фоне
+                    _background_tasks.add(task)
+                    task.add_done_callback(_background_tasks.discard)
+
+        record = {
+            'order_number': order_number,
+            'user_id': user_id,
+            'elapsed': round(loop.time() - started, 3),
+            'channels': channels,
+        }
+        logger.info(f"Уведомления по заказу {order_number}: {json.dumps(record, ensure_ascii=False)}")
 
 
     except Exception as e:
@@ -827,6 +956,55 @@ async def _send_order_notifications(order_details: dict, cart_items: list,
         logger.warning("Продолжаем обработку заказа без уведомлений")
 
 
+async def _enqueue_order_notifications(order_details: dict, cart_items: list,
+                                       total_amount: float, order_number: str, user_id: int):
+    """Записывает заказ в журнал и ставит уведомления в outbox (отправит фоновый диспетчер)."""
+    notifications = _build_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
+    if not config.ENABLE_EMAIL_NOTIFICATIONS:
+        notifications = [(channel, payload) for channel, payload in notifications if channel in TELEGRAM_CHANNELS]
+    order = {'order_details': order_details, 'cart_items': cart_items, 'total_amount': total_amount}
+    await order_outbox.record_order(order_number, user_id, order, notifications)
+    logger.info(f"Заказ {order_number} записан в журнал, уведомлений в очереди: {len(notifications)}")
+
+
+async def _deliver_telegram_notification(payload: dict):
+    """Доставка уведомления из outbox в Telegram (срок NOTIFICATION_DEADLINE задает outbox)."""
+    try:
+        await bot.send_message(
+            chat_id=payload['chat_id'],
+            text=payload['text'],
+            parse_mode=ParseMode.MARKDOWN
+        )
+    except TelegramRetryAfter as e:
+        raise DeliveryError(str(e), retry_after=e.retry_after) from e
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # Бот заблокирован или чат не найден - повтор не поможет
+        raise DeliveryError(str(e), permanent=True) from e
+
+
+async def _deliver_email_notification(payload: dict):
+    """Доставка email уведомления из outbox."""
+    if mail_worker.started:
+        message = _build_email_message(
+            payload['recipient'], payload['subject'], payload['body'], payload['sender_name']
+        )
+        try:
+            await mail_worker.send(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            # Адрес отклонен сервером - повтор не поможет
+            raise DeliveryError(str(e), permanent=True) from e
+    else:
+        success = await asyncio.to_thread(
+            _send_email_sync, payload['recipient'], payload['subject'], payload['body'], payload['sender_name']
+        )
+        if not success:
+            raise DeliveryError(f"email to {payload['recipient']} was not sent")
+    security_manager._log_security_event("email_sent", {
+        "recipient": payload['recipient'],
+        "subject": payload['subject']
+    })
+
+
 def _format_customer_telegram_message(order_number: str, order_details: dict, 
                                      cart_items: list, total_amount: float, delivery_text: str) -> str:
     """Форматирует сообщение с подтверждением заказа для клиента в Telegram."""
@@ -1358,6 +1536,32 @@ async def main():
     await load_products_data()
     # Загружаем счетчик заказов
     await load_order_counter()
+    # Номера заказов: атомарный счетчик в SQLite, продолжающий счетчик из файла
+    try:
+        await order_sequence.start()
+        now = datetime.datetime.now()
+        if last_reset_month == now.month:
+            await order_sequence.seed(sequence_period(now), order_counter)
+    except Exception as e:
+        # Файл счетчика отстает от SQLite (номера из SQLite в него не пишутся):
+        # переход на него выдал бы уже использованные номера заказов
+        logger.critical(f"Не удалось запустить счетчик заказов в SQLite, бот не запускается: {e}")
+        await order_sequence.close()
+        raise
+    if config.ENABLE_EMAIL_NOTIFICATIONS:
+        await mail_worker.start()
+    # Журнал заказов и фоновая отправка уведомлений
+    order_outbox.register(CHANNEL_ADMIN_TELEGRAM, _deliver_telegram_notification, OUTBOX_TELEGRAM_CONCURRENCY, NOTIFICATION_DEADLINE)
+    order_outbox.register(CHANNEL_CUSTOMER_TELEGRAM, _deliver_telegram_notification, OUTBOX_TELEGRAM_CONCURRENCY, NOTIFICATION_DEADLINE)
+    order_outbox.register(CHANNEL_ADMIN_EMAIL, _deliver_email_notification, OUTBOX_EMAIL_CONCURRENCY, NOTIFICATION_DEADLINE)
+    order_outbox.register(CHANNEL_CUSTOMER_EMAIL, _deliver_email_notification, OUTBOX_EMAIL_CONCURRENCY, NOTIFICATION_DEADLINE)
+    try:
+        await order_outbox.start()
+    except Exception as e:
+        logger.error(f"Не удалось запустить журнал заказов, уведомления будут отправляться напрямую: {e}")
+        await order_outbox.close()
+    # Корзины: восстановление из SQLite и фоновая запись
+    await user_carts.start()
 
     # Включение хендлера для Web App данных
     dp.message.register(handle_web_app_data, F.web_app_data)
@@ -1390,6 +1594,10 @@ async def main():
         logger.info("Остановка API сервера...")
         await runner.cleanup()
         logger.info("API сервер остановлен.")
+        await user_carts.close()
+        await order_outbox.close()
+        await mail_worker.close()
+        await order_sequence.close()
         logger.info("Закрытие сессии бота...")
         await bot.session.close()
         logger.info("Сессия бота закрыта.")
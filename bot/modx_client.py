@@ -0,0 +1,141 @@
+"""
+MODX API Client
+One long-lived aiohttp ClientSession per process for all MODX API calls, so TCP/TLS
+connections are kept alive and DNS lookups are cached instead of being paid per call.
+All calls go through a circuit breaker: while MODX is down they fail immediately
+with CircuitOpenError instead of each waiting for MODX_API_TIMEOUT.
+"""
+
+import asyncio
+import logging
+import os
+import ssl
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from bot.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Connection pool configuration
+MODX_API_CONNECT_TIMEOUT = float(os.environ.get('MODX_API_CONNECT_TIMEOUT', '5'))
+MODX_API_CONNECTION_LIMIT = int(os.environ.get('MODX_API_CONNECTION_LIMIT', '20'))
+MODX_API_CONNECTION_LIMIT_PER_HOST = int(os.environ.get('MODX_API_CONNECTION_LIMIT_PER_HOST', '10'))
+MODX_API_DNS_CACHE_TTL = int(os.environ.get('MODX_API_DNS_CACHE_TTL', '300'))
+MODX_API_KEEPALIVE_TIMEOUT = float(os.environ.get('MODX_API_KEEPALIVE_TIMEOUT', '30'))
+
+# Circuit breaker: consecutive failures before failing fast, and the cooldown (s)
+# before a single trial call is let through again
+MODX_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('MODX_BREAKER_FAILURE_THRESHOLD', '5'))
+MODX_BREAKER_RESET_TIMEOUT = float(os.environ.get('MODX_BREAKER_RESET_TIMEOUT', '30'))
+
+
+class ModxApiError(Exception):
+    """MODX API answered with a non-200 status."""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"{status} - {text}")
+        self.status = status
+        self.text = text
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Network errors, timeouts, 5xx and 429 count against the breaker; other statuses do not."""
+    if isinstance(error, ModxApiError):
+        return error.status >= 500 or error.status == 429
+    return True
+
+
+class ModxClient:
+    """Pooled HTTP client for the MODX JSON endpoints.
+
+    The session is created on first use (or by start()) and is bound to the
+    running event loop; a call from another loop transparently gets a new one
+    and the old one is closed.
+    """
+
+    def __init__(self, base_url: str, timeout: float,
+                 connect_timeout: float = MODX_API_CONNECT_TIMEOUT,
+                 limit: int = MODX_API_CONNECTION_LIMIT,
+                 limit_per_host: int = MODX_API_CONNECTION_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = MODX_API_DNS_CACHE_TTL,
+                 keepalive_timeout: float = MODX_API_KEEPALIVE_TIMEOUT,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.breaker = breaker or CircuitBreaker(
+            'modx', MODX_BREAKER_FAILURE_THRESHOLD, MODX_BREAKER_RESET_TIMEOUT, is_failure=is_upstream_failure
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        # Настройка SSL для Heroku
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+
+        connector = aiohttp.TCPConnector(
+            ssl=ssl_context,
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on the current loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            if self._session is not None and not self._session.closed:
+                await self._release_session(self._session, self._loop)
+            self._session = self._create_session()
+            self._loop = loop
+        return self._session
+
+    async def _release_session(self, session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]):
+        """Close a session created on another event loop before it is replaced."""
+        if loop is not None and loop.is_running():
+            # Still served by its own thread: close it there
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        # The loop is stopped or closed, so the session cannot be awaited there;
+        # take the connector off it and drop its pooled connections directly
+        connector = session.connector
+        session.detach()
+        if connector is None or connector.closed:
+            return
+        try:
+            await connector.close()
+        except Exception as e:
+            logger.warning(f"MODX client: Connections of the previous event loop were not closed cleanly: {e}")
+        else:
+            logger.info("MODX client: Closed the session of the previous event loop")
+
+    async def close(self):
+        """Close the session and its pooled connections."""
+        session, self._session, self._loop = self._session, None, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """GET <base_url>/<path> and decode the JSON body.
+
+        Raises ModxApiError for non-200 responses and CircuitOpenError while the
+        breaker is open; network errors and timeouts propagate as aiohttp/asyncio
+        exceptions.
+        """
+        return await self.breaker.call(self._get_json, path, params)
+
+    async def _get_json(self, path: str, params: Optional[Dict[str, Any]]) -> Any:
+        session = await self.start()
+        async with session.get(f"{self.base_url}/{path.lstrip('/')}", params=params) as response:
+            if response.status != 200:
+                raise ModxApiError(response.status, await response.text())
+            return await response.json()
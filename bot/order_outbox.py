@@ -0,0 +1,285 @@
+"""
+Order Outbox
+Durable journal of accepted orders and outbox of their notifications.
+
+record_order() writes the order and one outbox row per notification (admin and
+customer Telegram, admin and customer email) in a single synchronous=FULL
+SQLite transaction. Once it returns, the order survives a crash and the
+checkout can be acknowledged; nothing on the checkout path waits for Telegram
+or SMTP.
+
+A background dispatcher delivers the outbox rows through the handler
+registered for their channel:
+
+- at most `concurrency` deliveries per channel run at once, each bounded by
+  the channel's `timeout`,
+- a failed delivery is retried with exponential backoff (or after the delay
+  the upstream asked for, e.g. Telegram flood control),
+- a delivered row is deleted; after max_attempts attempts or a permanent error
+  it is kept with status 'failed' for inspection.
+
+Rows still pending at shutdown are delivered after the next start. Delivery is
+at least once: a send that timed out may have arrived and is repeated.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_RETRY_BASE_DELAY = float(os.environ.get('OUTBOX_RETRY_BASE_DELAY', '5'))
+OUTBOX_RETRY_MAX_DELAY = float(os.environ.get('OUTBOX_RETRY_MAX_DELAY', '900'))
+OUTBOX_TELEGRAM_CONCURRENCY = int(os.environ.get('OUTBOX_TELEGRAM_CONCURRENCY', '4'))
+OUTBOX_EMAIL_CONCURRENCY = int(os.environ.get('OUTBOX_EMAIL_CONCURRENCY', '2'))
+
+# Longest the dispatcher sleeps without being woken up
+_MAX_IDLE = 60.0
+# Deliveries still running at close() get this long to finish
+_CLOSE_TIMEOUT = 5.0
+
+STATUS_PENDING = 'pending'
+STATUS_FAILED = 'failed'
+
+# Delivers one payload; raises on failure
+DeliveryHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class DeliveryError(Exception):
+    """A failed delivery with a hint for the dispatcher.
+
+    permanent: retrying cannot help (e.g. the user blocked the bot).
+    retry_after: the upstream asked not to retry before this many seconds.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+def retry_delay(attempts: int, base_delay: float = OUTBOX_RETRY_BASE_DELAY,
+                max_delay: float = OUTBOX_RETRY_MAX_DELAY) -> float:
+    """Delay before the next attempt after `attempts` failed ones."""
+    return min(base_delay * 2 ** (attempts - 1), max_delay)
+
+
+class _Channel:
+    __slots__ = ('handler', 'concurrency', 'timeout', 'in_flight')
+
+    def __init__(self, handler: DeliveryHandler, concurrency: int, timeout: Optional[float]):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.in_flight = 0
+
+
+class OrderOutbox:
+    """Order journal plus notification outbox in SQLite, with its dispatcher."""
+
+    def __init__(self, db_path: str, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 base_delay: float = OUTBOX_RETRY_BASE_DELAY, max_delay: float = OUTBOX_RETRY_MAX_DELAY,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self._channels: Dict[str, _Channel] = {}
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self._in_flight: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        # One transaction at a time on the shared connection
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._db is not None
+
+    def register(self, channel: str, handler: DeliveryHandler, concurrency: int = 1,
+                 timeout: Optional[float] = None):
+        """Deliver the rows of channel through handler (before start()).
+
+        A delivery still running after `timeout` seconds is cancelled and retried.
+        """
+        self._channels[channel] = _Channel(handler, concurrency, timeout)
+
+    async def start(self):
+        """Open the database and start the dispatcher (idempotent)."""
+        if self._db is not None:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly
+        self._db = await aiosqlite.connect(self.db_path, timeout=5, isolation_level=None)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        # An acknowledged order must survive a power loss
+        await self._db.execute("PRAGMA synchronous=FULL")
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, order_number TEXT NOT NULL, user_id INTEGER, "
+            "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, order_number TEXT NOT NULL, channel TEXT NOT NULL, "
+            "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL)"
+        )
+        await self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        counts = await self.counts()
+        self._task = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"Order outbox: Started - {self.db_path} "
+                    f"({counts.get(STATUS_PENDING, 0)} pending, {counts.get(STATUS_FAILED, 0)} failed notifications)")
+
+    async def close(self):
+        """Stop the dispatcher; pending deliveries stay in the outbox."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._deliveries:
+            done, running = await asyncio.wait(self._deliveries, timeout=_CLOSE_TIMEOUT)
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def record_order(self, order_number: str, user_id: Optional[int], order: Dict[str, Any],
+                           deliveries: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Durably journal the order and enqueue its notifications (one transaction)."""
+        now = self.clock()
+        rows = [(order_number, channel, json.dumps(payload, ensure_ascii=False), STATUS_PENDING, now, now)
+                for channel, payload in deliveries]
+        async with self._write_lock:
+            await self._db.execute("BEGIN IMMEDIATE")
+            try:
+                await self._db.execute(
+                    "INSERT INTO orders (order_number, user_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (order_number, user_id, json.dumps(order, ensure_ascii=False), now)
+                )
+                await self._db.executemany(
+                    "INSERT INTO outbox (order_number, channel, payload, status, next_attempt_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                await self._db.execute("COMMIT")
+            except BaseException:
+                try:
+                    await self._db.execute("ROLLBACK")
+                except Exception as e:
+                    logger.error(f"Order outbox: Rollback failed: {e}")
+                raise
+        self._wakeup.set()
+
+    async def counts(self) -> Dict[str, int]:
+        """Number of outbox rows per status."""
+        async with self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status") as cursor:
+            return {status: count async for status, count in cursor}
+
+    # ----- dispatcher -----
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = await self._dispatch_due()
+            except Exception as e:
+                logger.error(f"Order outbox: Dispatch failed: {e}")
+                timeout = self.base_delay
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_due(self) -> float:
+        """Start the due deliveries that have a free channel slot; returns how long to sleep."""
+        now = self.clock()
+        free = {name: channel.concurrency - channel.in_flight for name, channel in self._channels.items()}
+        if not free:
+            return _MAX_IDLE
+        placeholders = ', '.join('?' * len(free))
+        if any(slots > 0 for slots in free.values()):
+            async with self._db.execute(
+                f"SELECT id, channel, payload, attempts FROM outbox "
+                f"WHERE status = ? AND next_attempt_at <= ? AND channel IN ({placeholders}) ORDER BY id LIMIT ?",
+                (STATUS_PENDING, now, *free, sum(free.values()) + len(self._in_flight))
+            ) as cursor:
+                rows = await cursor.fetchall()
+            for row_id, name, payload, attempts in rows:
+                if row_id in self._in_flight or free[name] <= 0:
+                    continue
+                free[name] -= 1
+                self._start_delivery(row_id, name, payload, attempts)
+
+        async with self._db.execute(
+            f"SELECT MIN(next_attempt_at) FROM outbox "
+            f"WHERE status = ? AND next_attempt_at > ? AND channel IN ({placeholders})",
+            (STATUS_PENDING, now, *free)
+        ) as cursor:
+            (next_attempt_at,) = await cursor.fetchone()
+        if next_attempt_at is None:
+            return _MAX_IDLE
+        return min(max(next_attempt_at - now, 0.0), _MAX_IDLE)
+
+    def _start_delivery(self, row_id: int, name: str, payload: str, attempts: int):
+        self._channels[name].in_flight += 1
+        self._in_flight.add(row_id)
+        task = asyncio.create_task(self._deliver(row_id, name, payload, attempts))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, row_id: int, name: str, payload: str, attempts: int):
+        channel = self._channels[name]
+        try:
+            try:
+                await asyncio.wait_for(channel.handler(json.loads(payload)), timeout=channel.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._on_failure(row_id, name, attempts + 1, e)
+            else:
+                async with self._write_lock:
+                    await self._db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The row stays pending and is delivered again
+            logger.error(f"Order outbox: Failed to record the result of notification {row_id}: {e}")
+        finally:
+            channel.in_flight -= 1
+            self._in_flight.discard(row_id)
+            self._wakeup.set()
+
+    async def _on_failure(self, row_id: int, name: str, attempts: int, error: Exception):
+        permanent = isinstance(error, DeliveryError) and error.permanent
+        if permanent or attempts >= self.max_attempts:
+            logger.error(f"Order outbox: Giving up on {name} notification {row_id} "
+                         f"after {attempts} attempts: {error!r}")
+            status, next_attempt_at = STATUS_FAILED, self.clock()
+        else:
+            delay = retry_delay(attempts, self.base_delay, self.max_delay)
+            if isinstance(error, DeliveryError) and error.retry_after:
+                delay = max(delay, error.retry_after)
+            logger.warning(f"Order outbox: {name} notification {row_id} failed (attempt {attempts}), "
+                           f"retrying in {delay:.0f}s: {error!r}")
+            status, next_attempt_at = STATUS_PENDING, self.clock() + delay
+        async with self._write_lock:
+            await self._db.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, repr(error), row_id)
+            )
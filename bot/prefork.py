@@ -0,0 +1,323 @@
+"""
+Prefork Worker Supervisor
+Multi-process mode of run_api_only.py (--workers N, POSIX only).
+
+The parent forks N worker processes that each run their own event loop and
+bind the API port with SO_REUSEPORT, so the kernel balances connections
+between them. The parent serves no traffic; it only:
+
+- restarts crashed workers (with backoff when they crash right after start),
+- stops all workers gracefully on SIGTERM/SIGINT,
+- replaces all workers on SIGHUP (rolling reload: an old worker is stopped
+  only once its replacement is accepting connections),
+- watches the catalog files and tells every worker to switch to the new
+  version at the same moment (CATALOG_RELOAD_SIGNAL), instead of each worker
+  noticing the change on its own schedule.
+
+Workers report readiness by writing a byte to a pipe inherited from the parent.
+"""
+
+import asyncio
+import logging
+import os
+import select
+import signal
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPERVISOR_POLL_INTERVAL = 1.0
+WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get('API_WORKER_SHUTDOWN_TIMEOUT', '30'))
+# A worker exiting sooner than this after its start is restarted with backoff
+WORKER_MIN_UPTIME = 5.0
+WORKER_MAX_RESTART_DELAY = 30.0
+
+# Sent by the supervisor to make a worker reload the catalog immediately
+CATALOG_RELOAD_SIGNAL = signal.SIGUSR1
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+SUPERVISOR_SIGNALS = STOP_SIGNALS + (signal.SIGHUP, CATALOG_RELOAD_SIGNAL, signal.SIGCHLD)
+
+# Worker entry point: (slot, ready_fd) -> exit code
+WorkerTarget = Callable[[int, int], int]
+
+
+def next_restart_delay(previous_delay: float, uptime: float, min_uptime: float = WORKER_MIN_UPTIME,
+                       max_delay: float = WORKER_MAX_RESTART_DELAY) -> float:
+    """Restart at once after a normal run; back off while a worker keeps crashing on start."""
+    if uptime >= min_uptime:
+        return 0.0
+    return min(max(previous_delay * 2, 1.0), max_delay)
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def notify_ready(ready_fd: int):
+    """Tell the supervisor this worker accepts connections."""
+    try:
+        os.write(ready_fd, b'1')
+    finally:
+        os.close(ready_fd)
+
+
+async def watch_parent(stop: asyncio.Event, interval: float = SUPERVISOR_POLL_INTERVAL):
+    """Set stop when the supervisor is gone (the worker has been re-parented)."""
+    parent = os.getppid()
+    while os.getppid() == parent:
+        await asyncio.sleep(interval)
+    logger.warning("Worker: Supervisor exited, stopping")
+    stop.set()
+
+
+class WorkerProcess:
+    """Supervisor-side state of one forked worker."""
+
+    __slots__ = ('slot', 'pid', 'ready_fd', 'started', 'ready', 'retiring', 'replaces')
+
+    def __init__(self, slot: int, pid: int, ready_fd: int, replaces: Optional[int] = None):
+        self.slot = slot
+        self.pid = pid
+        self.ready_fd: Optional[int] = ready_fd
+        self.started = time.monotonic()
+        self.ready = False
+        # SIGTERM sent: replaced or shutting down, must not be restarted
+        self.retiring = False
+        # pid of the worker to stop once this one is ready (rolling reload)
+        self.replaces = replaces
+
+
+class Supervisor:
+    """Forks and supervises the API worker processes."""
+
+    def __init__(self, worker_count: int, target: WorkerTarget, watch_paths: Sequence[str] = (),
+                 poll_interval: float = SUPERVISOR_POLL_INTERVAL,
+                 shutdown_timeout: float = WORKER_SHUTDOWN_TIMEOUT,
+                 min_uptime: float = WORKER_MIN_UPTIME):
+        self.worker_count = worker_count
+        self.target = target
+        self.watch_paths = tuple(watch_paths)
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.min_uptime = min_uptime
+        self._workers: Dict[int, WorkerProcess] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._restart_delay: Dict[int, float] = {}
+        self._signals: List[int] = []
+        self._stop_deadline: Optional[float] = None
+        self._catalog_signature = None
+        self._wakeup_r = self._wakeup_w = -1
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop_deadline is not None
+
+    def run(self) -> int:
+        """Run until stopped by a signal and all workers have exited."""
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        previous_wakeup_fd = signal.set_wakeup_fd(self._wakeup_w)
+        previous_handlers = {sig: signal.signal(sig, self._on_signal) for sig in SUPERVISOR_SIGNALS}
+        try:
+            logger.info(f"Supervisor: Starting {self.worker_count} API workers (pid {os.getpid()})")
+            self._catalog_signature = self._read_catalog_signature()
+            for slot in range(self.worker_count):
+                self._spawn(slot)
+            while self._workers:
+                self._wait()
+                self._handle_signals()
+                self._reap()
+                if self.stopping:
+                    self._kill_after_timeout()
+                    continue
+                self._restart_due()
+                self._broadcast_catalog_change()
+            logger.info("Supervisor: All workers stopped")
+            return 0
+        finally:
+            signal.set_wakeup_fd(previous_wakeup_fd)
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+            for worker in self._workers.values():
+                self._close_ready_fd(worker)
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+
+    def _on_signal(self, signum, frame):
+        # Only queue it: the main loop is woken through the wakeup fd
+        self._signals.append(signum)
+
+    def _spawn(self, slot: int, replaces: Optional[int] = None) -> WorkerProcess:
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            self._run_child(slot, ready_w)
+        os.close(ready_w)
+        worker = WorkerProcess(slot, pid, ready_r, replaces)
+        self._workers[pid] = worker
+        logger.info(f"Supervisor: Worker {slot} started (pid {pid})")
+        return worker
+
+    def _run_child(self, slot: int, ready_fd: int):
+        """Body of the forked process; never returns."""
+        code = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            for sig in SUPERVISOR_SIGNALS:
+                signal.signal(sig, signal.SIG_DFL)
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            for worker in self._workers.values():
+                self._close_ready_fd(worker)
+            code = self.target(slot, ready_fd)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception(f"Worker {slot}: Crashed")
+        finally:
+            logging.shutdown()
+            os._exit(code or 0)
+
+    def _wait(self):
+        timeout = self.poll_interval
+        if self._restart_at and not self.stopping:
+            timeout = max(0.0, min(timeout, min(self._restart_at.values()) - time.monotonic()))
+        pending = {worker.ready_fd: worker for worker in self._workers.values() if worker.ready_fd is not None}
+        readable, _, _ = select.select([self._wakeup_r, *pending], [], [], timeout)
+        for fd in readable:
+            if fd == self._wakeup_r:
+                try:
+                    while os.read(self._wakeup_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+            else:
+                self._on_ready_pipe(pending[fd])
+
+    def _on_ready_pipe(self, worker: WorkerProcess):
+        data = os.read(worker.ready_fd, 1)
+        self._close_ready_fd(worker)
+        if not data:
+            # Exited before becoming ready; handled when reaped
+            return
+        worker.ready = True
+        logger.info(f"Supervisor: Worker {worker.slot} ready (pid {worker.pid})")
+        if not self.stopping:
+            # The version on disk may have changed while it was starting
+            self._send(worker, CATALOG_RELOAD_SIGNAL)
+        old = self._workers.get(worker.replaces)
+        if old is not None:
+            self._retire(old)
+
+    def _handle_signals(self):
+        signals, self._signals = self._signals, []
+        for signum in signals:
+            if signum in STOP_SIGNALS:
+                self._stop(signum)
+            elif signum == signal.SIGHUP and not self.stopping:
+                self._reload()
+            elif signum == CATALOG_RELOAD_SIGNAL and not self.stopping:
+                self._broadcast(CATALOG_RELOAD_SIGNAL)
+
+    def _stop(self, signum: int):
+        if self.stopping:
+            logger.warning("Supervisor: Second stop signal, killing workers")
+            self._broadcast(signal.SIGKILL, ready_only=False)
+            return
+        logger.info(f"Supervisor: Received {signal.Signals(signum).name}, stopping workers")
+        self._stop_deadline = time.monotonic() + self.shutdown_timeout
+        self._restart_at.clear()
+        for worker in list(self._workers.values()):
+            self._retire(worker)
+
+    def _reload(self):
+        """Rolling restart: start a replacement per worker, stop the old one once it is ready."""
+        logger.info("Supervisor: Reloading workers")
+        for worker in list(self._workers.values()):
+            if not worker.retiring:
+                self._spawn(worker.slot, replaces=worker.pid)
+
+    def _retire(self, worker: WorkerProcess):
+        worker.retiring = True
+        self._send(worker, signal.SIGTERM)
+
+    def _send(self, worker: WorkerProcess, signum: int):
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _broadcast(self, signum: int, ready_only: bool = True):
+        # Workers install their handlers before they report ready and drop them
+        # when they shut down; the default action of CATALOG_RELOAD_SIGNAL would
+        # terminate them
+        for worker in list(self._workers.values()):
+            if not ready_only or (worker.ready and not worker.retiring):
+                self._send(worker, signum)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            self._close_ready_fd(worker)
+            code = os.waitstatus_to_exitcode(status)
+            if worker.retiring:
+                logger.info(f"Supervisor: Worker {worker.slot} stopped (pid {pid}, exit code {code})")
+                continue
+
+            logger.error(f"Supervisor: Worker {worker.slot} exited unexpectedly (pid {pid}, exit code {code})")
+            if any(other.slot == worker.slot and not other.retiring for other in self._workers.values()):
+                # A reload replacement (or the worker it was meant to replace) still serves the slot
+                continue
+            uptime = time.monotonic() - worker.started
+            delay = next_restart_delay(self._restart_delay.get(worker.slot, 0.0), uptime, self.min_uptime)
+            self._restart_delay[worker.slot] = delay
+            self._restart_at[worker.slot] = time.monotonic() + delay
+            if delay:
+                logger.warning(f"Supervisor: Restarting worker {worker.slot} in {delay:.0f}s")
+
+    def _restart_due(self):
+        now = time.monotonic()
+        for slot, when in list(self._restart_at.items()):
+            if when <= now:
+                del self._restart_at[slot]
+                self._spawn(slot)
+
+    def _kill_after_timeout(self):
+        if time.monotonic() >= self._stop_deadline:
+            logger.warning(f"Supervisor: Workers still running after {self.shutdown_timeout}s, killing them")
+            self._broadcast(signal.SIGKILL, ready_only=False)
+            self._stop_deadline = float('inf')
+
+    def _read_catalog_signature(self):
+        return tuple(file_signature(path) for path in self.watch_paths)
+
+    def _broadcast_catalog_change(self):
+        if not self.watch_paths:
+            return
+        signature = self._read_catalog_signature()
+        if signature != self._catalog_signature:
+            self._catalog_signature = signature
+            logger.info("Supervisor: Catalog changed on disk, reloading it in all workers")
+            self._broadcast(CATALOG_RELOAD_SIGNAL)
+
+    @staticmethod
+    def _close_ready_fd(worker: WorkerProcess):
+        if worker.ready_fd is not None:
+            os.close(worker.ready_fd)
+            worker.ready_fd = None
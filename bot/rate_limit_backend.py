@@ -0,0 +1,200 @@
+"""
+Rate Limit Backends
+Where rate limiter state and security events live beyond a single process.
+
+Limiters always decide locally in O(1); a backend only reconciles their state in
+the background, so the request path never waits for storage:
+
+* MemoryRateLimitBackend - process-local state (the default).
+* SQLiteRateLimitBackend - a WAL-mode SQLite file shared by every worker on the
+  host. Admitted requests are batched and flushed every `sync_interval` seconds
+  as per-key cost deltas; the merged TATs are read back into the limiters.
+  Limits are therefore enforced across processes with at most one sync interval
+  of lag, and survive restarts.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import aiosqlite
+
+from bot.rate_limiter import GCRARateLimiter
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of host parameters per statement
+_SELECT_CHUNK = 500
+
+
+class MemoryRateLimitBackend:
+    """Keeps limiter state in the limiters themselves; nothing is shared."""
+
+    def __init__(self):
+        self.limiters: Dict[str, GCRARateLimiter] = {}
+
+    def attach(self, limiter: GCRARateLimiter):
+        self.limiters[limiter.name] = limiter
+
+    def record_event(self, event: Dict[str, Any]):
+        """Security events are already kept in memory by SecurityManager."""
+
+    async def start(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SQLiteRateLimitBackend(MemoryRateLimitBackend):
+    """Shares limiter state and security events through a WAL-mode SQLite file."""
+
+    def __init__(self, db_path: str, sync_interval: float = 1.0, max_events: int = 10000,
+                 max_pending_events: int = 1000):
+        super().__init__()
+        self.db_path = db_path
+        self.sync_interval = sync_interval
+        self.max_events = max_events
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_pending_events)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    def attach(self, limiter: GCRARateLimiter):
+        super().attach(limiter)
+        limiter.track_pending = True
+
+    def record_event(self, event: Dict[str, Any]):
+        # Oldest events are dropped if the database cannot keep up
+        self._events.append(event)
+
+    async def start(self):
+        """Open the database and start the background sync loop (idempotent)."""
+        if self._db is not None:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = await aiosqlite.connect(self.db_path, timeout=5)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "limiter TEXT NOT NULL, key TEXT NOT NULL, tat REAL NOT NULL, "
+            "PRIMARY KEY (limiter, key)) WITHOUT ROWID"
+        )
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS security_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+            "event_type TEXT NOT NULL, details TEXT NOT NULL, pid INTEGER NOT NULL)"
+        )
+        await self._db.commit()
+        self._task = asyncio.create_task(self._sync_loop())
+        logger.info(f"Rate limit: SQLite backend started - {self.db_path}")
+
+    async def close(self):
+        """Stop the sync loop, flush what is buffered and close the database."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.flush()
+            await self._db.close()
+            self._db = None
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Rate limit: SQLite sync failed: {e}")
+
+    async def flush(self):
+        """Push buffered deltas and events, then pull merged state back."""
+        if self._db is None:
+            return
+        async with self._flush_lock:
+            now = time.time()
+            deltas = {name: limiter.drain_pending() for name, limiter in self.limiters.items()}
+            events = list(self._events)
+            self._events.clear()
+
+            for name, pending in deltas.items():
+                if not pending:
+                    continue
+                interval = self.limiters[name].interval
+                await self._db.executemany(
+                    "INSERT INTO rate_limits (limiter, key, tat) VALUES (?, ?, ? + ?) "
+                    "ON CONFLICT (limiter, key) DO UPDATE SET tat = MAX(tat, excluded.tat - ?) + ?",
+                    [
+                        (name, str(key), now, cost * interval, cost * interval, cost * interval)
+                        for key, cost in pending.items()
+                    ]
+                )
+            if events:
+                await self._db.executemany(
+                    "INSERT INTO security_events (timestamp, event_type, details, pid) VALUES (?, ?, ?, ?)",
+                    [
+                        (event["timestamp"], event["event_type"],
+                         json.dumps(event.get("details", {}), ensure_ascii=False, default=str), os.getpid())
+                        for event in events
+                    ]
+                )
+            if now - self._last_purge >= 60:
+                self._last_purge = now
+                await self._db.execute("DELETE FROM rate_limits WHERE tat < ?", (now,))
+                await self._db.execute(
+                    "DELETE FROM security_events WHERE id <= (SELECT MAX(id) FROM security_events) - ?",
+                    (self.max_events,)
+                )
+            await self._db.commit()
+
+            for name, pending in deltas.items():
+                if pending:
+                    await self._pull(self.limiters[name], list(pending))
+
+    async def _pull(self, limiter: GCRARateLimiter, keys: List[Any]):
+        for start in range(0, len(keys), _SELECT_CHUNK):
+            chunk = keys[start:start + _SELECT_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            async with self._db.execute(
+                f"SELECT key, tat FROM rate_limits WHERE limiter = ? AND key IN ({placeholders})",  # nosec B608
+                [limiter.name, *map(str, chunk)]
+            ) as cursor:
+                async for key, tat in cursor:
+                    limiter.merge(key, tat)
+
+    async def recent_events(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Latest security events from all processes (newest first)."""
+        if self._db is None:
+            return []
+        await self.flush()
+        async with self._db.execute(
+            "SELECT timestamp, event_type, details, pid FROM security_events ORDER BY id DESC LIMIT ?", (limit,)
+        ) as cursor:
+            return [
+                {"timestamp": timestamp, "event_type": event_type, "details": json.loads(details), "pid": pid}
+                async for timestamp, event_type, details, pid in cursor
+            ]
+
+
+def create_rate_limit_backend(backend: str, db_path: str, sync_interval: float):
+    """Build the backend selected by RATE_LIMIT_BACKEND ('memory' or 'sqlite')."""
+    if backend == 'sqlite':
+        return SQLiteRateLimitBackend(db_path, sync_interval)
+    if backend != 'memory':
+        logger.warning(f"Rate limit: Unknown backend '{backend}', using memory")
+    return MemoryRateLimitBackend()
@@ -0,0 +1,118 @@
+"""
+Rate Limiter
+Constant time and memory per key rate limiting (GCRA, the generic cell rate
+algorithm) with LRU eviction of keys, shared by the HTTP API and the bot middleware.
+"""
+
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class RateLimiter(ABC):
+    """Interface of a rate limiting engine."""
+
+    @abstractmethod
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """Register a request for key; False if it exceeds the limit."""
+
+    @abstractmethod
+    def used(self, key: Hashable, now: Optional[float] = None) -> int:
+        """Approximate number of requests currently counted against key."""
+
+    @abstractmethod
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Drop state of keys that are back to a full allowance; returns how many."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of keys with tracked state."""
+
+
+class GCRARateLimiter(RateLimiter):
+    """Allows `limit` requests per `period` seconds per key.
+
+    Each key stores a single float, its theoretical arrival time (TAT). A request
+    is admitted if, after adding one emission interval (period / limit), the TAT
+    is no more than `period` ahead of now. The allowance refills continuously,
+    so a client gets `limit` requests in a burst and then one per interval.
+
+    Keys are kept in LRU order and at most `max_keys` of them are tracked; the
+    least recently seen key is forgotten first (it then starts with a full
+    allowance again).
+
+    Times are wall-clock seconds so that state can be shared between processes
+    through a backend (see bot.rate_limit_backend). When `track_pending` is set,
+    admitted requests are also counted per key until a backend drains them.
+    """
+
+    def __init__(self, limit: int, period: float, max_keys: int = 50000, name: str = 'default'):
+        if limit <= 0 or period <= 0:
+            raise ValueError("limit and period must be positive")
+        self.name = name
+        self.limit = limit
+        self.period = float(period)
+        self.interval = self.period / limit
+        self.max_keys = max_keys
+        self.track_pending = False
+        self._tat: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self._pending: Dict[Hashable, int] = {}
+
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + self.interval
+        if new_tat - now > self.period:
+            self._tat.move_to_end(key)
+            return False
+
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+        if self.track_pending:
+            self._pending[key] = self._pending.get(key, 0) + 1
+        return True
+
+    def drain_pending(self) -> Dict[Hashable, int]:
+        """Return and reset the admitted request counts since the last drain."""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def merge(self, key: Hashable, shared_tat: float):
+        """Adopt a TAT computed from all processes if it is ahead of ours."""
+        tat = self._tat.get(key)
+        if tat is None:
+            if len(self._tat) >= self.max_keys:
+                return
+            self._tat[key] = shared_tat
+        elif shared_tat > tat:
+            self._tat[key] = shared_tat
+
+    def used(self, key: Hashable, now: Optional[float] = None) -> int:
+        if now is None:
+            now = time.time()
+        tat = self._tat.get(key)
+        if tat is None or tat <= now:
+            return 0
+        return min(self.limit, math.ceil((tat - now) / self.interval - 1e-9))
+
+    def total_used(self, now: Optional[float] = None) -> int:
+        """Sum of used() over all tracked keys (for reports, O(keys))."""
+        if now is None:
+            now = time.time()
+        return sum(self.used(key, now) for key in self._tat)
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        if now is None:
+            now = time.time()
+        expired = [key for key, tat in self._tat.items() if tat <= now]
+        for key in expired:
+            del self._tat[key]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._tat)
@@ -213,8 +213,8 @@ async def security_check(bot_token: str) -> Dict:
                                     security_manager.hmac_secret != 'default-secret-key-change-in-production')
         },
         "rate_limiting": {
-            "active_limits": len(security_manager.rate_limit_store),
-            "total_requests": sum(len(requests) for requests in security_manager.rate_limit_store.values())
+            "active_limits": len(security_manager.rate_limiter),
+            "total_requests": security_manager.rate_limiter.total_used()
         }
     }
     
@@ -5,6 +5,7 @@ Adds comprehensive security headers to all HTTP responses.
 
 import hashlib
 import logging
+from types import MappingProxyType
 from typing import Callable, Awaitable
 from aiohttp import web
 from aiohttp.web_request import Request
@@ -12,77 +13,125 @@ from aiohttp.web_response import Response
 
 logger = logging.getLogger(__name__)
 
+# Content Security Policy - allows Telegram WebApp functionality, Google Fonts, and Swiper CDN
+CSP_POLICY = (
+    "default-src 'self' https://telegram.org; "
+    "frame-ancestors 'self' https://web.telegram.org https://*.telegram.org; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://telegram.org https://cdn.jsdelivr.net; "
+    "style-src 'self' 'unsafe-inline' https://telegram.org https://fonts.googleapis.com https://cdn.jsdelivr.net; "
+    "font-src 'self' data: https://telegram.org https://fonts.gstatic.com https://cdn.jsdelivr.net; "
+    "img-src 'self' data: https: http:; "
+    "connect-src 'self' https://telegram.org https://cdn.jsdelivr.net; "
+    "frame-src 'self' https://*.telegram.org https://web.telegram.org https://t.me; "
+    "object-src 'none'; "
+    "base-uri 'self'; "
+    "form-action 'self'; "
+    "upgrade-insecure-requests"
+)
+
+# Permissions Policy - restrict sensitive APIs (removed unrecognized features)
+PERMISSIONS_POLICY = (
+    "geolocation=(), "
+    "microphone=(), "
+    "camera=(), "
+    "payment=(), "
+    "usb=(), "
+    "magnetometer=(), "
+    "gyroscope=(), "
+    "accelerometer=(), "
+    "autoplay=(), "
+    "encrypted-media=(), "
+    "picture-in-picture=()"
+)
+
+SECURITY_HEADERS = {
+    # Prevent clickjacking
+    #'X-Frame-Options': 'DENY',
+
+    # Prevent MIME type sniffing
+    'X-Content-Type-Options': 'nosniff',
+
+    # Referrer policy
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+
+    # Content Security Policy
+    'Content-Security-Policy': CSP_POLICY,
+
+    # Permissions Policy
+    'Permissions-Policy': PERMISSIONS_POLICY,
+
+    # XSS Protection (legacy but still useful)
+    'X-XSS-Protection': '1; mode=block',
+}
+
+HSTS_HEADERS = {'Strict-Transport-Security': 'max-age=31536000; includeSubDomains; preload'}
+
+# Route classes and their default caching semantics
+ROUTE_API = 'api'        # API and everything outside the Web App: never stored
+ROUTE_STATIC = 'static'  # versioned assets (?v=...): the URL changes with the file
+ROUTE_SHELL = 'shell'    # HTML shell and unversioned assets: revalidated on every use
+
+ROUTE_CACHE_HEADERS = {
+    ROUTE_API: {
+        'Cache-Control': 'no-store, no-cache, must-revalidate, proxy-revalidate',
+        'Pragma': 'no-cache',
+        'Expires': '0'
+    },
+    ROUTE_STATIC: {'Cache-Control': 'public, max-age=31536000, immutable'},
+    ROUTE_SHELL: {'Cache-Control': 'no-cache'},
+}
+
+STATIC_ASSET_SUFFIXES = ('.css', '.js', '.png', '.jpg', '.jpeg', '.svg', '.ico')
+
+
+def _build_header_policies():
+    """Every header set the middleware can apply, keyed by
+    (route class, https, handler set its own Cache-Control)."""
+    policies = {}
+    for route_class, cache_headers in ROUTE_CACHE_HEADERS.items():
+        for https in (False, True):
+            for handler_cached in (False, True):
+                headers = dict(SECURITY_HEADERS)
+                if not handler_cached:
+                    headers.update(cache_headers)
+                if https:
+                    headers.update(HSTS_HEADERS)
+                policies[(route_class, https, handler_cached)] = MappingProxyType(headers)
+    return MappingProxyType(policies)
+
+
+HEADER_POLICIES = _build_header_policies()
+
+
+def classify_route(request: Request) -> str:
+    """Route class of a request, from its path and query string."""
+    path = request.path
+    if not isinstance(path, str) or not path.startswith('/bot-app') or path.startswith('/bot-app/api/'):
+        return ROUTE_API
+    if path.endswith(STATIC_ASSET_SUFFIXES) and 'v' in request.query:
+        return ROUTE_STATIC
+    return ROUTE_SHELL
+
+
 @web.middleware
 async def security_headers_middleware(request: Request, handler: Callable[[Request], Awaitable[Response]]) -> Response:
-    """Add security headers to all responses."""
-    
-    # Content Security Policy - allows Telegram WebApp functionality, Google Fonts, and Swiper CDN
-    csp_policy = (
-        "default-src 'self' https://telegram.org; "
-        "frame-ancestors 'self' https://web.telegram.org https://*.telegram.org; "
-        "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://telegram.org https://cdn.jsdelivr.net; "
-        "style-src 'self' 'unsafe-inline' https://telegram.org https://fonts.googleapis.com https://cdn.jsdelivr.net; "
-        "font-src 'self' data: https://telegram.org https://fonts.gstatic.com https://cdn.jsdelivr.net; "
-        "img-src 'self' data: https: http:; "
-        "connect-src 'self' https://telegram.org https://cdn.jsdelivr.net; "
-        "frame-src 'self' https://*.telegram.org https://web.telegram.org https://t.me; "
-        "object-src 'none'; "
-        "base-uri 'self'; "
-        "form-action 'self'; "
-        "upgrade-insecure-requests"
-    )
-    
-    # Permissions Policy - restrict sensitive APIs (removed unrecognized features)
-    permissions_policy = (
-        "geolocation=(), "
-        "microphone=(), "
-        "camera=(), "
-        "payment=(), "
-        "usb=(), "
-        "magnetometer=(), "
-        "gyroscope=(), "
-        "accelerometer=(), "
-        "autoplay=(), "
-        "encrypted-media=(), "
-        "picture-in-picture=()"
-    )
-    
+    """Add security headers to all responses.
+
+    A handler that sets its own Cache-Control (e.g. ETag-revalidated catalog
+    responses) keeps it; otherwise the route class decides the caching policy.
+    Error responses are never cached.
+    """
     try:
         response = await handler(request)
     except Exception as e:
         # If handler fails, create a basic error response with security headers
         response = web.Response(status=500, text="Internal Server Error")
-    
-    # Security headers
-    response.headers.update({
-        # Prevent clickjacking
-        #'X-Frame-Options': 'DENY',
-        
-        # Prevent MIME type sniffing
-        'X-Content-Type-Options': 'nosniff',
-        
-        # Referrer policy
-        'Referrer-Policy': 'strict-origin-when-cross-origin',
-        
-        # Content Security Policy
-        'Content-Security-Policy': csp_policy,
-        
-        # Permissions Policy
-        'Permissions-Policy': permissions_policy,
-        
-        # XSS Protection (legacy but still useful)
-        'X-XSS-Protection': '1; mode=block',
-        
-        # Prevent caching of sensitive data
-        'Cache-Control': 'no-store, no-cache, must-revalidate, proxy-revalidate',
-        'Pragma': 'no-cache',
-        'Expires': '0'
-    })
-    
-    # Add HSTS header only for HTTPS requests
-    if request.scheme == 'https':
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains; preload'
-    
+
+    response.headers.update(HEADER_POLICIES[(
+        classify_route(request) if response.status < 400 else ROUTE_API,
+        request.scheme == 'https',
+        'Cache-Control' in response.headers
+    )])
     return response
 
 def create_content_hash(content: bytes) -> str:
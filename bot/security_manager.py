@@ -6,12 +6,13 @@ import logging
 import time
 import base64
 import os
-from collections import defaultdict
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import aiohttp
 
 from bot.config import config
+from bot.rate_limiter import GCRARateLimiter
+from bot.rate_limit_backend import create_rate_limit_backend
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,14 @@ class SecurityManager:
     """Comprehensive security manager for the bot."""
     
     def __init__(self):
-        self.rate_limit_store = defaultdict(list)
+        self.rate_limiter = GCRARateLimiter(
+            config.RATE_LIMIT_MAX_REQUESTS, config.RATE_LIMIT_WINDOW, config.RATE_LIMIT_MAX_KEYS, name='actions'
+        )
+        # Shares limiter state and security events between workers (see RATE_LIMIT_BACKEND)
+        self.rate_limit_backend = create_rate_limit_backend(
+            config.RATE_LIMIT_BACKEND, config.RATE_LIMIT_DB_PATH, config.RATE_LIMIT_SYNC_INTERVAL
+        )
+        self.rate_limit_backend.attach(self.rate_limiter)
         self.suspicious_activities = []
         self.security_events = []
         self.last_cleanup = time.time()
@@ -77,27 +85,17 @@ class SecurityManager:
         if not config.ENABLE_RATE_LIMITING:
             return True
         
-        current_time = time.time()
         key = f"{user_id}:{action}"
         
-        # Clean old entries
-        self.rate_limit_store[key] = [
-            timestamp for timestamp in self.rate_limit_store[key]
-            if current_time - timestamp < config.RATE_LIMIT_WINDOW
-        ]
-        
-        # Check if limit exceeded
-        if len(self.rate_limit_store[key]) >= config.RATE_LIMIT_MAX_REQUESTS:
+        if not self.rate_limiter.allow(key):
             logger.warning(f"🚫 Rate limit exceeded for user {user_id}, action: {action}")
             self._log_security_event("rate_limit_exceeded", {
                 "user_id": user_id,
                 "action": action,
-                "current_count": len(self.rate_limit_store[key])
+                "current_count": self.rate_limiter.used(key)
             })
             return False
         
-        # Add current request
-        self.rate_limit_store[key].append(current_time)
         return True
     
     def validate_input_data(self, data: dict, expected_structure: dict) -> Tuple[bool, List[str]]:
@@ -255,6 +253,7 @@ class SecurityManager:
         }
         
         self.security_events.append(event)
+        self.rate_limit_backend.record_event(event)
         logger.warning(f"🚨 SECURITY EVENT: {event_type} - {details}")
         
         # Keep only last 1000 events
@@ -265,16 +264,8 @@ class SecurityManager:
         """Clean up old rate limit and security data."""
         current_time = time.time()
         
-        # Clean rate limit store
-        for key in list(self.rate_limit_store.keys()):
-            self.rate_limit_store[key] = [
-                timestamp for timestamp in self.rate_limit_store[key]
-                if current_time - timestamp < config.RATE_LIMIT_WINDOW
-            ]
-            
-            # Remove empty entries
-            if not self.rate_limit_store[key]:
-                del self.rate_limit_store[key]
+        # Forget keys that are back to a full allowance
+        self.rate_limiter.cleanup()
         
         # Clean old security events (keep last 24 hours)
         cutoff_time = current_time - 86400
@@ -291,8 +282,8 @@ class SecurityManager:
         return {
             "rate_limiting": {
                 "enabled": config.ENABLE_RATE_LIMITING,
-                "active_limits": len(self.rate_limit_store),
-                "total_requests": sum(len(requests) for requests in self.rate_limit_store.values())
+                "active_limits": len(self.rate_limiter),
+                "total_requests": self.rate_limiter.total_used()
             },
             "webhook_security": {
                 "allowed": config.ALLOW_WEBHOOKS,
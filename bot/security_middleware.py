@@ -9,6 +9,17 @@ from bot.config import config
 
 logger = logging.getLogger(__name__)
 
+# Rate limit buckets. Action names never embed user-controlled text, so every
+# user has at most len(RATE_LIMIT_ACTIONS) limiter keys; the total number of
+# keys is capped by the limiter itself (RATE_LIMIT_MAX_KEYS).
+KNOWN_COMMANDS = frozenset({"start", "menu"})
+KNOWN_CALLBACK_NAMESPACES = frozenset({"info"})
+RATE_LIMIT_ACTIONS = frozenset(
+    {"web_app_data", "command", "text", "photo", "document", "message", "callback", "unknown"}
+    | {f"command:{command}" for command in KNOWN_COMMANDS}
+    | {f"callback:{namespace}" for namespace in KNOWN_CALLBACK_NAMESPACES}
+)
+
 class SecurityMiddleware(BaseMiddleware):
     """Security middleware for aiogram bot."""
     
@@ -69,12 +80,17 @@ class SecurityMiddleware(BaseMiddleware):
         return None
     
     def _get_action_name(self, event: TelegramObject) -> str:
-        """Get action name for rate limiting."""
+        """Get action name for rate limiting (always one of RATE_LIMIT_ACTIONS)."""
         if isinstance(event, Message):
             if event.web_app_data:
                 return "web_app_data"
             elif event.text:
-                return f"text_{event.text}"
+                if event.text.startswith('/'):
+                    # "/start@BotName payload" -> "start"
+                    parts = event.text[1:].split(maxsplit=1)
+                    command = parts[0].split('@', 1)[0].lower() if parts else ""
+                    return f"command:{command}" if command in KNOWN_COMMANDS else "command"
+                return "text"
             elif event.photo:
                 return "photo"
             elif event.document:
@@ -82,7 +98,8 @@ class SecurityMiddleware(BaseMiddleware):
             else:
                 return "message"
         elif isinstance(event, CallbackQuery):
-            return f"callback_{event.data}"
+            namespace = (event.data or "").split(':', 1)[0]
+            return f"callback:{namespace}" if namespace in KNOWN_CALLBACK_NAMESPACES else "callback"
         return "unknown"
     
     async def _validate_web_app_data(self, data_str: str) -> tuple[bool, list[str]]:
@@ -0,0 +1,67 @@
+"""
+Single-Flight Request Coalescing
+Concurrent calls for the same key share one in-flight fetch, and the outcome is
+kept for a short time (positive and negative TTLs) so a burst of requests turns
+into a single upstream call.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+def _is_empty(value: Any) -> bool:
+    return not value
+
+
+class SingleFlight:
+    """Coalesces identical async fetches and caches their results briefly.
+
+    The fetch runs as its own task, so a caller that is cancelled (e.g. the
+    client disconnected) does not cancel the fetch for the other waiters.
+    Exceptions are propagated to every waiter and are not cached.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int = 256,
+                 is_negative: Callable[[Any], bool] = _is_empty):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.is_negative = is_negative
+        self._results: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result for key, join its in-flight fetch, or start one."""
+        entry = self._results.get(key)
+        if entry is not None:
+            expires, value = entry
+            if time.monotonic() < expires:
+                return value
+            del self._results[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        ttl = self.negative_ttl if self.is_negative(value) else self.ttl
+        if ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + ttl, value)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        """Drop cached results (in-flight fetches are left running)."""
+        self._results.clear()
@@ -0,0 +1,143 @@
+"""
+Static Asset Cache
+Keeps the Web App assets (CSS, JS, SVG, icons) in memory with their ETags and
+gzip/brotli bodies computed once per file version, instead of reading and hashing
+the file on every request. Files are re-read only when their (inode, mtime, size)
+signature changes, checked at most once per check interval per file. Assets above
+the inline size limit (large photos) are streamed from disk with FileResponse.
+"""
+
+import logging
+import mimetypes
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from bot.http_cache import PreparedBody
+from bot.security_headers import STATIC_ASSET_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+STATIC_RELOAD_CHECK_INTERVAL = float(os.environ.get('STATIC_RELOAD_CHECK_INTERVAL', '1.0'))
+# Larger files are not kept in memory but streamed from disk
+STATIC_INLINE_MAX_SIZE = int(os.environ.get('STATIC_INLINE_MAX_SIZE', str(256 * 1024)))
+
+# Extensions served by the /bot-app/{filename} static route
+STATIC_EXTENSIONS = STATIC_ASSET_SUFFIXES
+
+# Content types that are worth compressing (images are already compressed)
+COMPRESSIBLE_TYPES = frozenset({
+    'text/css', 'text/html', 'text/plain', 'application/javascript',
+    'application/json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon',
+})
+
+_CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+}
+
+FileSignature = Tuple[int, int, int]
+
+
+def guess_content_type(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in _CONTENT_TYPES:
+        return _CONTENT_TYPES[extension]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class StaticAsset:
+    """One file version: its prepared body, or None if it is streamed from disk."""
+
+    __slots__ = ('path', 'signature', 'body', 'next_check')
+
+    def __init__(self, path: str, signature: FileSignature, body: Optional[PreparedBody]):
+        self.path = path
+        self.signature = signature
+        self.body = body
+        self.next_check = 0.0
+
+
+class StaticAssetCache:
+    """In-memory cache of the files under root, keyed by relative path."""
+
+    def __init__(self, root: str, check_interval: float = STATIC_RELOAD_CHECK_INTERVAL,
+                 max_inline_size: int = STATIC_INLINE_MAX_SIZE):
+        self.root = os.path.realpath(root)
+        self.check_interval = check_interval
+        self.max_inline_size = max_inline_size
+        self._assets: Dict[str, StaticAsset] = {}
+
+    def resolve(self, relative_path: str) -> Optional[str]:
+        """Absolute path of relative_path if it stays inside root."""
+        full_path = os.path.realpath(os.path.join(self.root, relative_path))
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            return None
+        return full_path
+
+    def get(self, relative_path: str) -> Optional[StaticAsset]:
+        """Current version of the asset, or None if it does not exist."""
+        asset = self._assets.get(relative_path)
+        now = time.monotonic()
+        if asset is not None and now < asset.next_check:
+            return asset
+
+        full_path = self.resolve(relative_path)
+        if full_path is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            self._assets.pop(relative_path, None)
+            return None
+        if not os.path.isfile(full_path):
+            return None
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if asset is None or asset.signature != signature:
+            asset = self._load(full_path, signature)
+            if asset is None:
+                self._assets.pop(relative_path, None)
+                return None
+            self._assets[relative_path] = asset
+        asset.next_check = now + self.check_interval
+        return asset
+
+    def _load(self, full_path: str, signature: FileSignature) -> Optional[StaticAsset]:
+        if signature[2] > self.max_inline_size:
+            return StaticAsset(full_path, signature, None)
+        try:
+            with open(full_path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            logger.error(f"Static: Error reading file {full_path}: {e}")
+            return None
+
+        content_type = guess_content_type(full_path)
+        is_text = content_type.startswith('text/') or content_type in ('application/javascript', 'image/svg+xml')
+        body = PreparedBody(
+            content,
+            content_type=content_type,
+            charset='utf-8' if is_text else None,
+            compress=content_type in COMPRESSIBLE_TYPES
+        )
+        return StaticAsset(full_path, signature, body)
+
+    def preload(self, extensions: Iterable[str] = STATIC_EXTENSIONS) -> int:
+        """Load every matching file under root; returns how many were loaded."""
+        extensions = tuple(extensions)
+        loaded = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.lower().endswith(extensions):
+                    continue
+                relative_path = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if self.get(relative_path) is not None:
+                    loaded += 1
+        logger.info(f"Static: Preloaded {loaded} assets from {self.root}")
+        return loaded
+
+    def clear(self):
+        self._assets.clear()
@@ -1523,8 +1523,29 @@ document.addEventListener('DOMContentLoaded', async () => {
     
     // 🔄 SETUP AUTOMATIC CART REFRESH EVERY MINUTE
     let autoRefreshInterval;
+    let refreshCatalogData = null;
     let isUpdatingUI = false; // Flag to prevent multiple simultaneous updates
     
+    // Server-sent catalog version changes: refresh right away instead of on the next tick
+    let catalogEvents = null;
+    function subscribeToCatalogEvents() {
+        if (catalogEvents || typeof EventSource === 'undefined') {
+            return;
+        }
+        catalogEvents = new EventSource('/bot-app/api/events');
+        catalogEvents.addEventListener('version', (event) => {
+            try {
+                const { version } = JSON.parse(event.data);
+                const cached = JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY) || 'null');
+                if (version && cached && cached.version !== version && refreshCatalogData) {
+                    refreshCatalogData();
+                }
+            } catch (error) {
+                // Ignore malformed events
+            }
+        });
+    }
+
     // Function to check if app is active and refresh cart if needed
     function setupAutoRefresh() {
         // Clear existing interval if any
@@ -1534,8 +1555,7 @@ document.addEventListener('DOMContentLoaded', async () => {
         
         // Use global variables for comparison (declared at module level)
         
-        // Set up periodic refresh every minute (60000ms)
-        autoRefreshInterval = setInterval(async () => {
+        refreshCatalogData = async () => {
             // Only refresh if app is active and not currently updating
             if (!document.hidden && !isUpdatingUI) {
                 try {
@@ -1601,7 +1621,11 @@ document.addEventListener('DOMContentLoaded', async () => {
                     isUpdatingUI = false;
                 }
             }
-        }, 60000); // 1 minute
+        };
+
+        // Set up periodic refresh every minute (60000ms)
+        autoRefreshInterval = setInterval(refreshCatalogData, 60000); // 1 minute
+        subscribeToCatalogEvents();
         
         // Auto-refresh setup: Cart will refresh every minute when active, grid only when changes detected
     }
@@ -2227,36 +2251,77 @@ document.addEventListener('DOMContentLoaded', async () => {
         return results === null ? '' : decodeURIComponent(results[1].replace(/\+/g, ' '));
     }
 
-    // Новая функция для загрузки ВСЕХ данных сразу
-    async function fetchAllData() {
+    // Catalog kept between sessions, reused while the server version is unchanged
+    const CATALOG_CACHE_KEY = 'catalog_cache';
+
+    // Returns the stored catalog if /api/version still reports its version
+    async function getCachedCatalogIfCurrent() {
         try {
-            // Get authentication token
-            const token = await getAuthToken();
-            if (!token) {
-                throw new Error('Failed to get authentication token');
+            const cached = JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY) || 'null');
+            if (!cached || !cached.version || !cached.data) {
+                return null;
             }
             
-            // Generate timestamp and signature
-            const timestamp = Math.floor(Date.now() / 1000);
-            const path = '/bot-app/api/all';
-            const signature = await signRequest('GET', path, timestamp);
-            
-            // Make signed request
-            const response = await fetch(path, {
-                method: 'GET',
-                headers: {
-                    'X-Signature': signature,
-                    'X-Timestamp': timestamp.toString(),
-                    'X-Telegram-Init-Data': Telegram.WebApp.initData || '',
-                    'Authorization': `Bearer ${token}`
-                }
-            });
-            
+            const response = await fetch('/bot-app/api/version', { method: 'GET' });
             if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+                return null;
             }
             
-            const data = await response.json();
+            const { version } = await response.json();
+            return version === cached.version ? cached.data : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    function saveCatalogCache(data) {
+        const version = data && data.metadata && data.metadata.version;
+        if (!version) {
+            return;
+        }
+        try {
+            localStorage.setItem(CATALOG_CACHE_KEY, JSON.stringify({ version, data }));
+        } catch (error) {
+            // Quota exceeded - the catalog is simply fetched again next time
+            localStorage.removeItem(CATALOG_CACHE_KEY);
+        }
+    }
+
+    // Новая функция для загрузки ВСЕХ данных сразу
+    async function fetchAllData() {
+        try {
+            let data = await getCachedCatalogIfCurrent();
+
+            if (!data) {
+                // Get authentication token
+                const token = await getAuthToken();
+                if (!token) {
+                    throw new Error('Failed to get authentication token');
+                }
+
+                // Generate timestamp and signature
+                const timestamp = Math.floor(Date.now() / 1000);
+                const path = '/bot-app/api/all';
+                const signature = await signRequest('GET', path, timestamp);
+
+                // Make signed request
+                const response = await fetch(path, {
+                    method: 'GET',
+                    headers: {
+                        'X-Signature': signature,
+                        'X-Timestamp': timestamp.toString(),
+                        'X-Telegram-Init-Data': Telegram.WebApp.initData || '',
+                        'Authorization': `Bearer ${token}`
+                    }
+                });
+
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+
+                data = await response.json();
+                saveCatalogCache(data);
+            }
             
             // Сохраняем все данные в глобальные переменные
             productsData = data.products || {};
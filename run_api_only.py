@@ -4,11 +4,13 @@
 Использует MODX API для получения данных о продуктах и категориях
 """
 
+import argparse
 import asyncio
 import logging
 import os
 import sys
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
@@ -19,7 +21,8 @@ load_dotenv(env_path)
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from bot.api_server import setup_api_server
+from bot.api_server import setup_api_server, MODX_BINARY_FILE, MODX_CACHE_FILE
+from bot.prefork import STOP_SIGNALS, Supervisor, notify_ready, watch_parent
 from bot.config import config
 from aiohttp import web
 
@@ -31,8 +34,68 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-async def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Запуск только API сервера")
+    parser.add_argument(
+        '--workers', type=int, default=int(os.environ.get('API_WORKERS', '1')),
+        help="Number of API worker processes sharing the port via SO_REUSEPORT (default: API_WORKERS or 1)"
+    )
+    return parser.parse_args(argv)
+
+async def serve(host: str, port: int, slot: Optional[int] = None, ready_fd: Optional[int] = None):
+    """Runs one API server process until SIGTERM/SIGINT.
+
+    slot/ready_fd are set in prefork workers: the port is then shared with the
+    other workers, only worker 0 runs the in-process catalog refresher, and
+    catalog reloads follow the supervisor.
+    """
+    prefork = ready_fd is not None
+    runner = await setup_api_server(
+        refresh_catalog=(config.MODX_INPROCESS_REFRESH and slot == 0) if prefork else None,
+        coordinated_reloads=prefork
+    )
+    try:
+        site = web.TCPSite(runner, host, port, reuse_port=True if prefork else None)
+        await site.start()
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in STOP_SIGNALS:
+            loop.add_signal_handler(sig, stop.set)
+
+        if prefork:
+            notify_ready(ready_fd)
+            parent_watch = asyncio.create_task(watch_parent(stop))
+            logger.info(f"✅ API воркер {slot} запущен на http://{host}:{port} (pid {os.getpid()})")
+        else:
+            logger.info(f"✅ API сервер успешно запущен на http://{host}:{port}")
+            logger.info("📋 Доступные эндпоинты:")
+            logger.info(f"   - http://{host}:{port}/bot-app/ - Web App")
+            logger.info(f"   - http://{host}:{port}/bot-app/api/products - Товары")
+            logger.info(f"   - http://{host}:{port}/bot-app/api/categories - Категории")
+            logger.info(f"   - http://{host}:{port}/bot-app/api/auth/token - Токен авторизации")
+
+        # Ждем завершения
+        await stop.wait()
+        logger.info("🛑 Получен сигнал остановки...")
+        if prefork:
+            parent_watch.cancel()
+    finally:
+        await runner.cleanup()
+        logger.info("✅ API сервер остановлен")
+
+def run_workers(workers: int, host: str, port: int) -> int:
+    """Prefork mode: supervises `workers` API processes (see bot.prefork)."""
+    def run_worker(slot: int, ready_fd: int) -> int:
+        asyncio.run(serve(host, port, slot, ready_fd))
+        return 0
+
+    supervisor = Supervisor(workers, run_worker, watch_paths=(MODX_BINARY_FILE, MODX_CACHE_FILE))
+    return supervisor.run()
+
+def main(argv=None):
     """Основная функция запуска API сервера"""
+    args = parse_args(argv)
     logger.info("🚀 Запуск API сервера с MODX интеграцией...")
     
     # Получаем конфигурацию из переменных окружения
@@ -42,42 +105,23 @@ async def main():
     logger.info(f"📡 API сервер будет запущен на {host}:{port}")
     logger.info(f"🔗 MODX API: {os.environ.get('MODX_API_BASE_URL', 'https://drazhin.by/api')}")
     
+    if args.workers > 1:
+        if not hasattr(os, 'fork'):
+            logger.error("❌ --workers требует POSIX (os.fork)")
+            sys.exit(2)
+        sys.exit(run_workers(args.workers, host, port))
+
     try:
-        # Настраиваем API сервер
-        app = await setup_api_server()
-        
-        # Запускаем сервер
-        runner = web.AppRunner(app)
-        await runner.setup()
-        
-        site = web.TCPSite(runner, host, port)
-        await site.start()
-        
-        logger.info(f"✅ API сервер успешно запущен на http://{host}:{port}")
-        logger.info("📋 Доступные эндпоинты:")
-        logger.info(f"   - http://{host}:{port}/bot-app/ - Web App")
-        logger.info(f"   - http://{host}:{port}/bot-app/api/products - Товары")
-        logger.info(f"   - http://{host}:{port}/bot-app/api/categories - Категории")
-        logger.info(f"   - http://{host}:{port}/bot-app/api/auth/token - Токен авторизации")
-        
-        # Ждем завершения
-        try:
-            await asyncio.Future()  # Запускаем бесконечный цикл
-        except KeyboardInterrupt:
-            logger.info("🛑 Получен сигнал остановки...")
-        finally:
-            await runner.cleanup()
-            logger.info("✅ API сервер остановлен")
-            
+        asyncio.run(serve(host, port))
     except Exception as e:
         logger.error(f"❌ Ошибка запуска API сервера: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except KeyboardInterrupt:
         logger.info("🛑 Принудительная остановка...")
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -5,13 +5,18 @@ MODX Cache Scheduler
 """
 
 import asyncio
+import hashlib
 import json
 import logging
 import os
-import ssl
-import aiohttp
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any, Optional
+
+from bot.modx_client import ModxClient, ModxApiError
+from bot.catalog_delta import diff_catalogs, record_catalog_change
+from bot.catalog_binary import binary_catalog_path, write_binary_catalog
+from bot.catalog_cache import build_catalog_responses
+from bot.catalog_index import CatalogIndex
 
 # Настройка логирования
 logging.basicConfig(
@@ -23,58 +28,49 @@ logger = logging.getLogger(__name__)
 # Конфигурация
 MODX_API_BASE_URL = os.environ.get('MODX_API_BASE_URL', 'https://drazhin.by')
 MODX_API_TIMEOUT = int(os.environ.get('MODX_API_TIMEOUT', '10'))
-CACHE_FILE_PATH = os.path.join('data', 'modx_cache.json')
+# Absolute paths, so the refresher works from any working directory (also in-process)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE_PATH = os.path.join(BASE_DIR, 'data', 'modx_cache.json')
+# Bounded per-version diffs served by /bot-app/api/changes
+HISTORY_FILE_PATH = os.path.join(BASE_DIR, 'data', 'modx_cache_history.json')
 CACHE_UPDATE_INTERVAL = 60  # секунд
 
+# Keep-alive connection pool reused by every update cycle
+modx_client = ModxClient(MODX_API_BASE_URL, MODX_API_TIMEOUT)
+
 # Создаем директорию data если не существует
-os.makedirs('data', exist_ok=True)
+os.makedirs(os.path.dirname(CACHE_FILE_PATH), exist_ok=True)
 
 
 async def load_products_from_modx_api() -> List[Dict[str, Any]]:
     """Загружает ВСЕ продукты из MODX API (без фильтрации по категории) с повторными попытками"""
-    url = f"{MODX_API_BASE_URL}/api-products.json"
-    
     for attempt in range(3):  # 3 попытки
         try:
-            # Настройка SSL для Heroku
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(
-                connector=connector,
-                timeout=aiohttp.ClientTimeout(total=MODX_API_TIMEOUT)
-            ) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # MODX API возвращает структуру {'status': 'success', 'count': 68, 'products': [...]}
-                        if isinstance(data, dict) and 'products' in data:
-                            products = data['products']
-                            if isinstance(products, list) and len(products) > 0:
-                                logger.info(f"MODX Cache: Products loaded successfully: {len(products)} products")
-                                return products
-                            else:
-                                logger.warning(f"MODX Cache: Products field is not a valid list: {type(products)} (attempt {attempt + 1})")
-                                if attempt < 2:  # Не последняя попытка
-                                    await asyncio.sleep(1)  # Ждем 1 секунду перед повтором
-                                    continue
-                                return []
-                        else:
-                            logger.warning(f"MODX Cache: Unexpected products data structure: {type(data)} (attempt {attempt + 1})")
-                            if attempt < 2:
-                                await asyncio.sleep(1)
-                                continue
-                            return []
-                    else:
-                        text = await response.text()
-                        logger.error(f"MODX Cache: API error: {response.status} - {text} (attempt {attempt + 1})")
-                        if attempt < 2:
-                            await asyncio.sleep(1)
-                            continue
-                        return {}
+            data = await modx_client.get_json('api-products.json')
+            # MODX API возвращает структуру {'status': 'success', 'count': 68, 'products': [...]}
+            if isinstance(data, dict) and 'products' in data:
+                products = data['products']
+                if isinstance(products, list) and len(products) > 0:
+                    logger.info(f"MODX Cache: Products loaded successfully: {len(products)} products")
+                    return products
+                else:
+                    logger.warning(f"MODX Cache: Products field is not a valid list: {type(products)} (attempt {attempt + 1})")
+                    if attempt < 2:  # Не последняя попытка
+                        await asyncio.sleep(1)  # Ждем 1 секунду перед повтором
+                        continue
+                    return []
+            else:
+                logger.warning(f"MODX Cache: Unexpected products data structure: {type(data)} (attempt {attempt + 1})")
+                if attempt < 2:
+                    await asyncio.sleep(1)
+                    continue
+                return []
+        except ModxApiError as e:
+            logger.error(f"MODX Cache: API error: {e} (attempt {attempt + 1})")
+            if attempt < 2:
+                await asyncio.sleep(1)
+                continue
+            return {}
         except Exception as e:
             logger.error(f"MODX Cache: Error loading products: {e} (attempt {attempt + 1})")
             if attempt < 2:
@@ -88,40 +84,119 @@ async def load_products_from_modx_api() -> List[Dict[str, Any]]:
 async def load_categories_from_modx_api() -> List[Dict[str, Any]]:
     """Загружает категории из MODX API"""
     try:
-        url = f"{MODX_API_BASE_URL}/api-categories.json"
-        
-        # Настройка SSL для Heroku
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        
-        async with aiohttp.ClientSession(
-            connector=connector,
-            timeout=aiohttp.ClientTimeout(total=MODX_API_TIMEOUT)
-        ) as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    categories = data.get('categories', [])
-                    logger.info(f"MODX Cache: Categories loaded successfully: {len(categories)} categories")
-                    return categories
-                else:
-                    text = await response.text()
-                    logger.error(f"MODX Cache: API error: {response.status} - {text}")
-                    return []
+        data = await modx_client.get_json('api-categories.json')
+        categories = data.get('categories', [])
+        logger.info(f"MODX Cache: Categories loaded successfully: {len(categories)} categories")
+        return categories
+    except ModxApiError as e:
+        logger.error(f"MODX Cache: API error: {e}")
+        return []
     except Exception as e:
         logger.error(f"MODX Cache: Error loading categories: {e}")
         return []
 
 
+def compute_cache_version(products_by_category: Dict[str, List[Dict[str, Any]]],
+                          categories: List[Dict[str, Any]]) -> str:
+    """Content-addressed cache version: hash of the canonical JSON of the catalog.
+
+    Identical catalog data always yields the same version, so downstream caches
+    (ETags, clients) only see a new version when the content really changes.
+    """
+    canonical = json.dumps(
+        {"products": products_by_category, "categories": categories},
+        ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str
+    )
+    return f"v{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]}"
+
+
+def read_published_cache(file_path: str) -> Optional[Dict[str, Any]]:
+    """Cache file currently on disk (None if missing or unreadable)."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def read_published_version(file_path: str) -> Optional[str]:
+    """Version of the cache file currently on disk (None if missing or unreadable)."""
+    published = read_published_cache(file_path)
+    if published is None or not isinstance(published.get('metadata'), dict):
+        return None
+    return published['metadata'].get('version')
+
+
+def write_binary_cache(path: str, cache_data: Dict[str, Any]):
+    """Prepare every API response of cache_data and write the binary catalog."""
+    products = cache_data.get('products') or {}
+    categories = cache_data.get('categories') or []
+    metadata = cache_data.get('metadata') or {}
+    index = CatalogIndex(products, categories)
+    responses = build_catalog_responses(index, categories, metadata) if (products or categories) else {}
+    write_binary_catalog(path, responses, metadata, len(index.products), len(categories))
+
+
+def write_cache_file(path: str, cache_data: Dict[str, Any]):
+    """Write the JSON cache atomically (temporary file + rename)."""
+    temp_file = f"{path}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        # Атомарное переименование
+        os.rename(temp_file, path)
+    except BaseException:
+        # Удаляем временный файл если он существует
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+def record_history(published: Dict[str, Any], published_version: str, version: str,
+                   products_by_category: Dict[str, List[Dict[str, Any]]], categories: List[Dict[str, Any]]):
+    """Diff the published catalog against the new one and append it to the history file."""
+    changes = diff_catalogs(
+        published.get('products') or {}, published.get('categories') or [],
+        products_by_category, categories
+    )
+    record_catalog_change(HISTORY_FILE_PATH, published_version, version, changes)
+
+
+async def save_binary_cache(cache_data: Dict[str, Any]):
+    """Write the binary catalog next to CACHE_FILE_PATH, off the event loop.
+
+    A binary catalog that cannot be updated is removed, so the API falls back
+    to the JSON file instead of serving a stale version.
+    """
+    binary_path = binary_catalog_path(CACHE_FILE_PATH)
+    try:
+        await asyncio.to_thread(write_binary_cache, binary_path, cache_data)
+    except Exception as e:
+        logger.error(f"MODX Cache: Error saving binary catalog: {e}")
+        try:
+            os.remove(binary_path)
+        except OSError:
+            pass
+
+
 async def save_cache_to_file(products_data: List[Dict[str, Any]], 
-                           categories_data: List[Dict[str, Any]]) -> bool:
-    """Сохраняет данные в JSON файл атомарно"""
+                           categories_data: List[Dict[str, Any]],
+                           published: Optional[Dict[str, Any]] = None,
+                           on_publish: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
+    """Сохраняет данные в JSON файл атомарно.
+
+    The file is left untouched (no write, no version bump) when the catalog
+    content is identical to the published one. `published` is the currently
+    published cache data (read from the file when not given). `on_publish`
+    receives every new version; in-process refreshers use it to swap the API
+    snapshot directly, with the file kept only for warm starts.
+    The binary catalog for the API workers is written along with the file.
+    Hashing, diffing and the file writes run in worker threads, so an
+    in-process refresher does not stall the API event loop.
+    """
     try:
         timestamp = datetime.now().isoformat()
-        version = f"v{int(datetime.now().timestamp())}"
         
         # Преобразуем массив продуктов в структуру по категориям
         products_by_category = {}
@@ -151,14 +226,25 @@ async def save_cache_to_file(products_data: List[Dict[str, Any]],
                 }
                 products_by_category[category_key].append(formatted_product)
         
-        # Сортируем продукты по menuindex
+        # Сортируем продукты по menuindex (ties by id, so the order is deterministic)
         for category_key in products_by_category:
-            products_by_category[category_key].sort(key=lambda x: int(x.get('menuindex', 0)))
+            products_by_category[category_key].sort(key=lambda x: (int(x.get('menuindex', 0)), str(x.get('id'))))
+
+        categories = categories_data if isinstance(categories_data, list) else []
+        version = await asyncio.to_thread(compute_cache_version, products_by_category, categories)
+        if published is None:
+            published = await asyncio.to_thread(read_published_cache, CACHE_FILE_PATH)
+        published_version = (published.get('metadata') or {}).get('version') if published else None
+        if version == published_version:
+            logger.info(f"MODX Cache: Data unchanged - keeping version {version}")
+            if not os.path.exists(binary_catalog_path(CACHE_FILE_PATH)):
+                await save_binary_cache(published)
+            return True
         
         # Подготавливаем данные для сохранения
         cache_data = {
             "products": products_by_category,
-            "categories": categories_data if isinstance(categories_data, list) else [],
+            "categories": categories,
             "metadata": {
                 "last_updated": timestamp,
                 "version": version,
@@ -170,31 +256,44 @@ async def save_cache_to_file(products_data: List[Dict[str, Any]],
         # Создаем директорию если она не существует
         os.makedirs(os.path.dirname(CACHE_FILE_PATH), exist_ok=True)
         
-        # Атомарная запись через временный файл
-        temp_file = f"{CACHE_FILE_PATH}.tmp"
-        
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        # The diff is recorded before the new version is published, so the
+        # delta feed never sees a version it cannot reach
+        if published_version:
+            try:
+                await asyncio.to_thread(
+                    record_history, published, published_version, version, products_by_category, categories
+                )
+            except Exception as e:
+                logger.error(f"MODX Cache: Error recording catalog history: {e}")
         
-        # Атомарное переименование
-        os.rename(temp_file, CACHE_FILE_PATH)
+    except Exception as e:
+        logger.error(f"MODX Cache: Error preparing cache: {e}")
+        return False
+
+    try:
+        # Атомарная запись через временный файл
+        await asyncio.to_thread(write_cache_file, CACHE_FILE_PATH, cache_data)
         
         logger.info(f"MODX Cache: Cache updated successfully - version {version}")
         logger.info(f"MODX Cache: Products: {cache_data['metadata']['products_count']}, Categories: {cache_data['metadata']['categories_count']}")
-        
-        return True
+        written = True
         
     except Exception as e:
         logger.error(f"MODX Cache: Error saving cache: {e}")
-        # Удаляем временный файл если он существует
-        temp_file = f"{CACHE_FILE_PATH}.tmp"
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-        return False
+        written = False
 
+    await save_binary_cache(cache_data)
 
-async def update_cache():
-    """Обновляет кэш данных из MODX API"""
+    # The in-memory snapshot is updated even if the warm-start file could not be written
+    if on_publish is not None:
+        on_publish(cache_data)
+        return True
+    return written
+
+
+async def update_cache(published: Optional[Dict[str, Any]] = None,
+                       on_publish: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """Обновляет кэш данных из MODX API (see save_cache_to_file for the arguments)"""
     logger.info("MODX Cache: Starting cache update...")
     
     try:
@@ -231,7 +330,7 @@ async def update_cache():
             return False
         
         # Сохраняем в файл
-        success = await save_cache_to_file(products_data, categories_data)
+        success = await save_cache_to_file(products_data, categories_data, published, on_publish)
         
         if success:
             logger.info("MODX Cache: Cache update completed successfully")
@@ -287,6 +386,8 @@ async def main():
         except Exception as e:
             logger.error(f"MODX Cache: Fatal error: {e}")
 
+    await modx_client.close()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -2,6 +2,8 @@ import unittest
 import asyncio
 import json
 import os
+import shutil
+import tempfile
 from unittest.mock import AsyncMock, MagicMock, patch, Mock
 from aiohttp import web
 from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
@@ -14,8 +16,12 @@ from bot.api_server import (
     load_products_data_for_api, get_products_for_webapp,
     get_categories_for_webapp, serve_main_app_page, setup_api_server,
     generate_hmac_signature, verify_hmac_signature, generate_auth_token,
-    check_rate_limit, get_auth_token
+    check_rate_limit, get_auth_token, resolve_category_info
 )
+from bot import api_server
+from bot.catalog_cache import CatalogCache, CatalogSnapshot, EMPTY_SNAPSHOT, RESPONSE_VERSION
+from bot.catalog_delta import CatalogHistory, diff_catalogs, record_catalog_change
+from bot.circuit_breaker import CircuitOpenError
 
 
 class TestAPIServer(AioHTTPTestCase):
@@ -358,5 +364,135 @@ class TestAPISecurity(unittest.TestCase):
         self.assertTrue(check_rate_limit(test_ip))
 
 
+class TestCategoryResolution(unittest.TestCase):
+    """Test category info lookup for /api/products?category=..."""
+
+    def setUp(self):
+        api_server.categories_table = {}
+        api_server.categories_table_expires = 0.0
+
+    def test_resolved_from_snapshot_without_network(self):
+        """With a populated cache the MODX API is never called."""
+        snapshot = CatalogSnapshot.from_cache_data({"categories": [{"id": "16", "name": "Хлеб"}]})
+        with patch.object(api_server.catalog_cache, 'get_snapshot', return_value=snapshot), \
+                patch('bot.api_server.load_categories_from_modx_api', new_callable=AsyncMock) as mock_load:
+            info = asyncio.run(resolve_category_info("category_16"))
+            missing = asyncio.run(resolve_category_info("category_99"))
+        self.assertEqual(info, {"id": "16", "name": "Хлеб", "key": "category_16"})
+        self.assertIsNone(missing)
+        mock_load.assert_not_called()
+
+    def test_fallback_table_is_memoized(self):
+        """With an empty cache MODX categories are fetched once per TTL."""
+        with patch.object(api_server.catalog_cache, 'get_snapshot', return_value=EMPTY_SNAPSHOT), \
+                patch('bot.api_server.load_categories_from_modx_api', new_callable=AsyncMock,
+                      return_value=[{"id": "17", "name": "Выпечка"}]) as mock_load:
+            for _ in range(3):
+                info = asyncio.run(resolve_category_info("category_17"))
+        self.assertEqual(info, {"id": "17", "name": "Выпечка", "key": "category_17"})
+        self.assertEqual(mock_load.await_count, 1)
+
+
+
+class TestCatalogVersionEndpoints(AioHTTPTestCase):
+    """Test /bot-app/api/version and /bot-app/api/changes through the router."""
+
+    async def get_application(self):
+        app = web.Application()
+        app.router.add_get('/bot-app/api/version', api_server.get_catalog_version_for_webapp)
+        app.router.add_get('/bot-app/api/changes', api_server.get_catalog_changes_for_webapp)
+        return app
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        old_products = {"category_16": [{"id": "1", "name": "Хлеб", "price": "5.00"}]}
+        new_products = {"category_16": [{"id": "1", "name": "Хлеб", "price": "6.00"}]}
+        categories = [{"id": "16", "name": "Хлеб"}]
+        history_file = os.path.join(self.temp_dir, 'modx_cache_history.json')
+        record_catalog_change(history_file, "v1", "v2", diff_catalogs(old_products, categories, new_products, categories))
+
+        cache = CatalogCache(os.path.join(self.temp_dir, 'modx_cache.json'))
+        cache.publish_snapshot(CatalogSnapshot.from_cache_data(
+            {"products": new_products, "categories": categories, "metadata": {"version": "v2"}}
+        ))
+        for patcher in (
+            patch.object(api_server, 'catalog_cache', cache),
+            patch.object(api_server, 'catalog_history', CatalogHistory(history_file, check_interval=0)),
+            patch('bot.api_server.check_api_rate_limit', new_callable=AsyncMock, return_value=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_version_probe_and_revalidation(self):
+        """The probe is served from prepared bytes and revalidates to 304."""
+        with patch('builtins.open') as open_file:
+            response = await self.client.get('/bot-app/api/version')
+            self.assertEqual(response.status, 200)
+            self.assertEqual(await response.json(), {
+                "version": "v2", "last_updated": None, "products_count": 1, "categories_count": 1
+            })
+            etag = response.headers['ETag']
+            self.assertIn(etag, api_server.catalog_cache.get_snapshot().responses[RESPONSE_VERSION].etags.values())
+
+            revalidated = await self.client.get('/bot-app/api/version', headers={'If-None-Match': etag})
+            self.assertEqual(revalidated.status, 304)
+            self.assertEqual(revalidated.headers['ETag'], etag)
+        open_file.assert_not_called()
+
+    async def test_version_probe_without_catalog(self):
+        with patch.object(api_server.catalog_cache, 'get_snapshot', return_value=EMPTY_SNAPSHOT):
+            response = await self.client.get('/bot-app/api/version')
+        self.assertEqual(response.status, 503)
+
+    async def test_changes_since_known_version(self):
+        """A version in the history window gets only the diff, revalidating to 304."""
+        response = await self.client.get('/bot-app/api/changes', params={'since': 'v1'})
+        self.assertEqual(response.status, 200)
+        body = await response.json()
+        self.assertEqual((body["since"], body["version"], body["full"]), ("v1", "v2", False))
+        self.assertEqual(body["changes"]["products"]["changed"][0]["product"]["price"], "6.00")
+
+        etag = response.headers['ETag']
+        revalidated = await self.client.get('/bot-app/api/changes', params={'since': 'v1'},
+                                            headers={'If-None-Match': etag})
+        self.assertEqual(revalidated.status, 304)
+
+    async def test_changes_since_unknown_version_is_full(self):
+        response = await self.client.get('/bot-app/api/changes', params={'since': 'v0'})
+        self.assertEqual(response.status, 200)
+        body = await response.json()
+        self.assertTrue(body["full"])
+        self.assertEqual(body["products"]["category_16"][0]["price"], "6.00")
+
+    async def test_changes_require_since(self):
+        for params in ({}, {'since': 'v' * 100}):
+            response = await self.client.get('/bot-app/api/changes', params=params)
+            self.assertEqual(response.status, 400)
+
+
+class TestModxLastKnownGood(unittest.TestCase):
+    """Test that failing MODX fallbacks serve the last good result."""
+
+    def setUp(self):
+        api_server.modx_last_good.clear()
+        self.addCleanup(api_server.modx_last_good.clear)
+
+    def test_failure_serves_last_good_categories(self):
+        categories = [{"id": "16", "name": "Хлеб"}]
+        with patch.object(api_server.modx_client, 'get_json', new_callable=AsyncMock,
+                          return_value={"categories": categories}):
+            self.assertEqual(asyncio.run(api_server._fetch_categories_from_modx_api()), categories)
+        with patch.object(api_server.modx_client, 'get_json', new_callable=AsyncMock,
+                          side_effect=CircuitOpenError('modx', 30)):
+            self.assertEqual(asyncio.run(api_server._fetch_categories_from_modx_api()), categories)
+
+    def test_failure_without_history_is_empty(self):
+        with patch.object(api_server.modx_client, 'get_json', new_callable=AsyncMock,
+                          side_effect=CircuitOpenError('modx', 30)):
+            self.assertEqual(asyncio.run(api_server._fetch_products_from_modx_api('16')), [])
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
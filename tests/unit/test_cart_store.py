@@ -0,0 +1,147 @@
+"""
+Unit tests for the persistent cart store.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.cart_store import CartMiddleware, CartStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCartStoreMemory(unittest.TestCase):
+    """Test the in-memory LRU behaviour."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = CartStore(max_entries=2, ttl=60, clock=self.clock)
+
+    def test_dict_interface(self):
+        self.store.setdefault(1, {})['p1'] = 2
+        self.assertIn(1, self.store)
+        self.assertEqual(self.store[1], {'p1': 2})
+        self.assertEqual(self.store.get(2), None)
+        del self.store[1]
+        self.assertNotIn(1, self.store)
+        self.assertEqual(len(self.store), 0)
+
+    def test_least_recently_used_cart_is_evicted(self):
+        self.store[1] = {'p1': 1}
+        self.store[2] = {'p2': 1}
+        self.store[1]
+        self.store[3] = {'p3': 1}
+        self.assertEqual(sorted(self.store), [1, 3])
+
+    def test_membership_check_is_not_activity(self):
+        self.store[1] = {'p1': 1}
+        self.store[2] = {'p2': 1}
+        self.store._dirty.clear()
+        self.clock.now += 30
+
+        self.assertIn(1, self.store)
+        self.assertEqual(self.store.get(1), {'p1': 1})
+        self.assertEqual(self.store._dirty, set())
+        self.assertEqual(self.store._entries[1].touched, 1000.0)
+        # Still the least recently used cart
+        self.store[3] = {'p3': 1}
+        self.assertEqual(sorted(self.store), [2, 3])
+
+    def test_abandoned_cart_expires(self):
+        self.store[1] = {'p1': 1}
+        self.clock.now += 30
+        self.assertEqual(self.store[1], {'p1': 1})
+        self.clock.now += 61
+        self.assertNotIn(1, self.store)
+        self.assertEqual(self.store.setdefault(1, {}), {})
+
+
+class TestCartStorePersistence(unittest.IsolatedAsyncioTestCase):
+    """Test write-behind persistence and restore across restarts."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'state', 'bot_state.db')
+        self.clock = FakeClock()
+        self.stores = []
+
+    async def asyncTearDown(self):
+        for store in self.stores:
+            await store.close()
+        shutil.rmtree(self.temp_dir)
+
+    async def _start(self, **kwargs):
+        store = CartStore(self.db_path, ttl=60, flush_interval=3600, clock=self.clock, **kwargs)
+        await store.start()
+        self.stores.append(store)
+        return store
+
+    async def test_carts_survive_restart(self):
+        store = await self._start()
+        store[1] = {'p1': 2}
+        store.setdefault(2, {})['p2'] = 1
+        store[3] = {'p3': 1}
+        await store.flush()
+        # Changed through the returned dict and removed after the flush
+        store[2]['p2'] = 5
+        del store[3]
+        await store.close()
+
+        restored = await self._start()
+        self.assertEqual(dict(restored), {1: {'p1': 2}, 2: {'p2': 5}})
+
+    async def test_evicted_cart_is_loaded_back(self):
+        store = await self._start(max_entries=1)
+        store[1] = {'p1': 2}
+        store[2] = {'p2': 1}
+        self.assertNotIn(1, store)
+
+        # Before and after the flush that writes it to disk
+        await store.load(1)
+        self.assertEqual(store[1], {'p1': 2})
+        await store.flush()
+        self.assertNotIn(2, store)
+        await store.load(2)
+        self.assertEqual(store[2], {'p2': 1})
+
+    async def test_expired_carts_are_not_restored(self):
+        store = await self._start()
+        store[1] = {'p1': 1}
+        await store.close()
+
+        self.clock.now += 61
+        restored = await self._start()
+        self.assertEqual(len(restored), 0)
+        await restored.load(1)
+        self.assertNotIn(1, restored)
+
+    async def test_middleware_loads_cart_before_handler(self):
+        store = await self._start()
+        store[1] = {'p1': 3}
+        await store.close()
+        restored = await self._start(max_entries=0)
+        restored.max_entries = 10
+
+        seen = {}
+
+        async def handler(event, data):
+            seen['cart'] = restored.get(event.from_user.id)
+
+        await CartMiddleware(restored)(handler, SimpleNamespace(from_user=SimpleNamespace(id=1)), {})
+        self.assertEqual(seen['cart'], {'p1': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
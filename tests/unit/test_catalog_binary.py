@@ -0,0 +1,136 @@
+"""
+Unit tests for the mmap'ed binary MODX catalog.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import scheduler_modx
+from bot.catalog_binary import MappedCatalog, binary_catalog_path, write_binary_catalog
+from bot.catalog_cache import (
+    CatalogCache, CatalogSnapshot, MappedCatalogSnapshot,
+    RESPONSE_ALL, RESPONSE_VERSION, category_response_key, product_response_key
+)
+
+
+def _cache_data(version, price="5.00"):
+    return {
+        "products": {"category_16": [{"id": 1, "name": "Хлеб белый", "price": price, "description": "x" * 600}]},
+        "categories": [{"id": 16, "name": "Хлеб"}, {"id": 17, "name": "Торты"}],
+        "metadata": {"version": version}
+    }
+
+
+class TestBinaryCatalog(unittest.TestCase):
+    """Test the binary format round trip and the CatalogCache integration."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.temp_dir, 'modx_cache.json')
+        self.binary_file = binary_catalog_path(self.cache_file)
+        self.cache = CatalogCache(self.cache_file, check_interval=0, binary_path=self.binary_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _reload(self):
+        asyncio.run(self.cache.check())
+        return self.cache.get_snapshot()
+
+    def _write_json(self, cache_data):
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache_data, f, ensure_ascii=False)
+
+    def test_round_trip_matches_prepared_bodies(self):
+        snapshot = CatalogSnapshot.from_cache_data(_cache_data("v1"))
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v1"))
+        catalog = MappedCatalog(self.binary_file)
+
+        self.assertEqual(sorted(catalog), sorted(snapshot.responses))
+        for key, prepared in snapshot.responses.items():
+            mapped = catalog[key]
+            self.assertEqual(bytes(mapped.identity), prepared.identity)
+            self.assertEqual(mapped.gzip is None, prepared.gzip is None)
+            self.assertEqual(mapped.etags, prepared.etags)
+        self.assertEqual(bytes(catalog[product_response_key(1)].select('gzip')[0]), snapshot.responses[product_response_key(1)].gzip)
+        self.assertNotIn(product_response_key(2), catalog)
+        self.assertEqual(catalog.metadata, {"version": "v1"})
+        self.assertEqual((catalog.products_count, catalog.categories_count), (1, 2))
+
+    def test_empty_catalog(self):
+        write_binary_catalog(self.binary_file, {}, {"version": "v0"})
+        self.assertTrue(MappedCatalogSnapshot(MappedCatalog(self.binary_file)).is_empty)
+
+    def test_truncated_file_is_rejected(self):
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v1"))
+        with open(self.binary_file, 'r+b') as f:
+            f.truncate(os.path.getsize(self.binary_file) - 1)
+        with self.assertRaises(ValueError):
+            MappedCatalog(self.binary_file)
+
+    def test_cache_prefers_binary_and_parses_lazily(self):
+        self._write_json(_cache_data("v1"))
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v1"))
+        snapshot = self._reload()
+
+        self.assertIsInstance(snapshot, MappedCatalogSnapshot)
+        self.assertEqual(snapshot.version, "v1")
+        self.assertTrue(snapshot.has_products)
+        self.assertEqual(snapshot.categories_count, 2)
+        self.assertNotIn('products', vars(snapshot))
+        self.assertIn(category_response_key("category_16"), snapshot.responses)
+        self.assertIs(self._reload(), snapshot)
+
+        # Lazily deserialized for the rare paths that need the data itself
+        self.assertEqual(snapshot.products["category_16"][0]["name"], "Хлеб белый")
+        self.assertEqual(snapshot.index.category_info("category_17")["name"], "Торты")
+        with self.assertRaises(AttributeError):
+            snapshot.version = "v2"
+
+    def test_api_startup_does_not_parse_the_mapped_catalog(self):
+        from unittest.mock import patch
+        from bot import api_server
+
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v1"))
+        with patch.object(api_server, 'catalog_cache', self.cache):
+            asyncio.run(api_server.load_modx_cache_data())
+        snapshot = self.cache.get_snapshot()
+        self.assertIsInstance(snapshot, MappedCatalogSnapshot)
+        self.assertNotIn('products', vars(snapshot))
+        self.assertNotIn('categories', vars(snapshot))
+
+    def test_replaced_binary_is_remapped_and_old_bodies_stay_readable(self):
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v1"))
+        old_body = self._reload().responses[RESPONSE_ALL]
+
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v2", price="6.00"))
+        snapshot = self._reload()
+        self.assertEqual(snapshot.version, "v2")
+        self.assertIn(b'"v2"', bytes(snapshot.responses[RESPONSE_VERSION].identity))
+        self.assertIn(b'"v1"', bytes(old_body.identity))
+
+    def test_falls_back_to_json_without_a_usable_binary(self):
+        self._write_json(_cache_data("v1"))
+        with open(self.binary_file, 'wb') as f:
+            f.write(b'garbage')
+        snapshot = self._reload()
+        self.assertIsInstance(snapshot, CatalogSnapshot)
+        self.assertEqual(snapshot.version, "v1")
+        self.assertIs(self._reload(), snapshot)
+
+        scheduler_modx.write_binary_cache(self.binary_file, _cache_data("v1"))
+        self.assertIsInstance(self._reload(), MappedCatalogSnapshot)
+
+        os.remove(self.binary_file)
+        self.assertIsInstance(self._reload(), CatalogSnapshot)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+Unit tests for the in-memory MODX catalog snapshot.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.catalog_cache import (
+    CatalogCache, CatalogSnapshot, EMPTY_SNAPSHOT,
+    RESPONSE_ALL, RESPONSE_PRODUCTS, RESPONSE_CATEGORIES, RESPONSE_VERSION, category_response_key, product_response_key
+)
+
+
+class TestCatalogCache(unittest.IsolatedAsyncioTestCase):
+    """Test cases for CatalogCache hot reload."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.temp_dir, 'modx_cache.json')
+        self.cache = CatalogCache(self.cache_file, check_interval=0)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_cache(self, version, products=None, categories=None):
+        data = {
+            "products": products if products is not None else {"category_16": [{"id": "1", "name": "Bread"}]},
+            "categories": categories if categories is not None else [{"id": "16", "name": "Хлеб"}],
+            "metadata": {"version": version}
+        }
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_file, self.cache_file)
+
+    async def _reload(self):
+        await self.cache.check()
+        return self.cache.get_snapshot()
+
+    async def test_missing_file_returns_empty_snapshot(self):
+        """A missing cache file yields the shared empty snapshot."""
+        snapshot = await self._reload()
+        self.assertIs(snapshot, EMPTY_SNAPSHOT)
+        self.assertTrue(snapshot.is_empty)
+
+    async def test_snapshot_is_reused_while_file_unchanged(self):
+        """The file is parsed once and the same snapshot is served afterwards."""
+        self._write_cache("v1")
+        first = await self._reload()
+        second = await self._reload()
+        self.assertIs(first, second)
+        self.assertEqual(first.version, "v1")
+        self.assertEqual(first.products["category_16"][0]["name"], "Bread")
+
+    async def test_snapshot_swapped_when_file_replaced(self):
+        """Atomically replacing the file publishes a new snapshot."""
+        self._write_cache("v1")
+        first = await self._reload()
+        self._write_cache("v2", categories=[])
+        second = await self._reload()
+        self.assertIsNot(first, second)
+        self.assertEqual(second.version, "v2")
+        self.assertEqual(first.version, "v1")
+
+    async def test_get_snapshot_does_not_touch_the_file(self):
+        """Only check() reloads; reading the snapshot is a plain attribute read."""
+        self._write_cache("v1")
+        await self.cache.check()
+        self._write_cache("v2")
+        with patch('bot.catalog_cache.os.stat') as stat, patch('builtins.open') as open_file:
+            self.assertEqual(self.cache.get_snapshot().version, "v1")
+        stat.assert_not_called()
+        open_file.assert_not_called()
+
+    async def test_snapshot_is_built_off_the_loop(self):
+        """Parsing and compressing run in a worker thread."""
+        self._write_cache("v1")
+        threads = []
+        from_cache_data = CatalogSnapshot.from_cache_data.__func__
+
+        def record_thread(cls, *args):
+            threads.append(threading.get_ident())
+            return from_cache_data(cls, *args)
+
+        with patch.object(CatalogSnapshot, 'from_cache_data', classmethod(record_thread)):
+            self.assertEqual((await self._reload()).version, "v1")
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    async def test_background_task_picks_up_changes(self):
+        """The started cache checks every interval, or right away when invalidated."""
+        self._write_cache("v1")
+        cache = CatalogCache(self.cache_file, check_interval=0.01)
+        cache.start()
+        try:
+            await self._wait_for_version(cache, "v1")
+            self._write_cache("v2", categories=[])
+            await self._wait_for_version(cache, "v2")
+
+            cache.check_interval = 3600
+            await asyncio.sleep(0.05)
+            self._write_cache("v3")
+            await asyncio.sleep(0.05)
+            self.assertEqual(cache.get_snapshot().version, "v2")
+            cache.invalidate()
+            await self._wait_for_version(cache, "v3")
+        finally:
+            await cache.close()
+
+    async def _wait_for_version(self, cache, version):
+        for _ in range(200):
+            if cache.get_snapshot().version == version:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"version {version} not loaded")
+
+    async def test_reload_does_not_override_a_newer_publish(self):
+        """A file load that finishes after publish() is dropped."""
+        self._write_cache("v1")
+        published = CatalogSnapshot.from_cache_data({"metadata": {"version": "v2"}})
+        load = asyncio.create_task(self.cache.check())
+        await asyncio.sleep(0)
+        self.cache.publish_snapshot(published)
+        await load
+        self.assertIs(self.cache.get_snapshot(), published)
+
+    async def test_corrupted_file_returns_empty_snapshot(self):
+        """Invalid JSON does not raise and yields an empty snapshot."""
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            f.write("{not json")
+        self.assertTrue((await self._reload()).is_empty)
+
+    async def test_corrupted_file_keeps_last_known_good_snapshot(self):
+        """A broken replacement does not take the catalog down; the next valid file is picked up."""
+        self._write_cache("v1")
+        first = await self._reload()
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            f.write("{not json")
+        self.assertIs(await self._reload(), first)
+        self.assertTrue(self.cache.stale)
+
+        self._write_cache("v2")
+        self.assertEqual((await self._reload()).version, "v2")
+        self.assertFalse(self.cache.stale)
+
+    async def test_missing_file_keeps_last_known_good_snapshot(self):
+        """A deleted file keeps serving the version loaded before."""
+        self._write_cache("v1")
+        first = await self._reload()
+        os.remove(self.cache_file)
+        self.assertIs(await self._reload(), first)
+        self.assertTrue(self.cache.stale)
+
+    async def test_snapshot_prepares_response_bodies(self):
+        """Each snapshot carries ready bytes for the catalog endpoints."""
+        self._write_cache("v1")
+        snapshot = await self._reload()
+        all_data = json.loads(snapshot.responses[RESPONSE_ALL].identity)
+        self.assertEqual(all_data["metadata"]["version"], "v1")
+        self.assertEqual(json.loads(snapshot.responses[RESPONSE_CATEGORIES].identity), snapshot.categories)
+        self.assertEqual(json.loads(snapshot.responses[RESPONSE_PRODUCTS].identity), snapshot.products)
+
+        category = json.loads(snapshot.responses[category_response_key("category_16")].identity)
+        self.assertEqual(category["category"], {"id": "16", "name": "Хлеб", "key": "category_16"})
+        self.assertEqual(category["products"][0]["name"], "Bread")
+
+        product = json.loads(snapshot.responses[product_response_key("1")].identity)
+        self.assertEqual(product["name"], "Bread")
+        self.assertIs(snapshot.index.product("1").data, snapshot.products["category_16"][0])
+
+    async def test_snapshot_prepares_version_probe(self):
+        """The version probe body only carries version, counts and update time."""
+        self._write_cache("v7")
+        probe = json.loads((await self._reload()).responses[RESPONSE_VERSION].identity)
+        self.assertEqual(probe, {"version": "v7", "last_updated": None, "products_count": 1, "categories_count": 1})
+
+    async def test_response_etags_follow_version(self):
+        """Prepared bodies are tagged with the cache version."""
+        self._write_cache("v1")
+        self.assertEqual((await self._reload()).responses[RESPONSE_ALL].etags[None], '"v1"')
+        self._write_cache("v2")
+        self.assertEqual((await self._reload()).responses[RESPONSE_ALL].etags[None], '"v2"')
+
+    def test_snapshot_is_immutable(self):
+        """Snapshot attributes cannot be reassigned."""
+        snapshot = CatalogSnapshot.from_cache_data({"metadata": {"version": "v1"}})
+        with self.assertRaises(AttributeError):
+            snapshot.version = "v2"
+
+
+if __name__ == '__main__':
+    unittest.main()
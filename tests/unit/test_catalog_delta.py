@@ -0,0 +1,128 @@
+"""
+Unit tests for the catalog delta feed.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.catalog_delta import (
+    CatalogHistory, changes_since, compose_diffs, diff_catalogs, is_empty_diff, load_history, record_catalog_change
+)
+
+
+def _product(product_id, price="5.0"):
+    return {"id": product_id, "name": f"Product {product_id}", "price": price}
+
+
+class TestDiffCatalogs(unittest.TestCase):
+    """Test per-version diffs."""
+
+    def test_added_changed_removed(self):
+        old = {"category_16": [_product(1), _product(2)]}
+        new = {"category_16": [_product(1, "6.0")], "category_17": [_product(3)]}
+        diff = diff_catalogs(old, [{"id": 16, "name": "Хлеб"}], new, [{"id": 16, "name": "Хлеб и булки"}])
+
+        self.assertEqual(diff["products"]["added"], [{"category": "category_17", "product": _product(3)}])
+        self.assertEqual(diff["products"]["changed"], [{"category": "category_16", "product": _product(1, "6.0")}])
+        self.assertEqual(diff["products"]["removed"], ["2"])
+        self.assertEqual(diff["categories"]["changed"], [{"id": 16, "name": "Хлеб и булки"}])
+
+    def test_category_move_is_a_change(self):
+        diff = diff_catalogs({"category_16": [_product(1)]}, [], {"category_17": [_product(1)]}, [])
+        self.assertEqual(diff["products"]["changed"], [{"category": "category_17", "product": _product(1)}])
+        self.assertEqual(diff["products"]["removed"], [])
+
+    def test_identical_catalogs(self):
+        products = {"category_16": [_product(1)]}
+        self.assertTrue(is_empty_diff(diff_catalogs(products, [], products, [])))
+
+
+class TestComposeDiffs(unittest.TestCase):
+    """Test folding consecutive diffs."""
+
+    def _products(self, added=(), changed=(), removed=()):
+        return {"products": {
+            "added": [{"category": "category_16", "product": p} for p in added],
+            "changed": [{"category": "category_16", "product": p} for p in changed],
+            "removed": list(removed)
+        }}
+
+    def test_added_then_changed_is_added(self):
+        result = compose_diffs([self._products(added=[_product(1)]), self._products(changed=[_product(1, "7.0")])])
+        self.assertEqual(result["products"]["added"], [{"category": "category_16", "product": _product(1, "7.0")}])
+        self.assertEqual(result["products"]["changed"], [])
+
+    def test_added_then_removed_disappears(self):
+        result = compose_diffs([self._products(added=[_product(1)]), self._products(removed=["1"])])
+        self.assertTrue(is_empty_diff(result))
+
+    def test_removed_then_added_is_changed(self):
+        result = compose_diffs([self._products(removed=["1"]), self._products(added=[_product(1)])])
+        self.assertEqual(len(result["products"]["changed"]), 1)
+        self.assertEqual(result["products"]["removed"], [])
+
+
+class TestHistory(unittest.TestCase):
+    """Test the history file and the composed delta responses."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.history_file = os.path.join(self.temp_dir, 'modx_cache_history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _record_chain(self, count):
+        for i in range(count):
+            changes = diff_catalogs({}, [], {"category_16": [_product(i)]}, [])
+            record_catalog_change(self.history_file, f"v{i}", f"v{i + 1}", changes, max_entries=3)
+
+    def test_history_is_bounded(self):
+        self._record_chain(5)
+        self.assertEqual([entry["version"] for entry in load_history(self.history_file)], ["v3", "v4", "v5"])
+
+    def test_changes_since(self):
+        self._record_chain(3)
+        versions = load_history(self.history_file)
+        delta = changes_since(versions, "v1", "v3")
+        self.assertEqual([item["product"]["id"] for item in delta["products"]["added"]], [1, 2])
+        self.assertTrue(is_empty_diff(changes_since(versions, "v3", "v3")))
+        self.assertIsNone(changes_since(versions, "unknown", "v3"))
+        self.assertIsNone(changes_since(versions, "v1", "v9"))
+
+    def test_delta_response_and_full_fallback(self):
+        self._record_chain(2)
+        history = CatalogHistory(self.history_file, check_interval=0)
+        snapshot = SimpleNamespace(version="v2", products={"category_16": []}, categories=[], metadata={})
+
+        delta = json.loads(history.delta_response("v1", snapshot).identity)
+        self.assertFalse(delta["full"])
+        self.assertEqual(delta["since"], "v1")
+        self.assertEqual(len(delta["changes"]["products"]["added"]), 1)
+
+        full = history.delta_response("v0-too-old", snapshot)
+        self.assertTrue(json.loads(full.identity)["full"])
+        # Every unknown version shares one prepared full body
+        self.assertIs(history.delta_response("another", snapshot), full)
+
+    def test_cached_delta_is_not_composed_again(self):
+        self._record_chain(3)
+        history = CatalogHistory(self.history_file, check_interval=0)
+        snapshot = SimpleNamespace(version="v3", products={}, categories=[], metadata={})
+        first = history.delta_response("v1", snapshot)
+
+        with patch('bot.catalog_delta.compose_diffs') as compose:
+            self.assertIs(history.delta_response("v1", snapshot), first)
+        compose.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the catalog version event hub (Server-Sent Events).
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.catalog_events import CatalogEventHub, HEARTBEAT, version_event
+
+
+class TestCatalogEventHub(unittest.IsolatedAsyncioTestCase):
+    """Test subscriber caps, fan-out and the watcher loop."""
+
+    async def test_connection_caps(self):
+        hub = CatalogEventHub(max_clients=3, max_clients_per_ip=2)
+        first = hub.subscribe("1.1.1.1")
+        self.assertIsNotNone(hub.subscribe("1.1.1.1"))
+        self.assertIsNone(hub.subscribe("1.1.1.1"))
+        self.assertIsNotNone(hub.subscribe("2.2.2.2"))
+        self.assertIsNone(hub.subscribe("3.3.3.3"))
+
+        hub.unsubscribe(first, "1.1.1.1")
+        self.assertEqual(len(hub), 2)
+        self.assertIsNotNone(hub.subscribe("3.3.3.3"))
+
+    async def test_full_queue_drops_oldest(self):
+        hub = CatalogEventHub(queue_size=2)
+        queue = hub.subscribe("1.1.1.1")
+        for message in (b'a', b'b', b'c'):
+            hub.publish(message)
+        self.assertEqual([queue.get_nowait(), queue.get_nowait()], [b'b', b'c'])
+
+    async def test_heartbeat_does_not_evict_version_events(self):
+        hub = CatalogEventHub(queue_size=2)
+        queue = hub.subscribe("1.1.1.1")
+        hub.publish(HEARTBEAT)
+        hub.announce(version_event("v1", b'{}'))
+        hub.announce(version_event("v2", b'{}'))
+        hub.publish(HEARTBEAT)
+        self.assertEqual([queue.get_nowait(), queue.get_nowait()],
+                         [version_event("v1", b'{}'), version_event("v2", b'{}')])
+
+    async def test_watch_announces_changes_and_heartbeats(self):
+        hub = CatalogEventHub()
+        queue = hub.subscribe("1.1.1.1")
+        events = [version_event("v1", b'{}')]
+        task = asyncio.create_task(hub.watch(lambda: events[-1], poll_interval=0.01, heartbeat=0.05))
+        try:
+            await asyncio.sleep(0.03)
+            self.assertTrue(queue.empty())
+
+            events.append(version_event("v2", b'{}'))
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), events[-1])
+            self.assertEqual(hub.current, events[-1])
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), HEARTBEAT)
+        finally:
+            task.cancel()
+
+
+class TestCatalogEventStream(unittest.IsolatedAsyncioTestCase):
+    """Test the SSE response of CatalogEventHub.stream."""
+
+    async def asyncSetUp(self):
+        self.hub = CatalogEventHub()
+        self.hub.current = version_event("v1", b'{"version":"v1"}')
+
+        async def handler(request):
+            return await self.hub.stream(request, "127.0.0.1")
+
+        app = web.Application()
+        app.router.add_get('/events', handler)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_stream_sends_current_version_then_updates(self):
+        response = await self.client.get('/events')
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        first = await response.content.readuntil(b'\n\n')
+        self.assertIn(b'id: v1\nevent: version\ndata: {"version":"v1"}', first)
+
+        self.hub.announce(version_event("v2", b'{"version":"v2"}'))
+        self.assertIn(b'id: v2', await response.content.readuntil(b'\n\n'))
+
+        await self.hub.close()
+        self.assertEqual(await response.content.read(), b'')
+        self.assertEqual(len(self.hub), 0)
+
+    async def test_stream_rejected_when_full(self):
+        self.hub.max_clients = 0
+        response = await self.client.get('/events')
+        self.assertEqual(response.status, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
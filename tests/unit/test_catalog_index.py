@@ -0,0 +1,77 @@
+"""
+Unit tests for the per-version catalog index.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.catalog_index import CatalogIndex, format_modx_product
+
+
+class TestCatalogIndex(unittest.TestCase):
+    """Test cases for CatalogIndex lookups and ordering."""
+
+    def setUp(self):
+        self.products = {
+            "category_16": [
+                {"id": "2", "name": "Baguette", "menuindex": "10"},
+                {"id": "1", "name": "Bread", "menuindex": "2"},
+            ],
+            "category_99": [{"id": "3", "name": "Orphan"}],
+        }
+        self.categories = [{"id": "16", "name": "Хлеб", "menuindex": "0"}]
+        self.index = CatalogIndex(self.products, self.categories)
+
+    def test_products_sorted_by_menuindex(self):
+        """Products are ordered numerically by menuindex, not as strings."""
+        names = [product["name"] for product in self.index.category("category_16").product_list()]
+        self.assertEqual(names, ["Bread", "Baguette"])
+
+    def test_category_info(self):
+        """Category info comes from the categories list; unknown ids have none."""
+        self.assertEqual(self.index.category("category_16").info, {"id": "16", "name": "Хлеб", "key": "category_16"})
+        self.assertIsNone(self.index.category("category_99").info)
+        self.assertIsNone(self.index.category("category_404"))
+
+    def test_category_info_without_products(self):
+        """Categories without products still resolve to their info."""
+        index = CatalogIndex({}, [{"id": "17", "name": "Выпечка"}])
+        self.assertEqual(index.category_info("category_17"), {"id": "17", "name": "Выпечка", "key": "category_17"})
+        self.assertIsNone(index.category_info("category_18"))
+        self.assertIsNone(index.category("category_17"))
+
+    def test_product_lookup(self):
+        """Products are found by id regardless of the id type."""
+        record = self.index.product(2)
+        self.assertEqual(record.data["name"], "Baguette")
+        self.assertEqual(record.category_key, "category_16")
+        self.assertIsNone(self.index.product("404"))
+
+    def test_from_modx_products(self):
+        """Raw MODX products are normalized and malformed ones skipped."""
+        raw = [
+            {"id": "5", "parent_id": "16", "pagetitle": "Rye", "price": "1 234,5", "weight": "430,0",
+             "alias": "rye", "menuindex": 1},
+            {"id": "6", "parent_id": "16", "pagetitle": "Broken", "price": "n/a", "weight": "1"},
+            {"id": "7", "pagetitle": "No parent", "price": "1", "weight": "1"},
+        ]
+        index = CatalogIndex.from_modx_products(raw)
+        self.assertEqual(list(index.products), ["5"])
+        product = index.product("5").data
+        self.assertEqual(product["price"], "1234.5")
+        self.assertEqual(product["weight"], "430")
+        self.assertEqual(product["url"], "https://drazhin.by/rye")
+
+    def test_format_modx_product_defaults(self):
+        """Optional MODX fields fall back to the parser defaults."""
+        product = format_modx_product({"id": "1", "pagetitle": "Bun", "price": 2, "weight": 50})
+        self.assertEqual(product["short_description"], "N/A")
+        self.assertEqual(product["images"], [])
+        self.assertEqual(product["menuindex"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
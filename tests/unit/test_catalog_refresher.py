@@ -0,0 +1,117 @@
+"""
+Unit tests for the in-process MODX catalog refresher.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import scheduler_modx
+from bot.catalog_cache import CatalogCache
+from bot.catalog_refresher import CatalogRefresher, RETRY_DELAY
+
+
+def _product(product_id, price='5.00'):
+    return {
+        "id": product_id, "parent_id": 16, "pagetitle": f"Product {product_id}", "alias": f"p{product_id}",
+        "price": price, "weight": "100", "menuindex": 0
+    }
+
+
+class TestCatalogRefresher(unittest.IsolatedAsyncioTestCase):
+    """Test that refreshed versions reach the CatalogCache directly."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.temp_dir, 'modx_cache.json')
+        for name, value in (
+            ('CACHE_FILE_PATH', self.cache_file),
+            ('HISTORY_FILE_PATH', os.path.join(self.temp_dir, 'modx_cache_history.json'))
+        ):
+            patcher = patch.object(scheduler_modx, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.products = [_product(1)]
+        for name, loader in (
+            ('load_products_from_modx_api', AsyncMock(side_effect=lambda: list(self.products))),
+            ('load_categories_from_modx_api', AsyncMock(return_value=[{"id": 16, "name": "Хлеб"}]))
+        ):
+            patcher = patch.object(scheduler_modx, name, loader)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.catalog_cache = CatalogCache(self.cache_file, check_interval=0)
+        self.refresher = CatalogRefresher(self.catalog_cache, interval=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    async def test_new_version_is_published_without_reparsing_the_file(self):
+        self.assertTrue(await self.refresher.refresh())
+        snapshot = self.catalog_cache.get_snapshot()
+        self.assertEqual(snapshot.index.product("1").data["name"], "Product 1")
+        self.assertTrue(os.path.exists(self.cache_file))
+
+        # The snapshot handed over in memory is kept: the written file is not re-read
+        self.assertIs(self.catalog_cache.get_snapshot(), snapshot)
+
+        self.products = [_product(1, price='6.00')]
+        self.assertTrue(await self.refresher.refresh())
+        self.assertNotEqual(self.catalog_cache.get_snapshot().version, snapshot.version)
+
+    async def test_snapshot_is_swapped_in_on_the_loop_thread(self):
+        threads = []
+        publish_snapshot = self.catalog_cache.publish_snapshot
+
+        def record_thread(snapshot):
+            threads.append(threading.get_ident())
+            publish_snapshot(snapshot)
+
+        with patch.object(self.catalog_cache, 'publish_snapshot', side_effect=record_thread):
+            await self.refresher.refresh()
+        self.assertEqual(threads, [threading.get_ident()])
+
+    async def test_file_and_history_writes_run_off_the_loop(self):
+        threads = {}
+
+        def recording(name, function):
+            def wrapper(*args):
+                threads[name] = threading.get_ident()
+                return function(*args)
+            return wrapper
+
+        await self.refresher.refresh()
+        self.products = [_product(1, price='6.00')]
+        with patch.object(scheduler_modx, 'write_cache_file',
+                          recording('cache', scheduler_modx.write_cache_file)), \
+                patch.object(scheduler_modx, 'record_history',
+                             recording('history', scheduler_modx.record_history)):
+            self.assertTrue(await self.refresher.refresh())
+        self.assertEqual(sorted(threads), ['cache', 'history'])
+        self.assertNotIn(threading.get_ident(), threads.values())
+
+    async def test_unchanged_data_keeps_the_snapshot(self):
+        await self.refresher.refresh()
+        snapshot = self.catalog_cache.get_snapshot()
+        await self.refresher.refresh()
+        self.assertIs(self.catalog_cache.get_snapshot(), snapshot)
+
+    async def test_snapshot_survives_missing_warm_start_file(self):
+        await self.refresher.refresh()
+        os.remove(self.cache_file)
+        self.assertFalse(self.catalog_cache.get_snapshot().is_empty)
+
+    def test_retry_backoff(self):
+        self.assertEqual(self.refresher.next_delay(0), 60)
+        self.assertEqual(self.refresher.next_delay(1), RETRY_DELAY)
+        self.assertEqual(self.refresher.next_delay(2), RETRY_DELAY * 2)
+        self.assertEqual(self.refresher.next_delay(10), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the circuit breaker.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+)
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+    """Test the closed -> open -> half-open -> closed cycle with a fake clock."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30,
+                                      is_failure=lambda e: not isinstance(e, KeyError),
+                                      clock=lambda: self.now)
+        self.calls = 0
+
+    async def _ok(self):
+        self.calls += 1
+        return "ok"
+
+    async def _fail(self, error=ConnectionError):
+        self.calls += 1
+        raise error("down")
+
+    async def _open(self):
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                await self.breaker.call(self._fail)
+
+    async def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                await self.breaker.call(self._fail)
+        # A success resets the count
+        await self.breaker.call(self._ok)
+        await self._open()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+        calls = self.calls
+        with self.assertRaises(CircuitOpenError) as context:
+            await self.breaker.call(self._ok)
+        self.assertEqual(self.calls, calls)
+        self.assertEqual(context.exception.retry_after, 30)
+
+    async def test_non_failures_keep_the_circuit_closed(self):
+        for _ in range(5):
+            with self.assertRaises(KeyError):
+                await self.breaker.call(self._fail, KeyError)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    async def test_half_open_trial_closes_or_reopens(self):
+        await self._open()
+        self.now = 30
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        with self.assertRaises(ConnectionError):
+            await self.breaker.call(self._fail)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+        self.now = 60
+        self.assertEqual(await self.breaker.call(self._ok), "ok")
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    async def test_half_open_admits_one_trial_at_a_time(self):
+        await self._open()
+        self.now = 30
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "ok"
+
+        trial = asyncio.create_task(self.breaker.call(slow))
+        await asyncio.sleep(0)
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.call(self._ok)
+
+        # A cancelled trial frees its slot
+        trial.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await trial
+        self.assertEqual(await self.breaker.call(self._ok), "ok")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Unit tests for pre-serialized, pre-compressed response bodies.
+"""
+
+import gzip
+import json
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import http_cache
+from bot.http_cache import (
+    PreparedBody, parse_accept_encoding, prepared_response, if_none_match_matches, catalog_cache_headers
+)
+
+
+class TestAcceptEncoding(unittest.TestCase):
+    """Test cases for Accept-Encoding parsing."""
+
+    def test_parse_qvalues(self):
+        """Q-values are parsed and default to 1."""
+        result = parse_accept_encoding("gzip, deflate;q=0.5, br;q=0")
+        self.assertEqual(result, {"gzip": 1.0, "deflate": 0.5, "br": 0.0})
+
+    def test_parse_empty_header(self):
+        """An empty header accepts nothing but identity."""
+        self.assertEqual(parse_accept_encoding(""), {})
+
+
+class TestPreparedBody(unittest.TestCase):
+    """Test cases for PreparedBody variants and selection."""
+
+    def setUp(self):
+        self.data = {"products": [{"id": str(i), "name": "Хлеб"} for i in range(100)]}
+        self.prepared = PreparedBody.from_json(self.data)
+
+    def test_identity_is_compact_utf8_json(self):
+        """Identity body round-trips and keeps non-ASCII characters unescaped."""
+        self.assertEqual(json.loads(self.prepared.identity), self.data)
+        self.assertIn("Хлеб".encode('utf-8'), self.prepared.identity)
+        self.assertNotIn(b", ", self.prepared.identity)
+
+    def test_gzip_variant(self):
+        """Gzip variant decompresses to the identity body."""
+        body, encoding = self.prepared.select("gzip, deflate")
+        self.assertEqual(encoding, "gzip")
+        self.assertEqual(gzip.decompress(body), self.prepared.identity)
+
+    @unittest.skipIf(http_cache.brotli is None, "brotli not installed")
+    def test_brotli_preferred(self):
+        """Brotli is chosen when the client accepts it."""
+        body, encoding = self.prepared.select("gzip, deflate, br")
+        self.assertEqual(encoding, "br")
+        self.assertEqual(http_cache.brotli.decompress(body), self.prepared.identity)
+
+    def test_identity_when_not_accepted(self):
+        """Without an acceptable coding the identity body is returned."""
+        self.assertEqual(self.prepared.select(""), (self.prepared.identity, None))
+        self.assertEqual(self.prepared.select("gzip;q=0, br;q=0"), (self.prepared.identity, None))
+
+    def test_small_bodies_not_compressed(self):
+        """Tiny bodies are only kept as identity."""
+        prepared = PreparedBody.from_json([])
+        self.assertIsNone(prepared.gzip)
+        self.assertEqual(prepared.select("gzip, br"), (b"[]", None))
+
+    def test_prepared_response_headers(self):
+        """Responses carry Content-Encoding and Vary headers."""
+        request = MagicMock()
+        request.headers = {"Accept-Encoding": "gzip"}
+        response = prepared_response(request, self.prepared, headers={"Cache-Control": "no-cache"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        self.assertEqual(response.content_type, "application/json")
+        self.assertEqual(response.body, self.prepared.gzip)
+
+
+class TestConditionalResponses(unittest.TestCase):
+    """Test cases for ETag / If-None-Match handling."""
+
+    def setUp(self):
+        self.prepared = PreparedBody.from_json([{"id": str(i)} for i in range(100)], tag="v1")
+
+    def _request(self, **headers):
+        request = MagicMock()
+        request.headers = headers
+        return request
+
+    def test_etag_per_variant(self):
+        """Each encoding variant has its own strong ETag derived from the tag."""
+        self.assertEqual(self.prepared.etags[None], '"v1"')
+        self.assertEqual(self.prepared.etags["gzip"], '"v1-gzip"')
+
+    def test_etag_defaults_to_content_hash(self):
+        """Without a tag the ETag changes with the content."""
+        first = PreparedBody.from_json({"a": 1}).etags[None]
+        self.assertEqual(first, PreparedBody.from_json({"a": 1}).etags[None])
+        self.assertNotEqual(first, PreparedBody.from_json({"a": 2}).etags[None])
+
+    def test_if_none_match_comparison(self):
+        """Weak comparison accepts lists, W/ prefixes and the wildcard."""
+        etags = self.prepared.etags.values()
+        self.assertTrue(if_none_match_matches('"v0", "v1-gzip"', etags))
+        self.assertTrue(if_none_match_matches('W/"v1"', etags))
+        self.assertTrue(if_none_match_matches('*', etags))
+        self.assertFalse(if_none_match_matches('"v2"', etags))
+        self.assertFalse(if_none_match_matches('', etags))
+
+    def test_matching_request_gets_304(self):
+        """A matching If-None-Match yields an empty 304 with the variant ETag."""
+        response = prepared_response(self._request(**{"Accept-Encoding": "gzip", "If-None-Match": '"v1-gzip"'}),
+                                     self.prepared, headers={"Cache-Control": "private, no-cache"})
+        self.assertEqual(response.status, 304)
+        self.assertIsNone(response.body)
+        self.assertEqual(response.headers["ETag"], '"v1-gzip"')
+        self.assertEqual(response.headers["Cache-Control"], "private, no-cache")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_stale_etag_gets_full_body(self):
+        """An outdated ETag gets the full body and the current ETag."""
+        response = prepared_response(self._request(**{"If-None-Match": '"v0"'}), self.prepared)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, self.prepared.identity)
+        self.assertEqual(response.headers["ETag"], '"v1"')
+
+    def test_catalog_cache_headers(self):
+        """max-age and stale-while-revalidate are only sent when enabled."""
+        self.assertEqual(catalog_cache_headers(), {"Cache-Control": "private, no-cache"})
+        self.assertEqual(catalog_cache_headers(60)["Cache-Control"], "private, max-age=60")
+        self.assertEqual(catalog_cache_headers(60, 600)["Cache-Control"],
+                         "private, max-age=60, stale-while-revalidate=600")
+
+
+if __name__ == '__main__':
+    unittest.main()
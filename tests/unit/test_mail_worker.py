@@ -0,0 +1,223 @@
+"""
+Unit tests for the pooled SMTP mail worker, against a local asyncio SMTP stand-in.
+"""
+
+import asyncio
+import os
+import smtplib
+import sys
+import unittest
+from unittest.mock import patch
+from email.mime.text import MIMEText
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.mail_worker import MailWorker
+
+
+class FakeSMTPServer:
+    """Just enough ESMTP (EHLO, AUTH, MAIL, RCPT, DATA, RSET, QUIT) for smtplib."""
+
+    def __init__(self, refused=(), data_delay=0.0):
+        self.refused = set(refused)
+        self.data_delay = data_delay
+        # A command arrived while a DATA reply was still pending
+        self.interleaved = False
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.quits = 0
+        self._writers = []
+        self._server = None
+        self.port = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        recipients = []
+        try:
+            writer.write(b'220 localhost ESMTP stand-in\r\n')
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().strip()
+                verb = command.split(' ', 1)[0].upper()
+                if verb == 'EHLO':
+                    writer.write(b'250-localhost\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n')
+                elif verb == 'AUTH':
+                    self.logins += 1
+                    writer.write(b'235 Authentication successful\r\n')
+                elif verb == 'MAIL':
+                    recipients = []
+                    writer.write(b'250 OK\r\n')
+                elif verb == 'RCPT':
+                    address = command.split(':', 1)[1].strip().strip('<>')
+                    if address in self.refused:
+                        writer.write(b'550 No such user\r\n')
+                    else:
+                        recipients.append(address)
+                        writer.write(b'250 OK\r\n')
+                elif verb == 'DATA':
+                    writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                    await writer.drain()
+                    while await reader.readline() != b'.\r\n':
+                        pass
+                    await asyncio.sleep(self.data_delay)
+                    if reader._buffer:
+                        self.interleaved = True
+                    self.messages.append(recipients)
+                    writer.write(b'250 Queued\r\n')
+                elif verb in ('RSET', 'NOOP'):
+                    writer.write(b'250 OK\r\n')
+                elif verb == 'QUIT':
+                    self.quits += 1
+                    writer.write(b'221 Bye\r\n')
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b'502 Command not implemented\r\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def _message(recipient):
+    message = MIMEText('<p>Новый заказ</p>', 'html', 'utf-8')
+    message['Subject'] = 'Заказ'
+    message['From'] = 'bakery@example.com'
+    message['To'] = recipient
+    return message
+
+
+class TestMailWorker(unittest.IsolatedAsyncioTestCase):
+    """Test connection reuse, batching, reconnects and metrics."""
+
+    async def asyncSetUp(self):
+        self.smtp = FakeSMTPServer(refused={'unknown@example.com'})
+        await self.smtp.start()
+        self.workers = []
+
+    async def asyncTearDown(self):
+        for worker in self.workers:
+            await worker.close()
+        await self.smtp.close()
+
+    async def _start(self, **kwargs):
+        kwargs.setdefault('pool_size', 1)
+        worker = MailWorker('127.0.0.1', self.smtp.port, 'bakery@example.com', 'secret', use_tls=False, **kwargs)
+        await worker.start()
+        self.workers.append(worker)
+        return worker
+
+    async def test_messages_share_one_authenticated_connection(self):
+        worker = await self._start()
+        await asyncio.gather(*(worker.send(_message(f"user{n}@example.com")) for n in range(5)))
+        await worker.send(_message("admin@example.com"))
+
+        self.assertEqual(len(self.smtp.messages), 6)
+        self.assertEqual((self.smtp.connections, self.smtp.logins), (1, 1))
+        stats = worker.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['queue_depth']), (6, 0, 0))
+        self.assertEqual(stats['open_connections'], 1)
+        self.assertGreater(stats['avg_latency'], 0)
+
+    async def test_dropped_connection_is_reopened(self):
+        worker = await self._start()
+        await worker.send(_message("user@example.com"))
+        self.smtp.drop_connections()
+        await asyncio.sleep(0.05)
+
+        await worker.send(_message("user@example.com"))
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(self.smtp.connections, 2)
+
+    async def test_idle_connection_is_closed(self):
+        worker = await self._start(idle_timeout=0.05)
+        await worker.send(_message("user@example.com"))
+        await asyncio.sleep(0.3)
+
+        self.assertEqual(self.smtp.quits, 1)
+        self.assertEqual(worker.stats()['open_connections'], 0)
+        await worker.send(_message("user@example.com"))
+        self.assertEqual(self.smtp.connections, 2)
+
+    async def test_refused_recipient_fails_only_its_message(self):
+        worker = await self._start()
+        results = await asyncio.gather(
+            worker.send(_message("unknown@example.com")),
+            worker.send(_message("user@example.com")),
+            return_exceptions=True
+        )
+
+        self.assertIsInstance(results[0], smtplib.SMTPRecipientsRefused)
+        self.assertIsNone(results[1])
+        self.assertEqual(self.smtp.messages, [["user@example.com"]])
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(worker.stats()['failed'], 1)
+
+    async def test_unreachable_server_fails_the_batch(self):
+        port = self.smtp.port
+        await self.smtp.close()
+        worker = MailWorker('127.0.0.1', port, 'bakery@example.com', 'secret', use_tls=False, pool_size=1, timeout=1)
+        await worker.start()
+        self.workers.append(worker)
+        # The stand-in is already closed
+        self.smtp = FakeSMTPServer()
+        await self.smtp.start()
+
+        with self.assertRaises(OSError):
+            await worker.send(_message("user@example.com"))
+        self.assertEqual(worker.stats()['failed'], 1)
+
+    async def test_rejected_connection_fails_the_batch_once(self):
+        attempts = 0
+
+        def reject(*args, **kwargs):
+            nonlocal attempts
+            attempts += 1
+            raise smtplib.SMTPConnectError(421, b'Too many connections')
+
+        worker = await self._start(smtp_factory=reject)
+        results = await asyncio.gather(
+            *(worker.send(_message(f"user{n}@example.com")) for n in range(3)), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, smtplib.SMTPConnectError) for result in results))
+        self.assertEqual(attempts, 1)
+        self.assertEqual(worker.stats()['failed'], 3)
+
+    async def test_close_waits_for_the_running_batch_before_quit(self):
+        self.smtp.data_delay = 0.3
+        worker = await self._start()
+        sending = asyncio.ensure_future(worker.send(_message("user@example.com")))
+        await asyncio.sleep(0.05)
+
+        with patch('bot.mail_worker._CLOSE_TIMEOUT', 0.2):
+            await worker.close()
+        await asyncio.gather(sending, return_exceptions=True)
+
+        # QUIT only went out after the batch finished in its thread
+        self.assertFalse(self.smtp.interleaved)
+        self.assertEqual(self.smtp.messages, [["user@example.com"]])
+        self.assertEqual(self.smtp.quits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
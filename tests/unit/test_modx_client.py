@@ -0,0 +1,127 @@
+"""
+Unit tests for the pooled MODX API client.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import AioHTTPTestCase
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.circuit_breaker import CircuitBreaker, CircuitOpenError
+from bot.modx_client import ModxClient, ModxApiError, is_upstream_failure
+
+
+class TestModxClient(AioHTTPTestCase):
+    """Test cases for ModxClient against a local stand-in MODX server."""
+
+    async def get_application(self):
+        self.peers = set()
+
+        self.broken_calls = 0
+
+        async def products(request):
+            self.peers.add(request.transport.get_extra_info('peername'))
+            return web.json_response({"products": [{"id": "1"}], "category": request.query.get('category')})
+
+        async def broken(request):
+            self.broken_calls += 1
+            return web.Response(status=502, text="Bad gateway")
+
+        async def missing(request):
+            return web.Response(status=404, text="Not found")
+
+        app = web.Application()
+        app.router.add_get('/api-products.json', products)
+        app.router.add_get('/broken.json', broken)
+        app.router.add_get('/missing.json', missing)
+        return app
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.modx = ModxClient(str(self.server.make_url('/')), timeout=5, limit=4, limit_per_host=2)
+
+    async def asyncTearDown(self):
+        await self.modx.close()
+        await super().asyncTearDown()
+
+    async def test_get_json_with_params(self):
+        """JSON is decoded and query parameters are passed through."""
+        data = await self.modx.get_json('api-products.json', params={'category': '16'})
+        self.assertEqual(data, {"products": [{"id": "1"}], "category": "16"})
+
+    async def test_connections_are_reused(self):
+        """Sequential calls share one session and one keep-alive connection."""
+        session = await self.modx.start()
+        for _ in range(5):
+            await self.modx.get_json('/api-products.json')
+        self.assertIs(await self.modx.start(), session)
+        self.assertEqual(len(self.peers), 1)
+
+    async def test_pool_limits_configured(self):
+        """Connector limits come from the client configuration."""
+        session = await self.modx.start()
+        self.assertEqual(session.connector.limit, 4)
+        self.assertEqual(session.connector.limit_per_host, 2)
+
+    async def test_non_200_raises(self):
+        """Error statuses surface as ModxApiError with status and body."""
+        with self.assertRaises(ModxApiError) as context:
+            await self.modx.get_json('broken.json')
+        self.assertEqual(context.exception.status, 502)
+        self.assertEqual(context.exception.text, "Bad gateway")
+
+    async def test_breaker_fails_fast_while_upstream_is_down(self):
+        """After the failure threshold MODX is not called until the cooldown ends."""
+        self.modx.breaker = CircuitBreaker('modx', failure_threshold=2, reset_timeout=60,
+                                           is_failure=is_upstream_failure)
+        for _ in range(2):
+            with self.assertRaises(ModxApiError):
+                await self.modx.get_json('broken.json')
+        with self.assertRaises(CircuitOpenError):
+            await self.modx.get_json('api-products.json')
+        self.assertEqual(self.broken_calls, 2)
+
+    async def test_client_errors_do_not_open_the_breaker(self):
+        """A 404 means MODX is up."""
+        self.modx.breaker = CircuitBreaker('modx', failure_threshold=1, is_failure=is_upstream_failure)
+        with self.assertRaises(ModxApiError):
+            await self.modx.get_json('missing.json')
+        self.assertEqual((await self.modx.get_json('api-products.json'))["products"], [{"id": "1"}])
+
+    async def test_close_and_restart(self):
+        """A closed client opens a fresh session on next use."""
+        first = await self.modx.start()
+        await self.modx.close()
+        self.assertTrue(first.closed)
+        data = await self.modx.get_json('api-products.json')
+        self.assertEqual(data["products"], [{"id": "1"}])
+
+
+class TestModxClientLoops(unittest.TestCase):
+    """The session is bound to one event loop."""
+
+    def test_session_of_a_finished_loop_is_closed(self):
+        """A new loop gets a new session and the old one's connector is released."""
+        modx = ModxClient('http://127.0.0.1:1', timeout=5)
+        first = asyncio.run(modx.start())
+        connector = first.connector
+
+        async def restart():
+            try:
+                return await modx.start()
+            finally:
+                await modx.close()
+
+        second = asyncio.run(restart())
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertTrue(connector.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Unit tests for the order journal and notification outbox.
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.order_outbox import DeliveryError, OrderOutbox, STATUS_FAILED, STATUS_PENDING, retry_delay
+
+
+class TestOrderOutbox(unittest.IsolatedAsyncioTestCase):
+    """Test the journal write and the background dispatcher."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'state', 'bot_state.db')
+        self.outboxes = []
+
+    async def asyncTearDown(self):
+        for outbox in self.outboxes:
+            await outbox.close()
+        shutil.rmtree(self.temp_dir)
+
+    async def _start(self, handlers, **kwargs):
+        outbox = OrderOutbox(self.db_path, base_delay=0.01, max_delay=0.05, **kwargs)
+        for channel, (handler, concurrency) in handlers.items():
+            outbox.register(channel, handler, concurrency)
+        await outbox.start()
+        self.outboxes.append(outbox)
+        return outbox
+
+    async def _wait_until(self, predicate, timeout=2.0):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not await predicate():
+            self.assertLess(asyncio.get_running_loop().time(), deadline, "condition not reached")
+            await asyncio.sleep(0.01)
+
+    async def _outbox_rows(self, outbox):
+        async with outbox._db.execute("SELECT channel, status, attempts FROM outbox ORDER BY id") as cursor:
+            return await cursor.fetchall()
+
+    async def test_order_is_journaled_and_notifications_delivered(self):
+        delivered = []
+        admin = AsyncMock(side_effect=lambda payload: delivered.append(('admin', payload)))
+        customer = AsyncMock(side_effect=lambda payload: delivered.append(('customer', payload)))
+        outbox = await self._start({'admin': (admin, 1), 'customer': (customer, 1)})
+
+        await outbox.record_order("#181026/001", 42, {"total_amount": 10.0},
+                                  [('admin', {'text': 'Новый заказ'}), ('customer', {'text': 'Спасибо'})])
+        await self._wait_until(lambda: self._empty(outbox))
+
+        self.assertCountEqual(delivered, [('admin', {'text': 'Новый заказ'}), ('customer', {'text': 'Спасибо'})])
+        async with outbox._db.execute("SELECT order_number, user_id, payload FROM orders") as cursor:
+            self.assertEqual(await cursor.fetchall(), [("#181026/001", 42, '{"total_amount": 10.0}')])
+
+    async def _empty(self, outbox):
+        return await self._outbox_rows(outbox) == []
+
+    async def test_failed_delivery_is_retried_with_backoff(self):
+        handler = AsyncMock(side_effect=[Exception("timeout"), DeliveryError("flood", retry_after=0.05), None])
+        outbox = await self._start({'admin': (handler, 1)})
+        await outbox.record_order("#1", 1, {}, [('admin', {})])
+
+        await self._wait_until(lambda: self._empty(outbox))
+        self.assertEqual(handler.await_count, 3)
+
+    async def test_delivery_gives_up_after_permanent_error_or_max_attempts(self):
+        blocked = AsyncMock(side_effect=DeliveryError("bot was blocked by the user", permanent=True))
+        broken = AsyncMock(side_effect=Exception("SMTP down"))
+        outbox = await self._start({'customer': (blocked, 1), 'email': (broken, 1)}, max_attempts=3)
+        await outbox.record_order("#1", 1, {}, [('customer', {}), ('email', {})])
+
+        async def all_failed():
+            return all(status == STATUS_FAILED for _, status, _ in await self._outbox_rows(outbox))
+
+        await self._wait_until(all_failed)
+        self.assertEqual(await self._outbox_rows(outbox), [('customer', STATUS_FAILED, 1), ('email', STATUS_FAILED, 3)])
+        self.assertEqual(await outbox.counts(), {STATUS_FAILED: 2})
+
+    async def test_slow_delivery_is_cancelled_and_retried(self):
+        calls = 0
+
+        async def handler(payload):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(10)
+
+        outbox = OrderOutbox(self.db_path, base_delay=0.01, max_delay=0.05)
+        outbox.register('admin', handler, 1, timeout=0.05)
+        await outbox.start()
+        self.outboxes.append(outbox)
+        await outbox.record_order("#1", 1, {}, [('admin', {})])
+
+        await self._wait_until(lambda: self._empty(outbox))
+        self.assertEqual(calls, 2)
+
+    async def test_channel_concurrency_is_limited(self):
+        running = 0
+        peak = 0
+        release = asyncio.Event()
+
+        async def handler(payload):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+
+        outbox = await self._start({'email': (handler, 2)})
+        await outbox.record_order("#1", 1, {}, [('email', {'n': n}) for n in range(5)])
+
+        async def saturated():
+            return running == 2
+
+        await self._wait_until(saturated)
+        release.set()
+        await self._wait_until(lambda: self._empty(outbox))
+        self.assertEqual(peak, 2)
+
+    async def test_pending_notifications_are_delivered_after_restart(self):
+        outbox = await self._start({})
+        await outbox.record_order("#1", 1, {}, [('admin', {'text': 'x'})])
+        await outbox.close()
+        self.assertEqual(await self._pending_after_reopen(), 1)
+
+        handler = AsyncMock()
+        restarted = await self._start({'admin': (handler, 1)})
+        await self._wait_until(lambda: self._empty(restarted))
+        handler.assert_awaited_once_with({'text': 'x'})
+
+    async def _pending_after_reopen(self):
+        outbox = OrderOutbox(self.db_path)
+        await outbox.start()
+        try:
+            return (await outbox.counts()).get(STATUS_PENDING, 0)
+        finally:
+            await outbox.close()
+
+    def test_retry_delay(self):
+        self.assertEqual([retry_delay(n, 5, 30) for n in range(1, 6)], [5, 10, 20, 30, 30])
+
+
+class TestCheckoutWithOutbox(unittest.IsolatedAsyncioTestCase):
+    """Checkout acknowledges after the journal write instead of sending notifications."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.outbox = OrderOutbox(os.path.join(self.temp_dir, 'bot_state.db'))
+        await self.outbox.start()
+
+    async def asyncTearDown(self):
+        await self.outbox.close()
+        shutil.rmtree(self.temp_dir)
+
+    @patch('bot.main.generate_order_number', new_callable=AsyncMock, return_value="#181026/007")
+    @patch('bot.main._send_order_notifications', new_callable=AsyncMock)
+    async def test_checkout_enqueues_notifications(self, mock_send_notifications, mock_generate_order):
+        import bot.main as main
+
+        message = MagicMock()
+        message.answer = AsyncMock()
+        order_data = {
+            "order_details": {"deliveryMethod": "pickup", "firstName": "Test", "lastName": "User",
+                              "phone": "+375291234567", "pickupAddress": "pickup_1"},
+            "cart_items": [{"id": "p1", "name": "Хлеб", "price": "5", "quantity": 2}],
+            "total_amount": 10.0
+        }
+        with patch.object(main, 'order_outbox', self.outbox):
+            await main._handle_checkout_order(message, order_data, 777)
+
+        mock_send_notifications.assert_not_called()
+        message.answer.assert_awaited()
+        async with self.outbox._db.execute("SELECT order_number, user_id FROM orders") as cursor:
+            self.assertEqual(await cursor.fetchall(), [("#181026/007", 777)])
+        async with self.outbox._db.execute("SELECT channel FROM outbox") as cursor:
+            channels = [channel for (channel,) in await cursor.fetchall()]
+        self.assertIn(main.CHANNEL_CUSTOMER_TELEGRAM, channels)
+
+
+if __name__ == '__main__':
+    unittest.main()
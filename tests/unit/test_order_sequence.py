@@ -0,0 +1,69 @@
+"""
+Unit tests for the SQLite order sequence.
+"""
+
+import asyncio
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.order_sequence import OrderSequence, sequence_period
+
+
+class TestOrderSequence(unittest.IsolatedAsyncioTestCase):
+    """Several sequences on one database file stand in for several processes."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'state', 'bot_state.db')
+        self.sequences = []
+
+    async def asyncTearDown(self):
+        for sequence in self.sequences:
+            await sequence.close()
+        shutil.rmtree(self.temp_dir)
+
+    async def _start(self, block_size=1):
+        sequence = OrderSequence(self.db_path, block_size=block_size)
+        await sequence.start()
+        self.sequences.append(sequence)
+        return sequence
+
+    async def test_numbers_restart_every_month(self):
+        sequence = await self._start()
+        self.assertEqual([await sequence.next('2026-10') for _ in range(3)], [1, 2, 3])
+        self.assertEqual(await sequence.next('2026-11'), 1)
+        self.assertEqual(sequence_period(datetime.datetime(2026, 11, 5)), '2026-11')
+
+    async def test_counter_survives_restart_and_is_seeded_from_legacy_file(self):
+        sequence = await self._start()
+        await sequence.seed('2026-10', 41)
+        self.assertEqual(await sequence.next('2026-10'), 42)
+        await sequence.close()
+
+        restarted = await self._start()
+        # A stale legacy value never moves the counter back
+        await restarted.seed('2026-10', 10)
+        self.assertEqual(await restarted.next('2026-10'), 43)
+
+    async def test_numbers_are_unique_across_processes(self):
+        first = await self._start()
+        second = await self._start(block_size=5)
+        third = await self._start(block_size=5)
+
+        numbers = await asyncio.gather(*(
+            sequence.next('2026-10') for _ in range(20) for sequence in (first, second, third)
+        ))
+        self.assertEqual(len(set(numbers)), 60)
+        # Blocks are handed out in order within a process
+        own = [number for number, index in zip(numbers, range(60)) if index % 3 == 1]
+        self.assertEqual(own, sorted(own))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -790,5 +790,81 @@ class TestOrderErrorHandling(unittest.TestCase):
         self.assertTrue(error_message_sent)
 
 
+class TestNotificationFanOut(unittest.IsolatedAsyncioTestCase):
+    """Notifications are sent concurrently under one deadline, after the user's acknowledgement."""
+
+    def setUp(self):
+        self.order_details = {
+            "deliveryMethod": "pickup",
+            "firstName": "Test",
+            "lastName": "User",
+            "phone": "+375291234567",
+            "email": "test@example.com",
+            "pickupAddress": "pickup_1"
+        }
+        self.cart_items = [{"id": "p1", "name": "Хлеб", "price": "5", "quantity": 2}]
+
+    async def _send(self, send_message, send_email):
+        with patch('bot.main.bot') as mock_bot, \
+                patch('bot.main.send_email_notification', send_email), \
+                patch('bot.main.NOTIFICATION_DEADLINE', 0.2), \
+                self.assertLogs('bot.main', level='INFO') as logs:
+            mock_bot.send_message = send_message
+            started = asyncio.get_running_loop().time()
+            result = await _send_order_notifications(self.order_details, self.cart_items, 10.0, "#181026/001", 42)
+            elapsed = asyncio.get_running_loop().time() - started
+
+        self.assertIsNone(result)
+        records = [line.split(': ', 1)[1] for line in logs.output if "Уведомления по заказу #181026/001" in line]
+        self.assertEqual(len(records), 1)
+        return json.loads(records[0]), elapsed
+
+    async def test_channels_fan_out_under_one_deadline(self):
+        async def send_message(chat_id, text, parse_mode):
+            # The admin chat hangs, the customer chat answers
+            await asyncio.sleep(5 if chat_id != 42 else 0.05)
+
+        async def send_email(recipient, subject, body, sender_name):
+            await asyncio.sleep(0.05)
+            return True
+
+        record, elapsed = await self._send(send_message, send_email)
+
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(record["order_number"], "#181026/001")
+        statuses = {channel: result["status"] for channel, result in record["channels"].items()}
+        self.assertEqual(statuses, {
+            "admin_telegram": "timeout",
+            "admin_email": "ok",
+            "customer_telegram": "ok",
+            "customer_email": "ok",
+        })
+
+    async def test_channel_errors_are_reported(self):
+        send_message = AsyncMock(side_effect=[Exception("chat not found"), None])
+        record, _ = await self._send(send_message, AsyncMock(return_value=False))
+
+        self.assertEqual(record["channels"]["admin_telegram"]["status"], "error")
+        self.assertIn("chat not found", record["channels"]["admin_telegram"]["error"])
+        self.assertEqual(record["channels"]["customer_telegram"]["status"], "ok")
+        self.assertEqual(record["channels"]["customer_email"]["status"], "error")
+
+    @patch('bot.main.generate_order_number', new_callable=AsyncMock, return_value="#181026/002")
+    @patch('bot.main._send_order_notifications', new_callable=AsyncMock)
+    async def test_user_is_answered_before_notifications(self, mock_send_notifications, mock_generate_order):
+        message = MagicMock()
+        message.answer = AsyncMock()
+        answers_before_notifications = []
+        mock_send_notifications.side_effect = lambda *args: answers_before_notifications.append(message.answer.await_count)
+
+        await _handle_checkout_order(message, {
+            "order_details": self.order_details,
+            "cart_items": self.cart_items,
+            "total_amount": 10.0
+        }, 42)
+
+        self.assertEqual(answers_before_notifications, [1])
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Unit tests for the prefork worker supervisor.
+"""
+
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.prefork import CATALOG_RELOAD_SIGNAL, Supervisor, next_restart_delay, notify_ready
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "prefork requires os.fork")
+class TestSupervisor(unittest.TestCase):
+    """Each worker records its start in a file and drives the scenario by signalling the supervisor."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.catalog_file = os.path.join(self.temp_dir, 'modx_cache.json')
+        with open(self.catalog_file, 'w') as f:
+            f.write('{}')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _record(self, name):
+        with open(os.path.join(self.temp_dir, name), 'a') as f:
+            f.write(f"{os.getpid()}\n")
+
+    def _records(self, name):
+        path = os.path.join(self.temp_dir, name)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return f.read().split()
+
+    def _starts(self):
+        return len(self._records('starts'))
+
+    def _wait_for_sigterm(self):
+        signal.signal(signal.SIGTERM, lambda *args: (self._record('stopped'), os._exit(0)))
+        # Like the API workers, handle the reload signal before reporting ready
+        signal.signal(CATALOG_RELOAD_SIGNAL, signal.SIG_IGN)
+
+    def _run(self, target, **kwargs):
+        previous = signal.getsignal(signal.SIGTERM)
+        code = Supervisor(1, target, poll_interval=0.05, min_uptime=0, **kwargs).run()
+        self.assertIs(signal.getsignal(signal.SIGTERM), previous)
+        return code
+
+    def test_crashed_worker_is_restarted(self):
+        def target(slot, ready_fd):
+            self._record('starts')
+            if self._starts() == 1:
+                return 3
+            self._wait_for_sigterm()
+            notify_ready(ready_fd)
+            os.kill(os.getppid(), signal.SIGTERM)
+            time.sleep(10)
+            return 1
+
+        self.assertEqual(self._run(target), 0)
+        self.assertEqual(self._starts(), 2)
+        self.assertEqual(len(self._records('stopped')), 1)
+
+    def test_catalog_change_is_broadcast(self):
+        def target(slot, ready_fd):
+            self._wait_for_sigterm()
+            # Every worker is also told to reload once it is ready
+            signal.signal(CATALOG_RELOAD_SIGNAL, lambda *args: self._record('ready_reload'))
+            notify_ready(ready_fd)
+            time.sleep(0.3)
+            signal.signal(CATALOG_RELOAD_SIGNAL, lambda *args: (self._record('reloaded'),
+                                                               os.kill(os.getppid(), signal.SIGTERM)))
+            with open(self.catalog_file, 'w') as f:
+                f.write('{"changed": true}')
+            time.sleep(10)
+            return 1
+
+        self._run(target, watch_paths=(self.catalog_file,))
+        self.assertEqual(len(self._records('ready_reload')), 1)
+        self.assertEqual(len(self._records('reloaded')), 1)
+
+    def test_reload_replaces_worker_once_replacement_is_ready(self):
+        def target(slot, ready_fd):
+            self._record('starts')
+            self._wait_for_sigterm()
+            notify_ready(ready_fd)
+            os.kill(os.getppid(), signal.SIGHUP if self._starts() == 1 else signal.SIGTERM)
+            time.sleep(10)
+            return 1
+
+        self._run(target)
+        starts = self._records('starts')
+        self.assertEqual(len(starts), 2)
+        # The first generation was stopped by the reload, the second by the shutdown
+        self.assertCountEqual(self._records('stopped'), starts)
+
+
+class TestRestartDelay(unittest.TestCase):
+    """Test the restart backoff."""
+
+    def test_backoff_only_for_workers_crashing_on_start(self):
+        self.assertEqual(next_restart_delay(0, uptime=60, min_uptime=5), 0)
+        self.assertEqual(next_restart_delay(0, uptime=1, min_uptime=5), 1)
+        self.assertEqual(next_restart_delay(4, uptime=1, min_uptime=5), 8)
+        self.assertEqual(next_restart_delay(20, uptime=1, min_uptime=5, max_delay=30), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
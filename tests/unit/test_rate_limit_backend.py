@@ -0,0 +1,108 @@
+"""
+Unit tests for the rate limit backends.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.rate_limiter import GCRARateLimiter
+from bot.rate_limit_backend import (
+    MemoryRateLimitBackend, SQLiteRateLimitBackend, create_rate_limit_backend
+)
+
+
+class TestSQLiteRateLimitBackend(unittest.IsolatedAsyncioTestCase):
+    """Two backends on one database file stand in for two worker processes."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'state', 'security_state.db')
+        self.workers = []
+        for _ in range(2):
+            backend = SQLiteRateLimitBackend(self.db_path, sync_interval=3600)
+            limiter = GCRARateLimiter(limit=10, period=60, name='actions')
+            backend.attach(limiter)
+            await backend.start()
+            self.workers.append((backend, limiter))
+
+    async def asyncTearDown(self):
+        for backend, _ in self.workers:
+            await backend.close()
+        shutil.rmtree(self.temp_dir)
+
+    async def test_limits_shared_between_workers(self):
+        """Requests admitted by one worker count against the other after a sync."""
+        (backend_a, limiter_a), (backend_b, limiter_b) = self.workers
+        for _ in range(6):
+            self.assertTrue(limiter_a.allow("user:text"))
+        await backend_a.flush()
+
+        self.assertTrue(limiter_b.allow("user:text"))
+        await backend_b.flush()
+        self.assertEqual(limiter_b.used("user:text"), 7)
+
+        admitted = sum(limiter_b.allow("user:text") for _ in range(10))
+        self.assertEqual(admitted, 3)
+
+    async def test_hot_path_does_not_touch_database(self):
+        """allow() only buffers a delta until the next flush."""
+        backend, limiter = self.workers[0]
+        limiter.allow("k")
+        async with backend._db.execute("SELECT COUNT(*) FROM rate_limits") as cursor:
+            self.assertEqual((await cursor.fetchone())[0], 0)
+        await backend.flush()
+        async with backend._db.execute("SELECT COUNT(*) FROM rate_limits") as cursor:
+            self.assertEqual((await cursor.fetchone())[0], 1)
+
+    async def test_security_events_persisted(self):
+        """Events from any worker are visible to all of them."""
+        (backend_a, _), (backend_b, _) = self.workers
+        backend_a.record_event({"timestamp": "2025-01-01T00:00:00", "event_type": "rate_limit_exceeded",
+                                "details": {"user_id": 1}})
+        await backend_a.flush()
+        events = await backend_b.recent_events()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["details"], {"user_id": 1})
+        self.assertEqual(events[0]["pid"], os.getpid())
+
+    async def test_state_survives_restart(self):
+        """Closing flushes buffered deltas; a new backend picks them up."""
+        backend, limiter = self.workers[0]
+        for _ in range(10):
+            limiter.allow("k")
+        await backend.close()
+
+        restarted = SQLiteRateLimitBackend(self.db_path, sync_interval=3600)
+        fresh = GCRARateLimiter(limit=10, period=60, name='actions')
+        restarted.attach(fresh)
+        await restarted.start()
+        try:
+            fresh.allow("k")
+            await restarted.flush()
+            self.assertFalse(fresh.allow("k"))
+        finally:
+            await restarted.close()
+
+
+class TestBackendSelection(unittest.TestCase):
+    """Test backend factory."""
+
+    def test_memory_is_default_for_unknown_values(self):
+        self.assertIsInstance(create_rate_limit_backend('redis', '/tmp/x.db', 1.0), MemoryRateLimitBackend)
+        self.assertIsInstance(create_rate_limit_backend('sqlite', '/tmp/x.db', 1.0), SQLiteRateLimitBackend)
+
+    def test_memory_backend_does_not_track_pending(self):
+        limiter = GCRARateLimiter(limit=1, period=1)
+        MemoryRateLimitBackend().attach(limiter)
+        limiter.allow("k", now=time.time())
+        self.assertEqual(limiter.drain_pending(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Unit tests for the GCRA rate limiter.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.rate_limiter import GCRARateLimiter
+
+
+class TestGCRARateLimiter(unittest.TestCase):
+    """Test cases for GCRARateLimiter."""
+
+    def setUp(self):
+        self.limiter = GCRARateLimiter(limit=5, period=60)
+
+    def test_burst_up_to_limit(self):
+        """Exactly `limit` requests are admitted in a burst."""
+        results = [self.limiter.allow("ip", now=1000.0) for _ in range(7)]
+        self.assertEqual(results, [True] * 5 + [False] * 2)
+        self.assertEqual(self.limiter.used("ip", now=1000.0), 5)
+
+    def test_allowance_refills_per_interval(self):
+        """One request becomes available every period / limit seconds."""
+        for _ in range(5):
+            self.limiter.allow("ip", now=1000.0)
+        self.assertFalse(self.limiter.allow("ip", now=1011.0))
+        self.assertTrue(self.limiter.allow("ip", now=1012.0))
+        self.assertFalse(self.limiter.allow("ip", now=1012.0))
+        self.assertTrue(self.limiter.allow("ip", now=1060.0))
+
+    def test_keys_are_independent(self):
+        """Exhausting one key does not affect another."""
+        for _ in range(5):
+            self.limiter.allow("a", now=1000.0)
+        self.assertFalse(self.limiter.allow("a", now=1000.0))
+        self.assertTrue(self.limiter.allow("b", now=1000.0))
+
+    def test_lru_bounds_key_count(self):
+        """No more than max_keys keys are tracked."""
+        limiter = GCRARateLimiter(limit=5, period=60, max_keys=3)
+        for i in range(10):
+            limiter.allow(f"ip{i}", now=1000.0)
+        self.assertEqual(len(limiter), 3)
+        self.assertEqual(limiter.used("ip0", now=1000.0), 0)
+        self.assertEqual(limiter.used("ip9", now=1000.0), 1)
+
+    def test_cleanup_drops_refilled_keys(self):
+        """Keys with a full allowance are removed by cleanup."""
+        self.limiter.allow("old", now=1000.0)
+        self.limiter.allow("new", now=1050.0)
+        self.assertEqual(self.limiter.cleanup(now=1055.0), 1)
+        self.assertEqual(len(self.limiter), 1)
+        self.assertEqual(self.limiter.total_used(now=1055.0), 1)
+
+    def test_invalid_configuration(self):
+        """Non-positive limits are rejected."""
+        with self.assertRaises(ValueError):
+            GCRARateLimiter(limit=0, period=60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Unit tests for content-addressed MODX cache versions in scheduler_modx.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import scheduler_modx
+from bot.catalog_binary import MappedCatalog, binary_catalog_path
+
+
+def _product(product_id, menuindex=0, price='5.00'):
+    return {
+        "id": product_id, "parent_id": 16, "pagetitle": f"Product {product_id}", "alias": f"p{product_id}",
+        "price": price, "weight": "100", "menuindex": menuindex
+    }
+
+
+class TestSaveCacheToFile(unittest.TestCase):
+    """Test that only real content changes publish a new version."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.temp_dir, 'modx_cache.json')
+        self.history_file = os.path.join(self.temp_dir, 'modx_cache_history.json')
+        for name, value in (('CACHE_FILE_PATH', self.cache_file), ('HISTORY_FILE_PATH', self.history_file)):
+            patcher = patch.object(scheduler_modx, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.categories = [{"id": 16, "name": "Хлеб"}]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _save(self, products):
+        return asyncio.run(scheduler_modx.save_cache_to_file(products, self.categories))
+
+    def _read(self):
+        with open(self.cache_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_unchanged_data_is_not_rewritten(self):
+        self.assertTrue(self._save([_product(1), _product(2, 1)]))
+        first = self._read()['metadata']['version']
+        mtime = os.stat(self.cache_file).st_mtime_ns
+
+        # Same content in a different API order
+        self.assertTrue(self._save([_product(2, 1), _product(1)]))
+        self.assertEqual(os.stat(self.cache_file).st_mtime_ns, mtime)
+        self.assertEqual(self._read()['metadata']['version'], first)
+
+    def test_changed_data_publishes_new_version(self):
+        self._save([_product(1)])
+        first = self._read()['metadata']['version']
+        self._save([_product(1, price='6.00')])
+        self.assertNotEqual(self._read()['metadata']['version'], first)
+        # The binary catalog for the API workers follows the JSON file
+        catalog = MappedCatalog(binary_catalog_path(self.cache_file))
+        self.assertEqual(catalog.metadata['version'], self._read()['metadata']['version'])
+
+    def test_changes_are_recorded_in_history(self):
+        self._save([_product(1)])
+        self.assertFalse(os.path.exists(self.history_file))
+        first = self._read()['metadata']['version']
+        self._save([_product(1, price='6.00'), _product(2, 1)])
+        self._save([_product(1, price='6.00'), _product(2, 1)])
+
+        with open(self.history_file, encoding='utf-8') as f:
+            versions = json.load(f)['versions']
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(versions[0]['previous'], first)
+        self.assertEqual(versions[0]['version'], self._read()['metadata']['version'])
+        self.assertEqual(len(versions[0]['changes']['products']['changed']), 1)
+        self.assertEqual(len(versions[0]['changes']['products']['added']), 1)
+
+    def test_version_is_content_addressed(self):
+        products = {"category_16": [{"id": 1, "name": "A"}]}
+        version = scheduler_modx.compute_cache_version(products, self.categories)
+        self.assertEqual(version, scheduler_modx.compute_cache_version(json.loads(json.dumps(products)),
+                                                                       list(self.categories)))
+        self.assertTrue(version.startswith('v'))
+        self.assertNotEqual(version, scheduler_modx.compute_cache_version(products, []))
+
+    def test_read_published_version_of_missing_file(self):
+        self.assertIsNone(scheduler_modx.read_published_version(self.cache_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
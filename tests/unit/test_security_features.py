@@ -411,5 +411,110 @@ class TestHMACSecurity(unittest.TestCase):
         self.assertFalse(self.security_manager.validate_timestamp(current_time + 400))
 
 
+class TestRateLimitActionBuckets(unittest.TestCase):
+    """Test that rate limit action names have bounded cardinality."""
+
+    def setUp(self):
+        from aiogram.types import Message, CallbackQuery
+        from bot.security_middleware import SecurityMiddleware, RATE_LIMIT_ACTIONS
+        self.Message = Message
+        self.CallbackQuery = CallbackQuery
+        self.actions = RATE_LIMIT_ACTIONS
+        self.middleware = SecurityMiddleware()
+
+    def _message(self, text=None, web_app_data=None):
+        message = MagicMock(spec=self.Message)
+        message.text = text
+        message.web_app_data = web_app_data
+        message.photo = None
+        message.document = None
+        return message
+
+    def _callback(self, data):
+        callback = MagicMock(spec=self.CallbackQuery)
+        callback.data = data
+        return callback
+
+    def test_free_text_shares_one_bucket(self):
+        """Arbitrary text never creates new action names."""
+        names = {self.middleware._get_action_name(self._message(f"spam {i}")) for i in range(100)}
+        self.assertEqual(names, {"text"})
+
+    def test_commands(self):
+        """Known commands get their own bucket, others share one."""
+        self.assertEqual(self.middleware._get_action_name(self._message("/start payload")), "command:start")
+        self.assertEqual(self.middleware._get_action_name(self._message("/menu@BakeryBot")), "command:menu")
+        self.assertEqual(self.middleware._get_action_name(self._message("/random123")), "command")
+        self.assertEqual(self.middleware._get_action_name(self._message("/")), "command")
+
+    def test_callback_namespaces(self):
+        """Callbacks are bucketed by known namespace only."""
+        self.assertEqual(self.middleware._get_action_name(self._callback("info:about")), "callback:info")
+        self.assertEqual(self.middleware._get_action_name(self._callback("forged:123")), "callback")
+        self.assertEqual(self.middleware._get_action_name(self._callback(None)), "callback")
+
+    def test_names_are_always_known(self):
+        """Every produced action name is part of the fixed set."""
+        events = [
+            self._message("hello"), self._message("/start"), self._message("/x"),
+            self._message(web_app_data=MagicMock()), self._message(),
+            self._callback("info:delivery"), self._callback("x" * 64), MagicMock()
+        ]
+        for event in events:
+            self.assertIn(self.middleware._get_action_name(event), self.actions)
+
+
+class TestRouteHeaderPolicy(unittest.TestCase):
+    """Test the per route class header sets of security_headers_middleware."""
+
+    def _run(self, path, response=None, scheme='http'):
+        from aiohttp.test_utils import make_mocked_request
+        request = make_mocked_request('GET', path)
+        if scheme == 'https':
+            request = request.clone(scheme='https')
+
+        async def handler(req):
+            return response if response is not None else aiohttp.web.Response(text="ok")
+
+        return asyncio.run(security_headers_middleware(request, handler))
+
+    def test_api_responses_are_not_stored(self):
+        response = self._run('/bot-app/api/products')
+        self.assertIn('no-store', response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Pragma'], 'no-cache')
+        self.assertIn('Content-Security-Policy', response.headers)
+
+    def test_versioned_static_is_immutable(self):
+        response = self._run('/bot-app/script.js?v=1.3.110')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertNotIn('Pragma', response.headers)
+
+    def test_shell_and_unversioned_assets_revalidate(self):
+        for path in ('/bot-app/', '/bot-app/script.js', '/bot-app/script.js?dev=1', '/bot-app/style.css?x=av=2'):
+            response = self._run(path)
+            self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+    def test_handler_cache_control_is_kept(self):
+        response = self._run(
+            '/bot-app/api/products',
+            aiohttp.web.Response(text="ok", headers={'Cache-Control': 'private, max-age=60'})
+        )
+        self.assertEqual(response.headers['Cache-Control'], 'private, max-age=60')
+        self.assertNotIn('Pragma', response.headers)
+
+    def test_errors_are_not_cached(self):
+        response = self._run('/bot-app/missing.js?v=1', aiohttp.web.Response(status=404, text="File not found"))
+        self.assertIn('no-store', response.headers['Cache-Control'])
+
+    def test_hsts_only_over_https(self):
+        self.assertNotIn('Strict-Transport-Security', self._run('/bot-app/').headers)
+        self.assertIn('Strict-Transport-Security', self._run('/bot-app/', scheme='https').headers)
+
+    def test_header_sets_are_frozen(self):
+        from security_headers import HEADER_POLICIES, ROUTE_API
+        with self.assertRaises(TypeError):
+            HEADER_POLICIES[(ROUTE_API, False, False)]['Cache-Control'] = 'public'
+
+
 if __name__ == '__main__':
     unittest.main()
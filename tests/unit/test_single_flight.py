@@ -0,0 +1,98 @@
+"""
+Unit tests for single-flight request coalescing.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test cases for SingleFlight."""
+
+    async def asyncSetUp(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def _fetch(self, value=("data",)):
+        self.calls += 1
+        await self.release.wait()
+        return list(value)
+
+    async def test_concurrent_calls_share_one_fetch(self):
+        """Concurrent callers for one key trigger a single fetch."""
+        flight = SingleFlight(ttl=10, negative_ttl=1)
+        waiters = [asyncio.create_task(flight.do("k", self._fetch)) for _ in range(20)]
+        await asyncio.sleep(0)
+        self.release.set()
+        results = await asyncio.gather(*waiters)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == ["data"] for result in results))
+
+    async def test_result_cached_until_ttl(self):
+        """Positive results are reused until the TTL expires."""
+        flight = SingleFlight(ttl=10, negative_ttl=1)
+        self.release.set()
+        with patch('bot.single_flight.time.monotonic', return_value=100.0):
+            await flight.do("k", self._fetch)
+            await flight.do("k", self._fetch)
+        self.assertEqual(self.calls, 1)
+        with patch('bot.single_flight.time.monotonic', return_value=111.0):
+            await flight.do("k", self._fetch)
+        self.assertEqual(self.calls, 2)
+
+    async def test_negative_result_uses_short_ttl(self):
+        """Empty results are cached for the negative TTL only."""
+        flight = SingleFlight(ttl=10, negative_ttl=1)
+        self.release.set()
+        with patch('bot.single_flight.time.monotonic', return_value=100.0):
+            self.assertEqual(await flight.do("k", lambda: self._fetch(())), [])
+            await flight.do("k", lambda: self._fetch(()))
+        self.assertEqual(self.calls, 1)
+        with patch('bot.single_flight.time.monotonic', return_value=102.0):
+            await flight.do("k", lambda: self._fetch(()))
+        self.assertEqual(self.calls, 2)
+
+    async def test_exceptions_not_cached(self):
+        """A failing fetch raises for every waiter and is retried next time."""
+        flight = SingleFlight(ttl=10, negative_ttl=1)
+
+        async def failing():
+            self.calls += 1
+            raise RuntimeError("upstream down")
+
+        with self.assertRaises(RuntimeError):
+            await flight.do("k", failing)
+        with self.assertRaises(RuntimeError):
+            await flight.do("k", failing)
+        self.assertEqual(self.calls, 2)
+
+    async def test_cancelled_caller_does_not_cancel_fetch(self):
+        """Cancelling one waiter leaves the shared fetch running for the others."""
+        flight = SingleFlight(ttl=10, negative_ttl=1)
+        first = asyncio.create_task(flight.do("k", self._fetch))
+        second = asyncio.create_task(flight.do("k", self._fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.release.set()
+        self.assertEqual(await second, ["data"])
+        self.assertEqual(self.calls, 1)
+
+    async def test_cache_is_bounded(self):
+        """Least recently stored keys are evicted beyond max_entries."""
+        flight = SingleFlight(ttl=10, negative_ttl=1, max_entries=2)
+        self.release.set()
+        for key in ("a", "b", "c"):
+            await flight.do(key, self._fetch)
+        await flight.do("a", self._fetch)
+        self.assertEqual(self.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
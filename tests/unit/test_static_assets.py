@@ -0,0 +1,97 @@
+"""
+Unit tests for the in-memory Web App static asset cache.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.static_assets import StaticAssetCache, guess_content_type
+
+
+class TestStaticAssetCache(unittest.TestCase):
+    """Test cases for StaticAssetCache loading and reloading."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = StaticAssetCache(self.root, check_interval=0, max_inline_size=4096)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(content)
+        os.replace(temp_file, path)
+
+    def test_text_asset_is_prepared_and_compressed(self):
+        self._write('style.css', b'body { color: red; }\n' * 100)
+        asset = self.cache.get('style.css')
+        self.assertIsNotNone(asset.body)
+        self.assertEqual(asset.body.content_type, 'text/css')
+        self.assertEqual(asset.body.charset, 'utf-8')
+        self.assertIsNotNone(asset.body.gzip)
+        self.assertEqual(asset.body.select('gzip')[1], 'gzip')
+
+    def test_images_are_not_compressed(self):
+        self._write('images/photo.jpg', b'\xff\xd8' + b'\x00' * 2000)
+        asset = self.cache.get('images/photo.jpg')
+        self.assertEqual(asset.body.content_type, 'image/jpeg')
+        self.assertIsNone(asset.body.charset)
+        self.assertIsNone(asset.body.gzip)
+        self.assertIsNone(asset.body.br)
+
+    def test_large_files_are_streamed(self):
+        self._write('big.png', b'\x89PNG' + b'\x00' * 8192)
+        asset = self.cache.get('big.png')
+        self.assertIsNone(asset.body)
+        self.assertEqual(asset.path, os.path.join(os.path.realpath(self.root), 'big.png'))
+
+    def test_same_asset_object_until_file_changes(self):
+        self._write('script.js', b'console.log(1);')
+        first = self.cache.get('script.js')
+        self.assertIs(self.cache.get('script.js'), first)
+
+        self._write('script.js', b'console.log(2);')
+        second = self.cache.get('script.js')
+        self.assertIsNot(second, first)
+        self.assertNotEqual(second.body.etags[None], first.body.etags[None])
+
+    def test_missing_and_deleted_files(self):
+        self.assertIsNone(self.cache.get('missing.js'))
+        self._write('script.js', b'1')
+        self.assertIsNotNone(self.cache.get('script.js'))
+        os.remove(os.path.join(self.root, 'script.js'))
+        self.assertIsNone(self.cache.get('script.js'))
+
+    def test_paths_outside_root_are_rejected(self):
+        outside = tempfile.NamedTemporaryFile(suffix='.js', delete=False)
+        outside.close()
+        try:
+            relative = os.path.relpath(outside.name, self.root)
+            self.assertIsNone(self.cache.get(relative))
+        finally:
+            os.remove(outside.name)
+
+    def test_preload_loads_matching_files(self):
+        self._write('style.css', b'a')
+        self._write('icons/icon.svg', b'<svg/>')
+        self._write('style.css.backup', b'old')
+        self.assertEqual(self.cache.preload(), 2)
+
+    def test_guess_content_type(self):
+        self.assertEqual(guess_content_type('app.js'), 'application/javascript')
+        self.assertEqual(guess_content_type('favicon.ico'), 'image/x-icon')
+        self.assertEqual(guess_content_type('sprite.svg'), 'image/svg+xml')
+        self.assertEqual(guess_content_type('photo.PNG'), 'image/png')
+
+
+if __name__ == '__main__':
+    unittest.main()